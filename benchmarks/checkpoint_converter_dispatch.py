@@ -0,0 +1,178 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Times the key dispatch of the checkpoint converters on the keys of a
+synthetic 80 layer LLaMA checkpoint (the layout of the 70B model), and checks
+that every dispatch maps each key with the same rule:
+
+    original: every rule is tried in order and rebuilds its regex per call
+    linear:   every rule is tried in order with its precompiled regex
+    prefix:   rules whose literal prefix doesn't match the key are skipped
+
+Rule actions are replaced by one that only records the new key, so the
+timings don't include any tensor work.
+
+Usage:
+    PYTHONPATH=. python benchmarks/checkpoint_converter_dispatch.py
+"""
+
+import argparse
+import time
+
+from modelzoo.common.pytorch.model_utils.checkpoint_converters.base_converter import (
+    ConversionRule,
+)
+from modelzoo.common.pytorch.model_utils.checkpoint_converters.llama import (
+    Converter_LlamaForCausalLM_HF_CS19,
+)
+
+DISPATCHES = ["original", "linear", "prefix"]
+
+
+def converters(converter):
+    yield converter
+    for rule in converter.rules:
+        last_segment = rule.segments[-1]
+        if ConversionRule.segment_is_converter(last_segment):
+            yield from converters(last_segment)
+
+
+def make_converter(dispatch):
+    """
+    Returns a LLaMA converter using `dispatch`, whose rule actions record the
+    new key and the position of the rule that produced it.
+    """
+    converter = Converter_LlamaForCausalLM_HF_CS19()
+
+    def make_action(rule_name):
+        def record(
+            old_key,
+            new_key,
+            old_state_dict,
+            new_state_dict,
+            from_index,
+            action_fn_args,
+        ):
+            new_state_dict[old_key] = (new_key, rule_name)
+
+        return record
+
+    def make_prefixed_rules(rules):
+        def prefixed_rules(from_index):
+            return [("", rule) for rule in rules]
+
+        return prefixed_rules
+
+    def make_get_pattern(rule):
+        def get_pattern(from_index):
+            rule._patterns[from_index] = None
+            return ConversionRule.get_pattern(rule, from_index)
+
+        return get_pattern
+
+    for depth, nested in enumerate(converters(converter)):
+        for index, rule in enumerate(nested.rules):
+            rule.action = make_action((depth, index))
+            if dispatch == "original":
+                rule.get_pattern = make_get_pattern(rule)
+        if dispatch != "prefix":
+            nested.prefixed_rules = make_prefixed_rules(nested.rules)
+    return converter
+
+
+def llama_hf_keys(num_layers):
+    keys = ["model.embed_tokens.weight", "model.norm.weight", "lm_head.weight"]
+    for i in range(num_layers):
+        prefix = f"model.layers.{i}."
+        keys += [
+            prefix + "self_attn.q_proj.weight",
+            prefix + "self_attn.k_proj.weight",
+            prefix + "self_attn.v_proj.weight",
+            prefix + "self_attn.o_proj.weight",
+            prefix + "self_attn.rotary_emb.inv_freq",
+            prefix + "mlp.gate_proj.weight",
+            prefix + "mlp.up_proj.weight",
+            prefix + "mlp.down_proj.weight",
+            prefix + "input_layernorm.weight",
+            prefix + "post_attention_layernorm.weight",
+        ]
+    return keys
+
+
+def key_mapping(converter, keys, from_index):
+    mapping = {}
+    old_state_dict = dict.fromkeys(keys)
+    for key in keys:
+        if not converter.convert_key(key, old_state_dict, mapping, from_index):
+            mapping[key] = None
+    return mapping
+
+
+def time_mapping(converter, keys, from_index, repeats):
+    """
+    Returns the best time of mapping all keys in milliseconds, and the
+    mapping.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        mapping = key_mapping(converter, keys, from_index)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, mapping
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num_layers", type=int, default=80)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    converters_by_dispatch = {
+        dispatch: make_converter(dispatch) for dispatch in DISPATCHES
+    }
+    keys = llama_hf_keys(args.num_layers)
+    print(f"{len(keys)} keys, best of {args.repeats} runs")
+    print(
+        f"{'direction':<10}"
+        + "".join(f"{dispatch + ' ms':>14}" for dispatch in DISPATCHES)
+    )
+    for from_index, direction in enumerate(["HF->CS", "CS->HF"]):
+        times = []
+        mappings = []
+        for dispatch in DISPATCHES:
+            elapsed, mapping = time_mapping(
+                converters_by_dispatch[dispatch],
+                keys,
+                from_index,
+                args.repeats,
+            )
+            times.append(elapsed)
+            mappings.append(mapping)
+        for dispatch, mapping in zip(DISPATCHES[1:], mappings[1:]):
+            if mapping != mappings[0]:
+                raise RuntimeError(
+                    f"{direction}: the {dispatch} dispatch maps keys "
+                    f"differently from the original one."
+                )
+        print(
+            f"{direction:<10}"
+            + "".join(f"{elapsed:>14.2f}" for elapsed in times)
+        )
+        keys = [value[0] for value in mappings[0].values() if value]
+    print("All dispatches produced identical key mappings.")
+
+
+if __name__ == "__main__":
+    main()
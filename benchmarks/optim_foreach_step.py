@@ -0,0 +1,134 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Times the optimizer step with `foreach=False` (per-param) and `foreach=True`
+(multi-tensor) on a synthetic set of params shaped like a transformer.
+
+Usage:
+    PYTHONPATH=. python benchmarks/optim_foreach_step.py --device cuda
+"""
+
+import argparse
+import time
+
+import torch
+
+from modelzoo.common.pytorch.optim import SGD, AdamW, Lamb, Lion
+
+OPTIMIZERS = {
+    "adamw": lambda params, foreach: AdamW(
+        params, lr=1e-4, weight_decay=0.01, foreach=foreach
+    ),
+    "lamb": lambda params, foreach: Lamb(
+        params, lr=1e-4, weight_decay=0.01, foreach=foreach
+    ),
+    "lion": lambda params, foreach: Lion(
+        params, lr=1e-4, weight_decay=0.01, foreach=foreach
+    ),
+    "sgd": lambda params, foreach: SGD(
+        params, lr=1e-4, momentum=0.9, foreach=foreach
+    ),
+}
+
+
+def make_params(num_layers, hidden_size, device):
+    """
+    Returns params with the shapes of a transformer decoder, with gradients.
+    """
+    shapes = []
+    for _ in range(num_layers):
+        shapes += [
+            (3 * hidden_size, hidden_size),
+            (3 * hidden_size,),
+            (hidden_size, hidden_size),
+            (hidden_size,),
+            (4 * hidden_size, hidden_size),
+            (4 * hidden_size,),
+            (hidden_size, 4 * hidden_size),
+            (hidden_size,),
+            (hidden_size,),
+            (hidden_size,),
+            (hidden_size,),
+            (hidden_size,),
+        ]
+    params = []
+    for shape in shapes:
+        p = torch.nn.Parameter(torch.randn(shape, device=device))
+        p.grad = torch.randn(shape, device=device)
+        params.append(p)
+    return params
+
+
+def synchronize(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
+
+
+def time_step(optimizer, device, num_warmup, num_steps):
+    """
+    Returns the mean time of one optimizer step in milliseconds.
+    """
+    for _ in range(num_warmup):
+        optimizer.step()
+    synchronize(device)
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        optimizer.step()
+    synchronize(device)
+    return (time.perf_counter() - start) / num_steps * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--optimizers",
+        nargs="+",
+        choices=list(OPTIMIZERS),
+        default=list(OPTIMIZERS),
+    )
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--num_layers", type=int, default=12)
+    parser.add_argument("--hidden_size", type=int, default=256)
+    parser.add_argument("--num_warmup", type=int, default=3)
+    parser.add_argument("--num_steps", type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    params = make_params(args.num_layers, args.hidden_size, args.device)
+    print(
+        f"{len(params)} params, "
+        f"{sum(p.numel() for p in params):,} elements on {args.device}"
+    )
+    print(
+        f"{'optimizer':<10}{'per-param ms':>15}{'foreach ms':>15}"
+        f"{'speedup':>10}"
+    )
+    for name in args.optimizers:
+        times = []
+        for foreach in (False, True):
+            optimizer = OPTIMIZERS[name](params, foreach)
+            times.append(
+                time_step(
+                    optimizer, args.device, args.num_warmup, args.num_steps
+                )
+            )
+        print(
+            f"{name:<10}{times[0]:>15.2f}{times[1]:>15.2f}"
+            f"{times[0] / times[1]:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
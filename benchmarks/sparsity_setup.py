@@ -0,0 +1,156 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Times the appliance sparsity setup on a synthetic model with many params:
+
+    setup: `build_sparsify_grouper`, which indexes the optimizer state once
+    lookup: the optimizer state lookup `build_sparsify_grouper` did before,
+        scanning all optimizer state entries for each state tensor
+
+and checks that both find the same optimizer state tensors for every param.
+It also times the mask computation of one large weight with the argpartition
+and the chunked paths of `compute_mask`.
+
+Requires the Cerebras appliance package.
+
+Usage:
+    PYTHONPATH=. python benchmarks/sparsity_setup.py --num_params 10000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from modelzoo.common.pytorch.optim import AdamW
+from modelzoo.common.pytorch.sparsity import appliance
+
+
+class SyntheticModel:
+    """
+    Provides the parts of `PyTorchBaseModel` that `build_sparsify_grouper`
+    uses, for a model of `num_params` params with AdamW state.
+    """
+
+    def __init__(self, num_params, shape):
+        self.model = torch.nn.ParameterList(
+            torch.nn.Parameter(torch.zeros(shape)) for _ in range(num_params)
+        )
+        # The optimizer states are preinitialized by the constructor.
+        self.optimizer = AdamW(self.model.parameters())
+
+    def get_optimizer(self):
+        return self.optimizer
+
+    def get_state(self):
+        return {
+            "model": self.model.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+        }
+
+
+def quadratic_lookup(model):
+    """
+    Returns the state_dict keys of the optimizer state of each param, found
+    as `build_sparsify_grouper` did before indexing the optimizer state.
+    """
+    optimizer_state = model.get_state()["optimizer"]["state"]
+    opt_state_names = {}
+    for name, param in model.model.named_parameters():
+        names = []
+        for state_name, state_tensor in model.optimizer.state[param].items():
+            if state_tensor.shape != param.shape:
+                continue
+            id_state = id(state_tensor)
+            for param_id, state in optimizer_state.items():
+                if state_name in state and id(state[state_name]) == id_state:
+                    names.append(f"optimizer.state.{param_id}.{state_name}")
+                    break
+        opt_state_names["model." + name] = names
+    return opt_state_names
+
+
+def time_setup(model):
+    params = {"init_method": "topk", "sparsity": 0.5, "seed": 0}
+
+    start = time.perf_counter()
+    grouper = appliance.build_sparsify_grouper(params, model)
+    setup_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = quadratic_lookup(model)
+    lookup_s = time.perf_counter() - start
+
+    # The grouper is a partial of `sparsify_grouper` on the tensor groups.
+    sparse_tensor_groups = grouper.args[0]
+    opt_state_names = {
+        name: names for name, (_, names) in sparse_tensor_groups.items()
+    }
+    if opt_state_names != expected:
+        raise RuntimeError(
+            "build_sparsify_grouper found different optimizer state tensors "
+            "than the quadratic lookup."
+        )
+    return setup_s, lookup_s
+
+
+def time_mask(numel, repeats):
+    """
+    Returns the best time of computing the mask of a weight with `numel`
+    elements with the argpartition and the chunked path, in seconds.
+    """
+    rng = np.random.default_rng(0)
+    weight = rng.standard_normal((numel // 4096, 4096), dtype=np.float32)
+    params = {"init_method": "topk", "sparsity": 0.5, "seed": 0}
+    times = []
+    min_numel = appliance._CHUNKED_MASK_MIN_NUMEL
+    try:
+        for chunked_min_numel in (float("inf"), 0):
+            appliance._CHUNKED_MASK_MIN_NUMEL = chunked_min_numel
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                appliance.compute_mask(params, weight)
+                best = min(best, time.perf_counter() - start)
+            times.append(best)
+    finally:
+        appliance._CHUNKED_MASK_MIN_NUMEL = min_numel
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--num_params", type=int, default=10000)
+    parser.add_argument("--param_size", type=int, default=16)
+    parser.add_argument("--mask_numel", type=int, default=1 << 26)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    model = SyntheticModel(args.num_params, (args.param_size, args.param_size))
+    setup_s, lookup_s = time_setup(model)
+    print(f"{args.num_params} params with AdamW state")
+    print(f"  build_sparsify_grouper:       {setup_s:8.3f} s")
+    print(f"  quadratic state lookup alone: {lookup_s:8.3f} s")
+    print("  Both found the same optimizer state tensors.")
+
+    argpartition_s, chunked_s = time_mask(args.mask_numel, args.repeats)
+    print(f"Mask of a weight with {args.mask_numel:,} elements")
+    print(f"  argpartition: {argpartition_s:8.3f} s")
+    print(f"  chunked:      {chunked_s:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -206,6 +206,10 @@ class PyTorchBaseModel(metaclass=Final):
             self.optimizer.gradient_clipper = GradientClipper(
                 oparams.get("max_gradient_norm", 0.0),
                 oparams.get("max_gradient_value", 0.0),
+                fused=(
+                    oparams.get("fused_gradient_clipping", False)
+                    and not cm.use_cs()
+                ),
             )
 
         # set duplicate params for params and buffers in the model
@@ -365,6 +369,7 @@ class PyTorchBaseModel(metaclass=Final):
                 momentum=oparams["momentum"],
                 weight_decay=oparams.get("weight_decay_rate", 0.0),
                 nesterov=oparams.get("use_nesterov", False),
+                foreach=oparams.get("foreach", False),
             )
         elif optimizer_type == "adam":
             return Adam(
@@ -373,6 +378,7 @@ class PyTorchBaseModel(metaclass=Final):
                 eps=oparams.get("eps", 1e-6),
                 weight_decay=oparams.get("weight_decay_rate", 0.0),
                 amsgrad=oparams.get("amsgrad", False),
+                foreach=oparams.get("foreach", False),
             )
         elif optimizer_type == "adamw":
             return AdamW(
@@ -382,6 +388,7 @@ class PyTorchBaseModel(metaclass=Final):
                 weight_decay=oparams.get("weight_decay_rate", 0.0),
                 correct_bias=oparams.get("correct_bias", True),
                 amsgrad=oparams.get("amsgrad", False),
+                foreach=oparams.get("foreach", False),
             )
         elif optimizer_type == "adamax":
             return Adamax(
@@ -456,6 +463,7 @@ class PyTorchBaseModel(metaclass=Final):
                 eps=eps,
                 weight_decay=weight_decay,
                 adam=adam,
+                foreach=oparams.get("foreach", False),
             )
         elif optimizer_type == "lion":
             betas = (oparams.get("beta1", 0.9), oparams.get("beta2", 0.99))
@@ -465,6 +473,7 @@ class PyTorchBaseModel(metaclass=Final):
                 lr=learning_rate,
                 betas=betas,
                 weight_decay=weight_decay,
+                foreach=oparams.get("foreach", False),
             )
         elif optimizer_type == "radam":
             eps = oparams.get("eps", 1e-6)
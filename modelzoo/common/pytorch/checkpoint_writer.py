@@ -0,0 +1,190 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module which provides utilities for writing checkpoints on CPU/GPU"""
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import torch
+
+from modelzoo.common.pytorch.utils import get_checkpoints
+
+
+def snapshot_state(state):
+    """Copy all tensors of a (nested) state dict to CPU memory.
+
+    The copies do not alias the tensors of the model or optimizer, so training
+    can continue to update them in place while the snapshot is written. On GPU
+    the copies go to pinned memory and are issued asynchronously; the returned
+    CUDA event is recorded after the last copy and must be synchronized on
+    before the snapshot is read.
+
+    Returns:
+        A tuple of the snapshot and a CUDA event, or `None` if no tensor was
+        copied from a GPU.
+    """
+    has_cuda_tensors = False
+
+    def _copy(value):
+        nonlocal has_cuda_tensors
+        if isinstance(value, torch.Tensor):
+            if value.device.type == "cuda":
+                has_cuda_tensors = True
+                copy = torch.empty(
+                    value.shape, dtype=value.dtype, pin_memory=True
+                )
+                return copy.copy_(value.detach(), non_blocking=True)
+            return value.detach().to("cpu", copy=True)
+        if isinstance(value, dict):
+            return type(value)((k, _copy(v)) for k, v in value.items())
+        if isinstance(value, (list, tuple)):
+            return type(value)(_copy(v) for v in value)
+        return value
+
+    snapshot = _copy(state)
+    copy_done = None
+    if has_cuda_tensors:
+        copy_done = torch.cuda.Event()
+        copy_done.record()
+    return snapshot, copy_done
+
+
+def save_atomic(state, file_name: str):
+    """Save `state` to `file_name` such that the file either does not exist
+    or is complete, even if the process is interrupted while saving."""
+    tmp_file_name = f"{file_name}.tmp"
+    torch.save(state, tmp_file_name)
+    os.replace(tmp_file_name, file_name)
+
+
+class CheckpointWriter:
+    """Helper class for saving checkpoints, optionally in the background.
+
+    In async mode, `save` snapshots the state to CPU memory and hands it to a
+    background thread that serializes it, so that the training loop only
+    waits for the device to host copy. At most `max_pending` saves are in
+    flight at a time; further saves block until the oldest one finished.
+
+    Checkpoints are always written to a temporary file first and renamed once
+    complete, so a checkpoint with the final name is never partially written.
+
+    Args:
+        model_dir: The directory that checkpoints are saved to.
+        async_save: Whether to write checkpoints on a background thread.
+        max_pending: The maximum number of checkpoints being written in the
+            background at the same time.
+        max_checkpoints: If set, the number of most recent checkpoints in
+            `model_dir` to keep. Older ones are deleted after each save.
+        on_saved: Optional callable taking the path and step of a
+            checkpoint, called from the thread calling `save` or `wait` once
+            the checkpoint is complete.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        async_save: bool = False,
+        max_pending: int = 1,
+        max_checkpoints: Optional[int] = None,
+        on_saved: Optional[Callable[[str, int], None]] = None,
+    ):
+        if max_pending < 1:
+            raise ValueError(
+                f"max_pending must be at least 1, got {max_pending}."
+            )
+        self._model_dir = model_dir
+        self._async_save = async_save
+        self._max_pending = max_pending
+        self._max_checkpoints = max_checkpoints
+        self._on_saved = on_saved
+        self._executor = None
+        self._pending = deque()
+
+    def save(self, state, file_name: str, step: int):
+        """Save `state` to `file_name`, the checkpoint for `step`."""
+        if not self._async_save:
+            save_atomic(state, file_name)
+            self._finish(file_name, step)
+            return
+
+        self.poll()
+        while len(self._pending) >= self._max_pending:
+            self._wait_oldest()
+
+        snapshot, copy_done = snapshot_state(state)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="checkpoint_writer"
+            )
+        future = self._executor.submit(
+            self._write, snapshot, copy_done, file_name
+        )
+        self._pending.append((future, file_name, step))
+
+    def poll(self) -> List[Tuple[str, int]]:
+        """Finish all background saves that are complete, in order.
+
+        Returns:
+            The paths and steps of the finished checkpoints.
+        """
+        finished = []
+        while self._pending and self._pending[0][0].done():
+            finished.append(self._wait_oldest())
+        return finished
+
+    def wait(self) -> List[Tuple[str, int]]:
+        """Block until all background saves are complete.
+
+        Returns:
+            The paths and steps of the finished checkpoints.
+        """
+        finished = []
+        while self._pending:
+            finished.append(self._wait_oldest())
+        return finished
+
+    def close(self):
+        """Wait for all background saves and stop the writer thread."""
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @staticmethod
+    def _write(snapshot, copy_done, file_name):
+        if copy_done is not None:
+            copy_done.synchronize()
+        save_atomic(snapshot, file_name)
+
+    def _wait_oldest(self) -> Tuple[str, int]:
+        future, file_name, step = self._pending.popleft()
+        # Re-raises any error of the background save
+        future.result()
+        self._finish(file_name, step)
+        return file_name, step
+
+    def _finish(self, file_name, step):
+        logging.info(f"Saved checkpoint {file_name}")
+        if self._max_checkpoints:
+            for ckpt_path in get_checkpoints(self._model_dir)[
+                : -self._max_checkpoints
+            ]:
+                logging.info(f"Removing old checkpoint {ckpt_path}")
+                os.remove(ckpt_path)
+        if self._on_saved is not None:
+            self._on_saved(file_name, step)
@@ -0,0 +1,179 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module which provides a dataloader wrapper that prefetches to the device"""
+
+import queue
+import threading
+import time
+from collections import UserDict, deque
+from typing import Callable
+
+import torch
+
+
+def pin_memory(data):
+    """Pin all CPU tensors of a dict, list or tuple of tensors."""
+    if isinstance(data, torch.Tensor):
+        if data.device.type == "cpu" and not data.is_pinned():
+            return data.pin_memory()
+        return data
+    if isinstance(data, (dict, UserDict)):
+        return type(data)({k: pin_memory(v) for k, v in data.items()})
+    if isinstance(data, (list, tuple)):
+        return type(data)(pin_memory(v) for v in data)
+    return data
+
+
+def _record_stream(data, stream):
+    if isinstance(data, torch.Tensor):
+        data.record_stream(stream)
+    elif isinstance(data, (dict, UserDict)):
+        for value in data.values():
+            _record_stream(value, stream)
+    elif isinstance(data, (list, tuple)):
+        for value in data:
+            _record_stream(value, stream)
+
+
+class DevicePrefetcher:
+    """Wraps a dataloader to move batches to the device ahead of time.
+
+    On GPU, the next `num_batches` batches are pinned and copied to the device
+    on a side CUDA stream while the current step runs. On CPU, they are
+    fetched from the dataloader by a background thread.
+
+    The time the training loop spends waiting for the next batch is recorded
+    and can be read with `pop_stall_time`.
+
+    Args:
+        dataloader: The dataloader to wrap.
+        to_device: A callable that moves a batch to the device, taking the
+            batch and a `non_blocking` keyword argument.
+        device: The device that batches are moved to.
+        num_batches: The number of batches to prefetch.
+    """
+
+    def __init__(
+        self,
+        dataloader: torch.utils.data.DataLoader,
+        to_device: Callable,
+        device: torch.device,
+        num_batches: int = 1,
+    ):
+        if num_batches < 1:
+            raise ValueError(
+                f"num_batches must be at least 1, got {num_batches}."
+            )
+        self.dataloader = dataloader
+        self._to_device = to_device
+        self._device = device
+        self._num_batches = num_batches
+        self._stall_time = 0.0
+        self._num_steps = 0
+
+    def __len__(self):
+        return len(self.dataloader)
+
+    def __iter__(self):
+        if self._device is not None and self._device.type == "cuda":
+            return self._iter_cuda()
+        return self._iter_threaded()
+
+    def pop_stall_time(self) -> float:
+        """Returns the average time in seconds spent waiting for a batch per
+        step since the last call, and resets it."""
+        stall_time = self._stall_time / max(self._num_steps, 1)
+        self._stall_time = 0.0
+        self._num_steps = 0
+        return stall_time
+
+    def _add_stall_time(self, start):
+        self._stall_time += time.perf_counter() - start
+        self._num_steps += 1
+
+    def _iter_cuda(self):
+        stream = torch.cuda.Stream(device=self._device)
+        staged = deque()
+        iterator = iter(self.dataloader)
+
+        def _stage_next():
+            try:
+                data = next(iterator)
+            except StopIteration:
+                return False
+            data = pin_memory(data)
+            with torch.cuda.stream(stream):
+                staged.append(self._to_device(data, non_blocking=True))
+            return True
+
+        start = time.perf_counter()
+        while len(staged) < self._num_batches and _stage_next():
+            pass
+        while staged:
+            data = staged.popleft()
+            current_stream = torch.cuda.current_stream(self._device)
+            current_stream.wait_stream(stream)
+            # The batch was allocated on the side stream, so its memory must
+            # not be reused before the current stream is done with it
+            _record_stream(data, current_stream)
+            _stage_next()
+            self._add_stall_time(start)
+            yield data
+            start = time.perf_counter()
+
+    def _iter_threaded(self):
+        batches = queue.Queue(maxsize=self._num_batches)
+        stop = threading.Event()
+        done = object()
+
+        def _produce():
+            try:
+                for data in self.dataloader:
+                    data = self._to_device(data)
+                    while not stop.is_set():
+                        try:
+                            batches.put((data, None), timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+                    if stop.is_set():
+                        return
+                batches.put((done, None))
+            except Exception as e:  # pylint: disable=broad-except
+                batches.put((done, e))
+
+        thread = threading.Thread(
+            target=_produce, name="data_prefetcher", daemon=True
+        )
+        thread.start()
+        try:
+            while True:
+                start = time.perf_counter()
+                data, error = batches.get()
+                if data is done:
+                    if error is not None:
+                        raise error
+                    return
+                self._add_stall_time(start)
+                yield data
+        finally:
+            # Unblock the producer if the loop exits early
+            stop.set()
+            while thread.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
@@ -12,17 +12,67 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from typing import Iterable, Optional
+
 import torch
 
 from modelzoo.common.pytorch import amp
 
 
+def compute_grad_norms(named_params: Iterable) -> dict:
+    """Computes the L2 norm of the gradient of each param in a single pass.
+
+    A multi-tensor kernel is used where available. The norms are left on the
+    device, so no host sync is needed.
+
+    Args:
+        named_params: An iterable of (name, param) tuples.
+
+    Returns:
+        A dict mapping the names of the params that have a gradient to the
+        norms of their gradients.
+    """
+    names, grads = [], []
+    for name, param in named_params:
+        if param.grad is not None:
+            names.append(name)
+            grads.append(param.grad.detach())
+    if not grads:
+        return {}
+    if hasattr(torch, "_foreach_norm"):
+        norms = torch._foreach_norm(grads)
+    else:
+        norms = [torch.norm(grad) for grad in grads]
+    return dict(zip(names, norms))
+
+
+def global_grad_norm(grad_norms: Iterable[torch.Tensor]) -> torch.Tensor:
+    """Combines per-tensor gradient norms into the global L2 norm, the same way
+    `torch.nn.utils.clip_grad_norm_` does."""
+    return torch.norm(torch.stack(list(grad_norms)), 2.0)
+
+
 class GradientClipper:
+    """Clips gradients either by their global norm or by value.
+
+    Args:
+        max_gradient_norm: The max global norm of the gradients.
+        max_gradient_value: The max absolute value of each gradient.
+        fused: If True, clipping by norm takes the global norm from the
+            caller, so that the per-tensor norms computed once with
+            `compute_grad_norms` can also be used for the gradient norm
+            summaries.
+    """
+
     def __init__(
-        self, max_gradient_norm: float = 0.0, max_gradient_value: float = 0.0
+        self,
+        max_gradient_norm: float = 0.0,
+        max_gradient_value: float = 0.0,
+        fused: bool = False,
     ):
         self.max_gradient = 0.0
         self.max_gradient_fn = None
+        self.fused = fused
 
         self.set_max_gradients(max_gradient_norm, max_gradient_value)
 
@@ -63,9 +113,39 @@ class GradientClipper:
             assert self.max_gradient_fn == torch.nn.utils.clip_grad_norm_
             self.max_gradient_fn = None
 
-    def clip(self, params: dict):
-        if self.max_gradient_fn is not None:
+    @property
+    def clips_by_norm(self) -> bool:
+        """Whether the gradients are clipped by their global norm."""
+        return self.max_gradient_fn == torch.nn.utils.clip_grad_norm_
+
+    def clip(self, params: dict, total_norm: Optional[torch.Tensor] = None):
+        """Clips the gradients of `params` in place.
+
+        Args:
+            params: The params whose gradients to clip.
+            total_norm: The global norm of the gradients, as computed by
+                `global_grad_norm`. Only used in fused mode when clipping by
+                norm, in which case it is computed if not given.
+        """
+        if self.max_gradient_fn is None:
+            return
+        if not (self.fused and self.clips_by_norm):
             self.max_gradient_fn(params, self.max_gradient)
+            return
+
+        params = [p for p in params if p.grad is not None]
+        if not params:
+            return
+        if total_norm is None:
+            total_norm = global_grad_norm(
+                compute_grad_norms(enumerate(params)).values()
+            )
+        clip_coef = self.max_gradient / (total_norm + 1e-6)
+        # Multiplying by the clamped coefficient avoids a data-dependent
+        # branch, which would require a host sync
+        clip_coef_clamped = torch.clamp(clip_coef, max=1.0)
+        for p in params:
+            p.grad.detach().mul_(clip_coef_clamped.to(p.grad.device))
 
     def __call__(self, *args, **kwargs):
         return self.clip(*args, **kwargs)
@@ -94,16 +94,31 @@ class AlibiPositionEmbeddingLayer(nn.Module):
             seq_length (int): the length of query tokens.
             key_length (int): the length of key tokens.
 
+            past_kv: Past keys and values. If provided, the queries are the
+                last ``seq_length`` of the ``key_length`` positions.
+
         Returns:
             Position bias tensor with shape [num_heads, query_length, key_length]
         """
-        position_bias = self._compute_alibi_bias(seq_length, key_length)
         # if key and values are already calculated we want only
-        # the last query position bias
-        if past_kv is not None:
-            position_bias = position_bias[:, :, -seq_length, :]
+        # the bias of the last query positions
+        query_offset = key_length - seq_length if past_kv is not None else 0
+        return self._compute_alibi_bias(
+            seq_length, key_length, query_offset=query_offset
+        )
 
-        return position_bias
+    def compute_block_bias(
+        self, query_length, key_length, query_offset=0, key_offset=0
+    ):
+        """Return the position bias of ``query_length`` queries starting at
+        position ``query_offset`` and ``key_length`` keys starting at position
+        ``key_offset``, with shape [num_heads, query_length, key_length]."""
+        return self._compute_alibi_bias(
+            query_length,
+            key_length,
+            query_offset=query_offset,
+            key_offset=key_offset,
+        )
 
     @staticmethod
     def _get_alibi_slopes(n):
@@ -127,10 +142,16 @@ class AlibiPositionEmbeddingLayer(nn.Module):
                 )[0::2][: n - closest_power_of_2]
             )
 
-    def _alibi_implementation_embedding(self, seq_length, key_length, slopes):
-        # 1D tensor range(key_length): [0, 1, ... key_length - 1]
+    def _alibi_implementation_embedding(
+        self, seq_length, key_length, slopes, query_offset=0, key_offset=0
+    ):
+        # 1D tensor of all distances between the queries and keys:
+        # [0, 1, ... key_length - 1] when the keys start at position 0
+        num_distances = max(
+            key_offset + key_length, query_offset + seq_length
+        )
         range_k = torch.arange(
-            key_length, dtype=torch.int32, device=slopes.device
+            num_distances, dtype=torch.int32, device=slopes.device
         )
 
         # Compute bias for each head: slopes[head_index] * [0, 1, ... key_length - 1]
@@ -140,7 +161,11 @@ class AlibiPositionEmbeddingLayer(nn.Module):
         # Construct the broadcasting with compute_raw_relative_positions from RelativePositionEmbedding
         # Shape: (seq_length, key_length)
         relative_position = RelativePositionEmbeddingLayer.compute_raw_relative_positions(
-            seq_length, key_length, device=slopes.device
+            seq_length,
+            key_length,
+            device=slopes.device,
+            query_offset=query_offset,
+            key_offset=key_offset,
         )
         # casting to int32 to bypass the wgt kernel gather limitation
         relative_position = torch.abs(relative_position).to(torch.int32)
@@ -154,9 +179,15 @@ class AlibiPositionEmbeddingLayer(nn.Module):
         bias = bias.permute([2, 0, 1])
         return bias
 
-    def _alibi_implementation_expand(self, seq_length, key_length, slopes):
+    def _alibi_implementation_expand(
+        self, seq_length, key_length, slopes, query_offset=0, key_offset=0
+    ):
         relative_position = RelativePositionEmbeddingLayer.compute_raw_relative_positions(
-            seq_length, key_length, device=slopes.device
+            seq_length,
+            key_length,
+            device=slopes.device,
+            query_offset=query_offset,
+            key_offset=key_offset,
         )
         relative_position = (
             torch.abs(relative_position)
@@ -166,15 +197,17 @@ class AlibiPositionEmbeddingLayer(nn.Module):
         alibi = (slopes * -1.0).unsqueeze(1) * relative_position
         return alibi
 
-    def _compute_alibi_bias(self, seq_length, key_length, slopes=None):
+    def _compute_alibi_bias(
+        self, seq_length, key_length, slopes=None, query_offset=0, key_offset=0
+    ):
         if slopes is None:
             slopes = self.slopes
 
         if self.use_embedding_implementation:
             return self._alibi_implementation_embedding(
-                seq_length, key_length, slopes
+                seq_length, key_length, slopes, query_offset, key_offset
             )
         else:
             return self._alibi_implementation_expand(
-                seq_length, key_length, slopes
+                seq_length, key_length, slopes, query_offset, key_offset
             )
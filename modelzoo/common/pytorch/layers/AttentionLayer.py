@@ -19,6 +19,10 @@ import torch.nn as nn
 
 from modelzoo.common.pytorch import cb_model as cm
 from modelzoo.common.pytorch import cbtorch
+from modelzoo.common.pytorch.layers.BlockwiseAttentionBias import (
+    BlockwiseAttentionBias,
+)
+from modelzoo.common.pytorch.layers.KVCache import KVCache, get_past_length
 from modelzoo.common.pytorch.model_utils.create_initializer import (
     create_initializer,
 )
@@ -60,6 +64,21 @@ class MultiheadAttention(nn.Module):
             See accepted values below.
                 ``default`` - Optimized implementation.
                 ``compatible`` - Non-optimized but most compatible implementation.
+        attention_implementation (str): How attention is computed on CPU/GPU.
+            Uses ``default`` if None. See accepted values below.
+                ``default`` - Materializes the full attention logits.
+                ``chunked`` - Processes blocks of queries and keys with an
+                online softmax, so the attention logits grow with
+                ``attention_chunk_size`` instead of the sequence length.
+                Masks and position biases given as a
+                ``BlockwiseAttentionBias`` are generated per block.
+                ``sdpa`` - Dispatches to
+                ``torch.nn.functional.scaled_dot_product_attention``, which
+                requires a PyTorch version that provides it.
+            Attention weights can't be returned by ``chunked`` and ``sdpa``, the
+            ``default`` implementation is used when they are requested.
+        attention_chunk_size (int): Block size of the ``chunked``
+            implementation. Defaults to 1024.
         device (optional): Device to create the model parameters on, can be a cuda device or CS device.
     """
 
@@ -84,12 +103,33 @@ class MultiheadAttention(nn.Module):
         scale_qk_dot_by_d=False,
         softmax_dtype_fp32=True,
         attention_kernel: Optional[str] = None,
+        attention_implementation: Optional[str] = None,
+        attention_chunk_size: int = 1024,
         device=None,
     ):
         _SUPPORTED_ATTENTION_TYPES = ["dot_product", "scaled_dot_product"]
         assert (
             attention_type in _SUPPORTED_ATTENTION_TYPES
         ), f"Attention type {attention_type} is not supported."
+        _SUPPORTED_ATTENTION_IMPLEMENTATIONS = ["default", "chunked", "sdpa"]
+        if attention_implementation is None:
+            attention_implementation = "default"
+        assert (
+            attention_implementation in _SUPPORTED_ATTENTION_IMPLEMENTATIONS
+        ), f"Attention implementation {attention_implementation} is not supported."
+        assert (
+            attention_implementation == "default" or not cm.use_cs()
+        ), "Only the default attention implementation is supported on CS."
+        assert attention_implementation != "sdpa" or hasattr(
+            nn.functional, "scaled_dot_product_attention"
+        ), (
+            "Attention implementation sdpa requires "
+            "torch.nn.functional.scaled_dot_product_attention, which is not "
+            f"available in torch {torch.__version__}. Use chunked instead."
+        )
+        assert (
+            attention_chunk_size > 0
+        ), "attention_chunk_size must be a positive integer."
         assert (
             embed_dim % num_heads == 0
         ), f"embed_dim {embed_dim} must be divisible by num_heads {num_heads}."
@@ -158,6 +198,8 @@ class MultiheadAttention(nn.Module):
         if attention_kernel and cm.use_cs():
             self._scope = cbtorch.nn.Scope(attention_kernel.upper())
         self.scale_qk_dot_by_d = scale_qk_dot_by_d
+        self.attention_implementation = attention_implementation
+        self.attention_chunk_size = attention_chunk_size
 
         self.__reset_parameters()
 
@@ -210,7 +252,8 @@ class MultiheadAttention(nn.Module):
             v (Tensor): Values, shape ``[batch_size, seq_length, embed_dim]``.
             attn_mask (Tensor): Attention mask. Can be 2D of shape
                 ``[batch_size, seq_length]``, or 3D of shape
-                ``[batch, query_length, seq_length]``.
+                ``[batch, query_length, seq_length]``. Can also be a
+                ``BlockwiseAttentionBias``.
             key_padding_mask (Tensor): If specified, a mask of shape (N, S) indicating
                 which elements within key to ignore for the purpose of attention
                 (i.e. treat as “padding”). Defaults to None.
@@ -220,9 +263,10 @@ class MultiheadAttention(nn.Module):
                 should be averaged across heads. Otherwise, attn_weights are provided
                 separately per head. Note that this flag only has an effect when
                 need_weights=True. Default: True (i.e. average weights across heads)
-            past_kv (tuple(tensor, tensor)): Past keys and values. Tensors have shape
+            past_kv (tuple(tensor, tensor) or KVCache): Past keys and values. Tensors have shape
                 ``[batch_size, num_heads, seq_length, embed_dim / num_heads]``.
                 The 0th and 1st tensor contain the past keys and values, respectively.
+                A ``KVCache`` is updated in place with the present keys and values.
                 Defaults to ``None``.
             cache_present_kv (bool): Specifies if the present keys and values
                 must be cached and returned. Needed to speed up the
@@ -232,7 +276,8 @@ class MultiheadAttention(nn.Module):
                 used for self-attention (true) or cross-attention (false). Ignored if
                 past_kv is not provided. Default: True
             position_bias (Tensor): Tensor containing position bias to apply in attention
-                with shape ``[num_heads, query_length, key_length]``.
+                with shape ``[num_heads, query_length, key_length]``. Can also
+                be a ``BlockwiseAttentionBias``.
             rotary_position_embedding_helper (Optional[RotaryPositionEmbeddingHelper]):
                 A helper class to apply rotary embedding on the input tensor.
 
@@ -245,12 +290,16 @@ class MultiheadAttention(nn.Module):
             v = self._scope(v)
 
         assert not (
-            rotary_position_embedding_helper and position_bias
+            rotary_position_embedding_helper and position_bias is not None
         ), "Cannot specify both rotary and relative position embeddings, pick one!"
 
-        assert (
-            past_kv is None and not cache_present_kv
-        ), "Cannot provide past_kv because inference is not supported yet."
+        # Blockwise masks and biases are only generated per block by the
+        # chunked implementation, the other implementations need all of it.
+        if self.attention_implementation != "chunked" or need_weights:
+            if isinstance(attn_mask, BlockwiseAttentionBias):
+                attn_mask = attn_mask.materialize()
+            if isinstance(position_bias, BlockwiseAttentionBias):
+                position_bias = position_bias.materialize()
 
         # Input is (batch_size, seq_length, dim)
         # Mask is (batch_size, key_length) (non-causal) or (batch_size, key_length, key_length)
@@ -259,8 +308,8 @@ class MultiheadAttention(nn.Module):
         real_seq_length = seq_length
 
         assert (
-            real_seq_length > 1
-        ), "Sequence length 1 is currently unsupported."
+            real_seq_length > 1 or past_kv is not None
+        ), "Sequence length 1 is only supported when decoding with past_kv."
 
         # construct query, key and value vector with a linear projection and split into heads
         q = self.construct_query_vector(
@@ -297,24 +346,41 @@ class MultiheadAttention(nn.Module):
 
         k, v = self.process_past_kv(past_kv, past_kv_self_attn, k, v)
 
-        present_kv = self.construct_present_kv(cache_present_kv, k, v)
-
-        logits = self.calculate_attention_logits(q, k)
+        present_kv = self.construct_present_kv(
+            cache_present_kv, k, v, past_kv=past_kv
+        )
 
-        attn_mask_processed = self.process_attention_mask(attn_mask, past_kv, q)
+        if isinstance(attn_mask, BlockwiseAttentionBias):
+            attn_mask_processed = attn_mask
+        else:
+            attn_mask_processed = self.process_attention_mask(
+                attn_mask, past_kv, q
+            )
         key_padding_mask_processed = self.process_key_padding_mask(
             key_padding_mask, attn_mask, past_kv, q
         )
 
-        attention_bias = self.combine_masks(
-            attn_mask_processed, key_padding_mask_processed
-        )
-
-        logits = self.apply_attention_bias(logits, attention_bias)
-        logits = self.apply_position_bias(logits, position_bias)
+        if self.attention_implementation != "default" and not need_weights:
+            attention_output = self.calculate_fused_attention_output(
+                q,
+                k,
+                v,
+                attn_mask_processed,
+                key_padding_mask_processed,
+                position_bias,
+            )
+        else:
+            attention_bias = self.combine_masks(
+                attn_mask_processed, key_padding_mask_processed
+            )
+            logits = self.calculate_attention_logits(q, k)
+            logits = self.apply_attention_bias(logits, attention_bias)
+            logits = self.apply_position_bias(logits, position_bias)
 
-        attention_scores = self.calculate_attention_scores(logits)
-        attention_output = self.calculate_attention_output(attention_scores, v)
+            attention_scores = self.calculate_attention_scores(logits)
+            attention_output = self.calculate_attention_output(
+                attention_scores, v
+            )
 
         if self._scope:
             attention_output = self._scope.exit(attention_output)
@@ -393,10 +459,8 @@ class MultiheadAttention(nn.Module):
         return v
 
     def get_sequence_length(self, past_kv, real_seq_length):
-        offset_length = 0
-        if past_kv is not None:
-            offset_length = past_kv[0].shape[-2]
-            real_seq_length += offset_length
+        offset_length = get_past_length(past_kv)
+        real_seq_length += offset_length
         return offset_length, real_seq_length
 
     def apply_rotary_position_embedding(
@@ -426,7 +490,12 @@ class MultiheadAttention(nn.Module):
         return v
 
     def process_past_kv(self, past_kv, past_kv_self_attn, k, v):
-        if past_kv is not None:
+        if isinstance(past_kv, KVCache):
+            assert (
+                past_kv_self_attn
+            ), "KVCache is only supported for self-attention."
+            k, v = past_kv.update(k, v)
+        elif past_kv is not None:
             k_past, v_past = past_kv[0], past_kv[1]
             if past_kv_self_attn:
                 k = torch.cat([k_past, k], dim=-2)
@@ -435,16 +504,21 @@ class MultiheadAttention(nn.Module):
                 k, v = k_past, v_past
         return k, v
 
-    def construct_present_kv(self, cache_present_kv, k, v):
+    def construct_present_kv(self, cache_present_kv, k, v, past_kv=None):
         present_kv = None
         if cache_present_kv:
-            present_kv = (k, v)
+            # a cache already holds the present keys and values
+            present_kv = past_kv if isinstance(past_kv, KVCache) else (k, v)
         return present_kv
 
-    def calculate_attention_logits(self, q, k):
+    def _scale_q(self, q):
         if self.scale_dot_product:
             depth = self.inner_dim // self.num_heads
             q = q * torch.tensor(1 / float(depth) ** 0.5, dtype=q.dtype,)
+        return q
+
+    def calculate_attention_logits(self, q, k):
+        q = self._scale_q(q)
 
         # calculate dot product attention
         logits = torch.matmul(
@@ -472,33 +546,18 @@ class MultiheadAttention(nn.Module):
             ):
                 attn_mask = attn_mask.to(torch.bool)
 
+            attn_mask = self._pad_mask_for_past_kv(attn_mask, past_kv, q)
+
             # for broadcasting over all heads
             num_heads = 1
             if len(attn_mask.shape) == 2:
-                if past_kv is not None:
-                    past_mask = torch.zeros(
-                        (q.shape[0], past_kv.shape[-2]), dtype=attn_mask.dtype,
-                    )
-                    attn_mask = torch.cat([past_mask, attn_mask], axis=-1)
                 query_length, all_seq_length = attn_mask.shape
                 # for broadcasting over all batches
                 batch_size = 1
             elif len(attn_mask.shape) == 3:
-                if past_kv is not None:
-                    past_mask = torch.zeros(
-                        (q.shape[0], q.shape[-2], past_kv.shape[-2]),
-                        dtype=attn_mask.dtype,
-                    )
-                    attn_mask = torch.cat([past_mask, attn_mask], axis=-1)
                 batch_size, query_length, all_seq_length = attn_mask.shape
             else:
                 num_heads = attn_mask.shape[1]
-                if past_kv is not None:
-                    past_mask = torch.zeros(
-                        (q.shape[0], num_heads, q.shape[-2], past_kv.shape[-2]),
-                        dtype=attn_mask.dtype,
-                    )
-                    attn_mask = torch.cat([past_mask, attn_mask], axis=-1)
                 (
                     batch_size,
                     num_heads,
@@ -513,6 +572,20 @@ class MultiheadAttention(nn.Module):
 
         return attn_mask_reshaped
 
+    def _pad_mask_for_past_kv(self, mask, past_kv, q):
+        """Extend a mask that only covers the current keys to the past keys,
+        which are never masked. Masks that already cover all keys are returned
+        unchanged."""
+        past_length = get_past_length(past_kv)
+        if past_length == 0 or mask.shape[-1] != q.shape[-2]:
+            return mask
+        past_mask = torch.zeros(
+            (*mask.shape[:-1], past_length),
+            dtype=mask.dtype,
+            device=mask.device,
+        )
+        return torch.cat([past_mask, mask], axis=-1)
+
     def process_key_padding_mask(self, key_padding_mask, attn_mask, past_kv, q):
         key_padding_mask_reshaped = None
 
@@ -529,13 +602,9 @@ class MultiheadAttention(nn.Module):
                 key_padding_mask = key_padding_mask.to(torch.bool)
 
             # for broadcasting over all heads and queries
-            if past_kv is not None:
-                past_mask = torch.zeros(
-                    (q.shape[0], past_kv.shape[-2]), dtype=attn_mask.dtype,
-                )
-                key_padding_mask = torch.cat(
-                    [past_mask, key_padding_mask], axis=-1
-                )
+            key_padding_mask = self._pad_mask_for_past_kv(
+                key_padding_mask, past_kv, q
+            )
             batch_size, all_seq_length = key_padding_mask.shape
 
             # compute the attention_bias based on the mask.
@@ -638,7 +707,162 @@ class MultiheadAttention(nn.Module):
 
         return attention_output
 
+    def expand_kv_heads(self, x):
+        # May get overriden by attention schemas with fewer key/value heads
+        return x
+
+    def calculate_fused_attention_output(
+        self, q, k, v, attn_mask, key_padding_mask, position_bias
+    ):
+        """Compute attention without materializing the attention logits of
+        all heads, using the implementation selected by
+        ``attention_implementation``."""
+        k = self.expand_kv_heads(k)
+        v = self.expand_kv_heads(v)
+        if self.attention_implementation == "sdpa":
+            attention_output = self._sdpa_attention(
+                q,
+                k,
+                v,
+                self.combine_masks(attn_mask, key_padding_mask),
+                position_bias,
+            )
+        else:
+            attention_output = self._chunked_attention(
+                q, k, v, attn_mask, key_padding_mask, position_bias
+            )
+
+        # Recombine heads --> [batch_size, seq_length, embed_dim].
+        attention_output = self._combine_heads(attention_output)
+        return self.proj_output_dense_layer(attention_output)
+
+    def _sdpa_attention(self, q, k, v, attention_bias, position_bias):
+        if not self.scale_dot_product:
+            # undo the 1/sqrt(head_dim) scaling of scaled_dot_product_attention
+            q = q * torch.tensor(float(q.shape[-1]) ** 0.5, dtype=q.dtype)
+        mask = attention_bias
+        if mask is not None and mask.dtype == torch.bool:
+            if position_bias is None:
+                # boolean masks of sdpa select the positions to attend to
+                mask = mask.logical_not()
+            else:
+                mask = self.apply_attention_bias(
+                    torch.zeros(mask.shape, dtype=q.dtype, device=q.device),
+                    mask,
+                )
+        if position_bias is not None:
+            position_bias = position_bias.type_as(q).unsqueeze(0)
+            mask = position_bias if mask is None else mask + position_bias
+        if mask is not None and mask.is_floating_point():
+            mask = mask.type_as(q)
+        return nn.functional.scaled_dot_product_attention(
+            q,
+            k,
+            v,
+            attn_mask=mask,
+            dropout_p=self.dropout_layer.p if self.training else 0.0,
+        )
+
+    @staticmethod
+    def _get_bias_block(bias, q_start, q_end, k_start, k_end):
+        """Returns a block of queries and keys of a mask or bias. Blockwise
+        biases generate the block, tensors are sliced along the dimensions
+        they aren't broadcast over."""
+        if bias is None:
+            return None
+        if isinstance(bias, BlockwiseAttentionBias):
+            return bias.block(q_start, q_end, k_start, k_end)
+        if bias.shape[-2] > 1:
+            bias = bias[..., q_start:q_end, :]
+        if bias.shape[-1] > 1:
+            bias = bias[..., k_start:k_end]
+        return bias
+
+    def _chunked_attention(
+        self, q, k, v, attn_mask, key_padding_mask, position_bias
+    ):
+        """Attention over blocks of ``attention_chunk_size`` queries and keys.
+        For each block of queries, the softmax is accumulated across blocks of
+        keys by rescaling the partial sums whenever the running maximum of the
+        logits increases, so that only the logits of one pair of blocks exist
+        at any time. Masks and position biases given as a
+        ``BlockwiseAttentionBias`` (e.g. causal masks, ALiBi and relative
+        position biases) are generated per block, so they don't exist for the
+        whole sequence either. Tensors are sliced per block and combined like
+        ``combine_masks`` does."""
+        q = self._scale_q(q)
+        chunk_size = self.attention_chunk_size
+        query_length, key_length = q.shape[-2], k.shape[-2]
+        acc_dtype = (
+            torch.float32
+            if self.softmax_dtype_fp32 or q.dtype == torch.float32
+            else q.dtype
+        )
+        outputs = []
+        for q_start in range(0, query_length, chunk_size):
+            q_end = min(q_start + chunk_size, query_length)
+            q_block = q[:, :, q_start:q_end]
+            block_shape = q_block.shape[:-1]
+            running_max = torch.full(
+                block_shape, float("-inf"), dtype=acc_dtype, device=q.device
+            )
+            running_sum = torch.zeros(
+                block_shape, dtype=acc_dtype, device=q.device
+            )
+            acc = torch.zeros(
+                (*block_shape, v.shape[-1]), dtype=acc_dtype, device=q.device
+            )
+            for k_start in range(0, key_length, chunk_size):
+                k_end = min(k_start + chunk_size, key_length)
+                logits = torch.matmul(
+                    q_block, k[:, :, k_start:k_end].transpose(-1, -2)
+                )
+                block = (q_start, q_end, k_start, k_end)
+                attention_bias = self.combine_masks(
+                    self._get_bias_block(attn_mask, *block),
+                    self._get_bias_block(key_padding_mask, *block),
+                )
+                if attention_bias is not None:
+                    logits = self.apply_attention_bias(logits, attention_bias)
+                if position_bias is not None:
+                    # [num_heads, query_length, key_length] broadcasts over
+                    # the batch dimension
+                    logits = logits + self._get_bias_block(
+                        position_bias, *block
+                    ).type_as(logits)
+                logits = logits.to(acc_dtype)
+
+                block_max = torch.maximum(running_max, logits.amax(dim=-1))
+                # rows whose keys are all masked so far have a maximum of -inf
+                # and contribute nothing, instead of producing NaNs
+                fully_masked = block_max == float("-inf")
+                correction = torch.where(
+                    fully_masked,
+                    torch.zeros_like(block_max),
+                    torch.exp(running_max - block_max),
+                )
+                probs = torch.where(
+                    fully_masked.unsqueeze(-1),
+                    torch.zeros_like(logits),
+                    torch.exp(logits - block_max.unsqueeze(-1)),
+                )
+                running_sum = running_sum * correction + probs.sum(dim=-1)
+                # dropout commutes with the normalization by running_sum
+                probs = self.dropout_layer(probs)
+                acc = acc * correction.unsqueeze(-1) + torch.matmul(
+                    probs.to(v.dtype), v[:, :, k_start:k_end]
+                ).to(acc_dtype)
+                running_max = block_max
+            outputs.append((acc / running_sum.unsqueeze(-1)).to(v.dtype))
+        return torch.cat(outputs, dim=-2)
+
     def check_extra_params(params):
         assert all(
-            k in {"attention_kernel"} for k in params.keys()
+            k
+            in {
+                "attention_kernel",
+                "attention_implementation",
+                "attention_chunk_size",
+            }
+            for k in params.keys()
         ), "Overflow extra params for attention module `MultiheadAttention`"
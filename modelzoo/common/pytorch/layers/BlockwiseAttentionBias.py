@@ -0,0 +1,105 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from abc import ABC, abstractmethod
+
+import torch
+
+
+class BlockwiseAttentionBias(ABC):
+    r"""An attention mask or position bias that is generated one block of
+    queries and keys at a time. The ``chunked`` attention implementation of
+    ``MultiheadAttention`` only generates the blocks it is processing, so the
+    mask or bias never exists for the whole sequence. The other attention
+    implementations call ``materialize``.
+
+    Args:
+        query_length (int): Number of queries.
+        key_length (int): Number of keys, including past keys.
+    """
+
+    def __init__(self, query_length, key_length):
+        self.query_length = query_length
+        self.key_length = key_length
+
+    @abstractmethod
+    def block(self, q_start, q_end, k_start, k_end):
+        """Returns the mask or bias of queries ``[q_start, q_end)`` and keys
+        ``[k_start, k_end)``, with the same number of dimensions as the
+        materialized tensor."""
+
+    def materialize(self):
+        """Returns the mask or bias of all queries and keys."""
+        return self.block(0, self.query_length, 0, self.key_length)
+
+
+class BlockwiseCausalMask(BlockwiseAttentionBias):
+    r"""Causal mask of shape ``[1, 1, query_length, key_length]``, equal to
+    the one built by ``build_broadcastable_attention_mask`` with
+    ``build_causal=True``.
+
+    Args:
+        query_length (int): Number of queries.
+        key_length (int): Number of keys, including past keys.
+        dtype (torch.dtype): Dtype of the mask. Masked positions are set to
+            the smallest value of the dtype.
+        device: (torch.device): Device to create the mask on.
+        past_length (int): Position of the first query.
+    """
+
+    def __init__(
+        self, query_length, key_length, dtype=None, device=None, past_length=0
+    ):
+        super().__init__(query_length, key_length)
+        self.dtype = torch.float16 if dtype is None else dtype
+        self.device = device
+        self.past_length = past_length
+
+    def block(self, q_start, q_end, k_start, k_end):
+        query_position = torch.arange(q_start, q_end, device=self.device)
+        key_position = torch.arange(k_start, k_end, device=self.device)
+        causal_mask = (
+            key_position[None, :] - query_position[:, None] > self.past_length
+        ).to(self.dtype)
+        causal_mask = causal_mask * torch.finfo(self.dtype).min
+        return causal_mask[None, None, :, :]
+
+
+class BlockwisePositionBias(BlockwiseAttentionBias):
+    r"""Position bias of shape ``[num_heads, query_length, key_length]``
+    computed by an ``AlibiPositionEmbeddingLayer`` or a
+    ``RelativePositionEmbeddingLayer``.
+
+    Args:
+        embedding_helper (nn.Module): The position embedding layer.
+        query_length (int): Number of queries.
+        key_length (int): Number of keys, including past keys.
+        past_kv: Past keys and values. If provided, the queries are the last
+            ``query_length`` of the ``key_length`` positions.
+    """
+
+    def __init__(self, embedding_helper, query_length, key_length, past_kv=None):
+        super().__init__(query_length, key_length)
+        self.embedding_helper = embedding_helper
+        self.query_offset = (
+            key_length - query_length if past_kv is not None else 0
+        )
+
+    def block(self, q_start, q_end, k_start, k_end):
+        return self.embedding_helper.compute_block_bias(
+            q_end - q_start,
+            k_end - k_start,
+            query_offset=self.query_offset + q_start,
+            key_offset=k_start,
+        )
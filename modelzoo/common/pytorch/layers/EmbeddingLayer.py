@@ -315,8 +315,10 @@ class EmbeddingLayer(nn.Module):
             position_embeddings = self.position_embeddings.to(dtype=embed_dtype)
             if position_ids is None:
                 length = input_shape[-1]
-                if length != position_embeddings.size(dim=0):
-                    position_embeddings = position_embeddings[:length]
+                if past_length or length != position_embeddings.size(dim=0):
+                    position_embeddings = position_embeddings[
+                        past_length : past_length + length
+                    ]
             else:
                 position_ids = position_ids.to(torch.long)
                 position_embeddings = position_embeddings[position_ids]
@@ -100,12 +100,13 @@ class GPTJDecoderLayer(TransformerDecoderLayer):
         x = tgt
         residual = x
         hidden_normed = self.norm1(x)
+        self_attn_past_kv, _ = self._split_past_kv(past_kv)
         attn_output = self._sa_block(
             hidden_normed,
             tgt_mask,
             tgt_key_padding_mask,
             rotary_position_embedding_helper,
-            past_kv=past_kv[:2] if past_kv is not None else None,
+            past_kv=self_attn_past_kv,
             cache_present_kv=cache_present_kv,
             self_attn_position_bias=self_attn_position_bias,
         )
@@ -116,4 +117,6 @@ class GPTJDecoderLayer(TransformerDecoderLayer):
 
         ffn_output = self.ffn(hidden_normed)
         outputs = residual + ffn_output + attn_output[0]
+        if cache_present_kv:
+            return outputs, attn_output[1]
         return outputs
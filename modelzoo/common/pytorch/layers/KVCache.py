@@ -0,0 +1,106 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import torch
+
+
+class KVCache:
+    """Preallocated cache of the keys and values of one self-attention layer,
+    for autoregressive decoding.
+
+    It can be passed as ``past_kv`` in place of a ``(keys, values)`` tuple.
+    Instead of concatenating the past and present keys and values on every
+    step, the present ones are written into buffers of ``max_length``
+    positions that are allocated on the first update, and views of the filled
+    part of the buffers are used for attention.
+
+    Indexing the cache returns the keys (``0``) or values (``1``) of the past
+    positions only. New entries become part of the past once ``advance`` is
+    called, which ``TransformerDecoder`` does after all of its layers ran, so
+    that every layer sees the same past length during a forward pass.
+
+    Args:
+        max_length (int): Maximum number of positions to cache.
+    """
+
+    def __init__(self, max_length):
+        self.max_length = max_length
+        self.length = 0
+        self.keys = None
+        self.values = None
+        self._pending = 0
+
+    def __getitem__(self, index):
+        if index not in (0, 1):
+            raise IndexError(f"KVCache index must be 0 or 1, got {index}")
+        if self.keys is None:
+            raise ValueError("KVCache is empty, call update first.")
+        buffer = self.keys if index == 0 else self.values
+        return buffer[:, :, : self.length]
+
+    def __len__(self):
+        return 2
+
+    def update(self, k, v):
+        """Write the keys and values of the current positions after the past
+        ones.
+
+        Args:
+            k (Tensor): Keys, shape ``[batch_size, num_heads, seq_length, head_dim]``.
+            v (Tensor): Values, same shape as ``k``.
+
+        Returns:
+            Keys and values of the past and current positions.
+        """
+        if self.keys is None:
+            self.keys = k.new_empty(
+                (*k.shape[:2], self.max_length, k.shape[-1])
+            )
+            self.values = v.new_empty(
+                (*v.shape[:2], self.max_length, v.shape[-1])
+            )
+        end = self.length + k.shape[-2]
+        if end > self.max_length:
+            raise ValueError(
+                f"KVCache can hold {self.max_length} positions, but "
+                f"{end} were requested."
+            )
+        self.keys[:, :, self.length : end] = k
+        self.values[:, :, self.length : end] = v
+        self._pending = k.shape[-2]
+        return self.keys[:, :, :end], self.values[:, :, :end]
+
+    def advance(self):
+        """Make the entries written by the last update part of the past."""
+        self.length += self._pending
+        self._pending = 0
+
+
+def advance_kv_caches(past_kv):
+    """Call ``advance`` on every ``KVCache`` in a list of per-layer caches."""
+    if past_kv is None:
+        return
+    for layer_past_kv in past_kv:
+        if isinstance(layer_past_kv, KVCache):
+            layer_past_kv.advance()
+
+
+def get_past_length(past_kv):
+    """Number of cached positions in ``past_kv``, either a ``KVCache`` or a
+    ``(keys, values)`` tuple."""
+    if past_kv is None:
+        return 0
+    if isinstance(past_kv, KVCache):
+        return past_kv.length
+    return past_kv[0].shape[-2]
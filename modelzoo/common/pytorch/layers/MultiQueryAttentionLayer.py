@@ -61,6 +61,8 @@ class MultiQueryAttention(MultiheadAttention):
             See accepted values below.
                 ``default`` - Optimized implementation.
                 ``compatible`` - Non-optimized but most compatible implementation.
+        attention_implementation (str): See ``MultiheadAttention``.
+        attention_chunk_size (int): See ``MultiheadAttention``.
         device (optional): Device to create the model parameters on, can be a cuda device or CS device.
     """
 
@@ -85,6 +87,8 @@ class MultiQueryAttention(MultiheadAttention):
         scale_qk_dot_by_d=False,
         softmax_dtype_fp32=True,
         attention_kernel: Optional[str] = None,
+        attention_implementation: Optional[str] = None,
+        attention_chunk_size: int = 1024,
         device=None,
         # MQA specific
         num_kv_groups=1,
@@ -109,6 +113,8 @@ class MultiQueryAttention(MultiheadAttention):
             scale_qk_dot_by_d=scale_qk_dot_by_d,
             softmax_dtype_fp32=softmax_dtype_fp32,
             attention_kernel=attention_kernel,
+            attention_implementation=attention_implementation,
+            attention_chunk_size=attention_chunk_size,
             device=device,
         )
 
@@ -204,6 +210,12 @@ class MultiQueryAttention(MultiheadAttention):
         x = x.reshape(batch_size, self.num_heads, seq_length, self.head_dim)
         return x
 
+    def expand_kv_heads(self, x):
+        if self.num_kv_groups > 1:
+            return self.expand_kv_over_group_dim(x)
+        batch_size, _, seq_length, head_dim = x.shape
+        return x.expand(batch_size, self.num_heads, seq_length, head_dim)
+
     def calculate_attention_logits(self, q, k):
         if self.num_kv_groups > 1:
             k = self.expand_kv_over_group_dim(k)
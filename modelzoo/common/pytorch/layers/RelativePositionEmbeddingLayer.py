@@ -92,23 +92,37 @@ class RelativePositionEmbeddingLayer(nn.Module):
             seq_length (int): the length of query tokens.
             key_length (int): the length of key tokens.
 
+            past_kv: Past keys and values. If provided, the queries are the
+                last ``seq_length`` of the ``key_length`` positions.
+
         Returns:
             Position bias tensor with shape [num_heads, query_length, key_length]
         """
-
-        position_bias = self._compute_bias(seq_length, key_length)
-
         # if key and values are already calculated we want only
-        # the last query position bias
-        if past_kv is not None:
-            position_bias = position_bias[:, :, -seq_length, :]
+        # the bias of the last query positions
+        query_offset = key_length - seq_length if past_kv is not None else 0
+        return self._compute_bias(seq_length, key_length, query_offset)
 
-        return position_bias
+    def compute_block_bias(
+        self, query_length, key_length, query_offset=0, key_offset=0
+    ):
+        """Return the position bias of ``query_length`` queries starting at
+        position ``query_offset`` and ``key_length`` keys starting at position
+        ``key_offset``, with shape [num_heads, query_length, key_length]."""
+        return self._compute_bias(
+            query_length, key_length, query_offset, key_offset
+        )
 
     @staticmethod
-    def compute_raw_relative_positions(query_length, key_length, device=None):
-        context_position = torch.arange(query_length, device=device)[:, None]
-        memory_position = torch.arange(key_length, device=device)[None, :]
+    def compute_raw_relative_positions(
+        query_length, key_length, device=None, query_offset=0, key_offset=0
+    ):
+        context_position = torch.arange(
+            query_offset, query_offset + query_length, device=device
+        )[:, None]
+        memory_position = torch.arange(
+            key_offset, key_offset + key_length, device=device
+        )[None, :]
 
         # shape (query_length, key_length)
         relative_position = memory_position - context_position
@@ -183,10 +197,16 @@ class RelativePositionEmbeddingLayer(nn.Module):
         # cast to int32_t because WS weight host gather can only handle int32
         return relative_buckets.to(torch.int32)
 
-    def compute_relative_positions(self, query_length, key_length):
+    def compute_relative_positions(
+        self, query_length, key_length, query_offset=0, key_offset=0
+    ):
         device = self.relative_attention_bias.weight.device
         relative_position = self.compute_raw_relative_positions(
-            query_length, key_length, device=device
+            query_length,
+            key_length,
+            device=device,
+            query_offset=query_offset,
+            key_offset=key_offset,
         )
 
         if self.num_relative_attention_buckets is not None:
@@ -199,11 +219,15 @@ class RelativePositionEmbeddingLayer(nn.Module):
             )
         return relative_position
 
-    def _compute_bias(self, query_length, key_length):
+    def _compute_bias(
+        self, query_length, key_length, query_offset=0, key_offset=0
+    ):
         """Compute binned relative position bias.
         Args:
             query_length (int): length of the query tensor.
             key_length (int): length of the key tensor.
+            query_offset (int): position of the first query.
+            key_offset (int): position of the first key.
         Returns:
             values (Tensor): computed values for position bias.
         """
@@ -211,7 +235,7 @@ class RelativePositionEmbeddingLayer(nn.Module):
             self.allow_negative_buckets is False
         ), "Cannot apply negative relative positions to embedding"
         relative_position_bucket = self.compute_relative_positions(
-            query_length, key_length
+            query_length, key_length, query_offset, key_offset
         )
 
         # shape (query_length, key_length, num_heads)
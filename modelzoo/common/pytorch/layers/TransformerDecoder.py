@@ -21,6 +21,7 @@ from typing import List, Optional, Tuple, Union
 import torch.nn as nn
 from torch import Tensor
 
+from modelzoo.common.pytorch.layers.KVCache import advance_kv_caches
 from modelzoo.common.pytorch.layers.utils import _get_clones
 from modelzoo.common.pytorch.model_utils.RotaryPositionEmbeddingHelper import (
     RotaryPositionEmbeddingHelper,
@@ -100,17 +101,14 @@ class TransformerDecoder(nn.Module):
                 this is the tensor containing position bias to apply in cross-attention.
             rotary_position_embedding_helper (Optional[RotaryPositionEmbeddingHelper]): 
                 A helper class to apply rotary embedding on the input tensor.
-            past_kv: Past keys and values for each of the decoder layers (optional).
+            past_kv: Past keys and values for each of the decoder layers,
+                either tuples of tensors or ``KVCache`` objects (optional).
             cache_present_kv: Specifies if the present keys and values
                 must be cached and returned. (optional).
 
         Shape:
             see the docs in Transformer class.
         """
-        assert (
-            past_kv is None and not cache_present_kv
-        ), "Cannot provide past_kv because inference is not supported yet."
-
         output = tgt
         present_kv = []
 
@@ -137,6 +135,10 @@ class TransformerDecoder(nn.Module):
                 present_kv.append(output[1])
                 output = output[0]
 
+        # every layer has seen the same past length, the present keys and
+        # values can now become part of the past
+        advance_kv_caches(past_kv)
+
         if self.norm is not None:
             output = self.norm(output)
 
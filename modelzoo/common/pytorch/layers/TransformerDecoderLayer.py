@@ -24,6 +24,7 @@ from torch.nn import Dropout, LayerNorm
 
 from modelzoo.common.pytorch.layers.AttentionHelper import get_attention_module
 from modelzoo.common.pytorch.layers.FeedForwardNetwork import FeedForwardNetwork
+from modelzoo.common.pytorch.layers.KVCache import KVCache
 from modelzoo.common.pytorch.model_utils.RotaryPositionEmbeddingHelper import (
     RotaryPositionEmbeddingHelper,
 )
@@ -241,7 +242,8 @@ class TransformerDecoderLayer(nn.Module):
                 A helper class to apply rotary embedding on the input tensor.
             past_kv: Past keys and values for self attention and (if applicable) cross
                 attention modules. Key/value tensors have shape
-                ``[batch_size, num_heads, seq_length, embed_dim / num_heads]``. (optional).
+                ``[batch_size, num_heads, seq_length, embed_dim / num_heads]``.
+                A ``KVCache`` can be passed instead for self attention only. (optional).
             cache_present_kv: Specifies if the present keys and values
                 must be cached and returned. Needed to speed up the
                 computations when the decoder is called within an
@@ -253,10 +255,7 @@ class TransformerDecoderLayer(nn.Module):
             see the docs in Transformer class.
         """
         # see Fig. 1 of https://arxiv.org/pdf/2002.04745v1.pdf
-
-        assert (
-            past_kv is None and not cache_present_kv
-        ), "Cannot provide past_kv because inference is not supported yet."
+        self_attn_past_kv, cross_attn_past_kv = self._split_past_kv(past_kv)
 
         x = tgt
         if self.norm_first:
@@ -265,7 +264,7 @@ class TransformerDecoderLayer(nn.Module):
                 tgt_mask,
                 tgt_key_padding_mask,
                 rotary_position_embedding_helper=rotary_position_embedding_helper,
-                past_kv=past_kv[:2] if past_kv is not None else None,
+                past_kv=self_attn_past_kv,
                 cache_present_kv=cache_present_kv,
                 self_attn_position_bias=self_attn_position_bias,
                 **extra_args,
@@ -279,7 +278,7 @@ class TransformerDecoderLayer(nn.Module):
                     memory,
                     memory_mask,
                     memory_key_padding_mask,
-                    past_kv=past_kv[2:] if past_kv is not None else None,
+                    past_kv=cross_attn_past_kv,
                     cache_present_kv=cache_present_kv,
                     cross_attn_position_bias=cross_attn_position_bias,
                     **extra_args,
@@ -297,7 +296,7 @@ class TransformerDecoderLayer(nn.Module):
                 tgt_mask,
                 tgt_key_padding_mask,
                 rotary_position_embedding_helper=rotary_position_embedding_helper,
-                past_kv=past_kv[:2] if past_kv is not None else None,
+                past_kv=self_attn_past_kv,
                 cache_present_kv=cache_present_kv,
                 self_attn_position_bias=self_attn_position_bias,
                 **extra_args,
@@ -310,7 +309,7 @@ class TransformerDecoderLayer(nn.Module):
                     memory,
                     memory_mask,
                     memory_key_padding_mask,
-                    past_kv=past_kv[2:] if past_kv is not None else None,
+                    past_kv=cross_attn_past_kv,
                     cache_present_kv=cache_present_kv,
                     cross_attn_position_bias=cross_attn_position_bias,
                     **extra_args,
@@ -332,6 +331,16 @@ class TransformerDecoderLayer(nn.Module):
             )
             return x, present_kv
 
+    def _split_past_kv(self, past_kv):
+        if past_kv is None:
+            return None, None
+        if isinstance(past_kv, KVCache):
+            assert (
+                not self.add_cross_attention
+            ), "KVCache is not supported with cross attention."
+            return past_kv, None
+        return past_kv[:2], past_kv[2:]
+
     # self-attention block
     def _sa_block(
         self,
@@ -24,6 +24,7 @@ from modelzoo.common.pytorch import cb_model as cm
 from modelzoo.common.pytorch import cbtorch
 
 from .AlibiPositionEmbeddingLayer import AlibiPositionEmbeddingLayer
+from .BlockwiseAttentionBias import BlockwisePositionBias
 from .RelativePositionEmbeddingLayer import RelativePositionEmbeddingLayer
 
 LOSS_SCOPE = "loss"
@@ -53,15 +54,23 @@ def apply_loss_reduction(loss, reduction):
         return loss
 
 
-def apply_position_bias(embedding_helper, seq_length, key_length, past_kv=None):
+def apply_position_bias(
+    embedding_helper, seq_length, key_length, past_kv=None, blockwise=False
+):
     self_attn_position_bias = None
     if isinstance(
         embedding_helper,
         (RelativePositionEmbeddingLayer, AlibiPositionEmbeddingLayer,),
     ):
-        self_attn_position_bias = embedding_helper(
-            seq_length, key_length, past_kv=past_kv
-        )
+        if blockwise:
+            # generated per block by the chunked attention implementation
+            self_attn_position_bias = BlockwisePositionBias(
+                embedding_helper, seq_length, key_length, past_kv=past_kv
+            )
+        else:
+            self_attn_position_bias = embedding_helper(
+                seq_length, key_length, past_kv=past_kv
+            )
     return self_attn_position_bias
 
 
@@ -58,12 +58,13 @@ class LossSaver:
             scalar_name = "loss" if epoch is None else f"loss (epoch {epoch})"
             self.writer.add_scalar(scalar_name, self._last_saved_loss, step)
 
-    def accumulate(self, loss: torch.Tensor):
+    def accumulate(self, loss: torch.Tensor, num_steps: int = 1):
         """Accumulates loss values. This method will reduce losses across workers
         and update a total_loss
 
         Args:
             loss: The loss tensor whose value will be stored.
+            num_steps: The number of steps whose losses are summed in `loss`.
         """
         if self._last_saved_loss != -1:
             self._total_loss += self._last_saved_loss
@@ -75,7 +76,7 @@ class LossSaver:
         else:
             self._total_loss += loss.item()
 
-        self._total_size += 1
+        self._total_size += num_steps
 
     def clear(self):
         """Clears the total_loss value"""
@@ -176,36 +176,40 @@ class _PipelineAUCMetric(CBMetric):
                 f"Values in `predictions` tensor must be in [0, 1]"
             )
 
-        # Tile predictions to have shape (self.num_thresholds, num_predictions)
-        preds_tiled = torch.tile(predictions, (self.num_thresholds, 1))
-
-        # Tile thresholds to have shape (self.num_thresholds, num_predictions)
-        thresh_tiled = self.thresholds.expand(-1, predictions.shape[0])
-
-        # Compare predictions and threshold
-        pred_is_pos = torch.gt(preds_tiled, thresh_tiled)
-        pred_is_neg = torch.logical_not(pred_is_pos)
+        # Bucketize each prediction by the number of thresholds it is above,
+        # so that it counts as predicted positive for exactly the thresholds
+        # below its bucket index. This avoids comparing every prediction
+        # against every threshold.
+        thresholds = self.thresholds.flatten()
+        dtype = torch.promote_types(predictions.dtype, thresholds.dtype)
+        buckets = torch.bucketize(
+            predictions.to(dtype), thresholds.to(predictions.device, dtype)
+        )
         label_is_pos = labels > 0
-        label_is_neg = torch.logical_not(label_is_pos)
 
-        def weighted_assign_add(label, pred, var, weights=None):
-            label_and_pred = torch.logical_and(label, pred)
-            if weights is not None:
-                label_and_pred = label_and_pred.mul(weights)
-            var.add_(torch.sum(label_and_pred, axis=-1))
+        def weighted_histogram(mask):
+            return torch.bincount(
+                buckets[mask],
+                weights=None if weights is None else weights[mask],
+                minlength=self.num_thresholds + 1,
+            )
 
-        # Update values for TP, FP, FN, TN
-        weighted_assign_add(
-            label_is_pos, pred_is_pos, self.true_positive, weights
-        )
-        weighted_assign_add(
-            label_is_neg, pred_is_pos, self.false_positive, weights
-        )
-        weighted_assign_add(
-            label_is_pos, pred_is_neg, self.false_negative, weights
+        def assign_add_from_histogram(histogram, var_pos, var_neg):
+            # Predictions in buckets above t are predicted positive for
+            # threshold t, the ones in buckets up to t are predicted negative
+            var_pos.add_(histogram.flip(0).cumsum(0).flip(0)[1:].cpu())
+            var_neg.add_(histogram.cumsum(0)[: self.num_thresholds].cpu())
+
+        # Update values for TP, FN, FP, TN
+        assign_add_from_histogram(
+            weighted_histogram(label_is_pos),
+            self.true_positive,
+            self.false_negative,
         )
-        weighted_assign_add(
-            label_is_neg, pred_is_neg, self.true_negative, weights
+        assign_add_from_histogram(
+            weighted_histogram(torch.logical_not(label_is_pos)),
+            self.false_positive,
+            self.true_negative,
         )
 
     def interpolate_pr_auc(self):
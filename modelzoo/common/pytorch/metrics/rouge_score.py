@@ -17,18 +17,24 @@ Rouge Score metric for PyTorch.
 """
 
 import string
-from collections import Counter
 from typing import Optional
 
 import numpy as np
 import torch
-from nltk import ngrams
 
 from modelzoo.common.pytorch.metrics.cb_metric import CBMetric
 from modelzoo.transformers.data_processing.tokenizers.Tokenization import (
     FullTokenizer,
 )
 
+# Bases of the polynomial hashes of words and n-grams, which are computed
+# modulo 2**64 by letting uint64 arithmetic wrap around.
+_WORD_HASH_BASE = 1000003
+_NGRAM_HASH_BASE = 0x100000001B3
+# Mixed into the n-gram hashes so that n-grams of different examples differ.
+_ROW_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_HASH_MASK = (1 << 64) - 1
+
 
 class _PipelineRougeScoreMetric(CBMetric):
     """Custom evaluation metric for calculating rouge score when performing
@@ -68,6 +74,16 @@ class _PipelineRougeScoreMetric(CBMetric):
         self.max_n = max_n
         self.vocab_file = vocab_file
         self.tokenizer = FullTokenizer(self.vocab_file)
+        self._vocab_hashes = _VocabHashes(self.tokenizer)
+        special_words = {"[pad]", "[cls]", "[sep]"}
+        punctuation_words = set(string.punctuation)
+        self._ignored_word_hashes = np.array(
+            sorted(
+                _hash_string(word)
+                for word in special_words | punctuation_words
+            ),
+            dtype=np.uint64,
+        )
         super().__init__(name=name)
 
     def init_state(self):
@@ -84,89 +100,64 @@ class _PipelineRougeScoreMetric(CBMetric):
         """
         Compute and aggregate rouge_matrix every iteration.
         Each computation comprises of:
-            1. Convert labels to references.
-            2. Convert predictions to hypotheses.
-            3. Convert hypotheses and references to ngrams.
-            4. Calculate rouge matrix.
+            1. Extract the token ids of the references and hypotheses.
+            2. Hash the lowercased words they form, dropping punctuation and
+               special tokens.
+            3. Hash the n-grams of words of each example.
+            4. Calculate rouge matrix by intersecting the sorted n-grams.
+
+        Words and n-grams are compared by their 64 bit hashes, which gives the
+        same counts as comparing the strings barring hash collisions.
         """
+        cls_indices = cls_indices.detach().cpu().numpy()
+        cls_weights = cls_weights.detach().cpu().numpy()
+        input_ids = input_ids.detach().cpu().numpy()
+        batch_size = input_ids.shape[0]
+
+        def _ngram_hashes(segment_labels):
+            token_ids, rows = extract_text_token_ids_given_cls_indices(
+                segment_labels.detach().cpu().numpy(),
+                cls_indices,
+                cls_weights,
+                input_ids,
+            )
+            words, word_rows = self._vocab_hashes.hash_words(token_ids, rows)
+            keep = np.logical_not(np.isin(words, self._ignored_word_hashes))
+            words, word_rows = words[keep], word_rows[keep]
 
-        def _preprocess_before_rouge(sentences):
-            def _preprocess_sentence_before_rouge(sentence):
-                special_words = {"[pad]", "[cls]", "[sep]"}
-                punctuation_words = set(string.punctuation)
-                words_to_ignore = punctuation_words | special_words
-                words_in_sentence = [word.lower() for word in sentence]
-                words_in_sentence = list(
-                    filter(
-                        lambda word: word not in words_to_ignore,
-                        words_in_sentence,
-                    )
-                )
-
-                return " ".join(words_in_sentence)
-
-            words = np.array(
-                [
-                    _preprocess_sentence_before_rouge(sentence)
-                    for sentence in sentences
-                ]
+            # A sentence without words is split into a single empty word
+            empty_rows = np.flatnonzero(
+                np.bincount(word_rows, minlength=batch_size) == 0
             )
-            return words
-
-        predictions = predictions.detach()
-        labels = labels.detach()
-        cls_indices = cls_indices.detach()
-        cls_weights = cls_weights.detach()
-        input_ids = input_ids.detach()
-        hypotheses = extract_text_words_given_cls_indices(
-            predictions, cls_indices, cls_weights, input_ids, self.tokenizer
+            words = np.concatenate(
+                [words, np.full(len(empty_rows), _hash_string(""), np.uint64)]
+            )
+            word_rows = np.concatenate([word_rows, empty_rows])
+            order = np.argsort(word_rows, kind="stable")
+            return _hash_ngrams(words[order], word_rows[order], self.max_n)
+
+        hypotheses_ngrams = _ngram_hashes(predictions)
+        references_ngrams = _ngram_hashes(labels)
+
+        hypotheses_ngrams, hypotheses_freq = np.unique(
+            hypotheses_ngrams, return_counts=True
         )
-        references = extract_text_words_given_cls_indices(
-            labels, cls_indices, cls_weights, input_ids, self.tokenizer
+        references_ngrams, references_freq = np.unique(
+            references_ngrams, return_counts=True
+        )
+        _, hypotheses_idx, references_idx = np.intersect1d(
+            hypotheses_ngrams,
+            references_ngrams,
+            assume_unique=True,
+            return_indices=True,
         )
-
-        hypotheses = _preprocess_before_rouge(hypotheses)
-        references = _preprocess_before_rouge(references)
 
         current_rouge_matrix = np.zeros((3,), dtype=np.float64)
-
-        hypotheses = [x.split(" ") for x in hypotheses]
-        references = [x.split(" ") for x in references]
-
-        hypotheses_ngrams = [
-            ngrams(sentence, self.max_n) for sentence in hypotheses
-        ]
-        references_ngrams = [
-            ngrams(sentence, self.max_n) for sentence in references
-        ]
-
-        hypotheses_freq = [
-            Counter(hypotheses_sentence_ngrams)
-            for hypotheses_sentence_ngrams in hypotheses_ngrams
-        ]
-        references_freq = [
-            Counter(references_sentence_ngrams)
-            for references_sentence_ngrams in references_ngrams
-        ]
-
-        matched_ngrams_freq = []
-        num_matched_ngrams = 0
-        num_references_ngrams = 0
-        num_hypotheses_ngrams = 0
-
-        # For each sentence, compute the number of matched n-grams, and
-        # total n-grams in hypotheses and references.
-        for sent_idx in range(len(hypotheses_freq)):
-            matched_ngrams_freq.append(
-                hypotheses_freq[sent_idx] & references_freq[sent_idx]
-            )
-            num_matched_ngrams += sum(matched_ngrams_freq[-1].values())
-            num_references_ngrams += sum(references_freq[sent_idx].values())
-            num_hypotheses_ngrams += sum(hypotheses_freq[sent_idx].values())
-
-        current_rouge_matrix[0] = num_matched_ngrams
-        current_rouge_matrix[1] = num_references_ngrams
-        current_rouge_matrix[2] = num_hypotheses_ngrams
+        current_rouge_matrix[0] = np.minimum(
+            hypotheses_freq[hypotheses_idx], references_freq[references_idx]
+        ).sum()
+        current_rouge_matrix[1] = references_freq.sum()
+        current_rouge_matrix[2] = hypotheses_freq.sum()
 
         self.rouge_matrix += current_rouge_matrix
 
@@ -197,6 +188,166 @@ class _PipelineRougeScoreMetric(CBMetric):
         }
 
 
+def _hash_string(text):
+    """Polynomial hash of the characters of `text`, modulo 2**64."""
+    value = 0
+    for char in text:
+        value = (value * _WORD_HASH_BASE + ord(char)) & _HASH_MASK
+    return value
+
+
+def _powers(base, n):
+    """Returns `base**0, ..., base**(n - 1)` modulo 2**64."""
+    powers = np.full(n, base, dtype=np.uint64)
+    powers[0] = 1
+    return np.cumprod(powers, dtype=np.uint64)
+
+
+class _VocabHashes:
+    """Hashes of the lowercased tokens of a vocab, used to hash the words
+    formed by token ids without converting them to strings.
+
+    Args:
+        tokenizer: Tokenizer whose vocab to hash.
+    """
+
+    def __init__(self, tokenizer):
+        vocab_size = len(tokenizer.get_vocab_words())
+        tokens = [
+            token.lower()
+            for token in tokenizer.convert_ids_to_tokens(range(vocab_size))
+        ]
+        self.is_continuation = np.array(
+            [token.startswith("##") for token in tokens], dtype=bool
+        )
+        # A word piece is merged into the previous word without its `##`,
+        # unless it starts the text
+        pieces = [
+            token[2:] if is_continuation else token
+            for token, is_continuation in zip(tokens, self.is_continuation)
+        ]
+        self.token_hashes = np.array(
+            [_hash_string(token) for token in tokens], dtype=np.uint64
+        )
+        self.token_lengths = np.array(
+            [len(token) for token in tokens], dtype=np.int64
+        )
+        self.piece_hashes = np.array(
+            [_hash_string(piece) for piece in pieces], dtype=np.uint64
+        )
+        self.piece_lengths = np.array(
+            [len(piece) for piece in pieces], dtype=np.int64
+        )
+
+    def hash_words(self, token_ids, rows):
+        """Hashes the lowercased words formed by the token ids of each row,
+        joining word pieces the same way as `extract_text_words_by_token_ids`.
+
+        Args:
+            token_ids: Numpy array of token ids, grouped by row.
+            rows: Numpy array with the row of each token id.
+
+        Returns:
+            A tuple of the word hashes, and the row of each word.
+        """
+        if len(token_ids) == 0:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+
+        is_word_start = np.logical_not(self.is_continuation[token_ids])
+        is_word_start[0] = True
+        is_word_start[1:] |= rows[1:] != rows[:-1]
+
+        hashes = np.where(
+            is_word_start,
+            self.token_hashes[token_ids],
+            self.piece_hashes[token_ids],
+        )
+        lengths = np.where(
+            is_word_start,
+            self.token_lengths[token_ids],
+            self.piece_lengths[token_ids],
+        )
+
+        # The hash of a word is the sum of the hashes of its pieces, each
+        # shifted by the number of characters that follow it in the word
+        word_starts = np.flatnonzero(is_word_start)
+        word_ends = np.append(word_starts[1:], len(token_ids)) - 1
+        word_index = np.cumsum(is_word_start) - 1
+        cum_lengths = np.cumsum(lengths)
+        suffix_lengths = cum_lengths[word_ends][word_index] - cum_lengths
+        powers = _powers(_WORD_HASH_BASE, suffix_lengths.max() + 1)
+        word_hashes = np.add.reduceat(
+            hashes * powers[suffix_lengths], word_starts, dtype=np.uint64
+        )
+        return word_hashes, rows[word_starts]
+
+
+def _hash_ngrams(words, rows, n):
+    """Hashes the n-grams of consecutive words within each row.
+
+    Args:
+        words: Numpy array of word hashes, grouped by row.
+        rows: Numpy array with the row of each word.
+        n: Size of the n-grams.
+
+    Returns:
+        A numpy array with one hash per n-gram, which also depends on the row
+        the n-gram belongs to.
+    """
+    num_ngrams = len(words) - n + 1
+    if num_ngrams <= 0:
+        return np.empty(0, dtype=np.uint64)
+
+    windows = np.lib.stride_tricks.sliding_window_view(words, n)
+    ngram_hashes = (windows * _powers(_NGRAM_HASH_BASE, n)[::-1]).sum(
+        axis=1, dtype=np.uint64
+    )
+    # Drop the windows that cross a row boundary
+    ngram_rows = rows[:num_ngrams]
+    in_row = ngram_rows == rows[n - 1 :]
+    return ngram_hashes[in_row] + ngram_rows[in_row].astype(
+        np.uint64
+    ) * np.uint64(_ROW_HASH_MULTIPLIER)
+
+
+def extract_text_token_ids_given_cls_indices(
+    labels, cls_indices, cls_weights, input_ids
+):
+    """Batched version of `extract_text_tokens_given_cls_indices`.
+
+    Args:
+        labels: Numpy array of shape (batch_size, max_cls_tokens).
+        cls_indices: Numpy array of shape (batch_size, max_cls_tokens).
+        cls_weights: Numpy array of shape (batch_size, max_cls_tokens).
+        input_ids: Numpy array of shape (batch_size, max_sequence_length).
+
+    Returns:
+        A tuple of a numpy array with the extracted input ids of all examples
+        in order, and a numpy array with the example index of each of them.
+    """
+    max_sequence_length = input_ids.shape[-1]
+
+    # Extract only useful tokens with cls weights
+    # and labels not eq 0.
+    rows, cols = np.nonzero((labels * cls_weights) != 0)
+    starts = cls_indices[rows, cols].astype(np.int64)
+    ends = np.roll(cls_indices, shift=-1, axis=-1)[rows, cols].astype(np.int64)
+    # In case we reached end of sequence, the end index of the last
+    # extracted segment of an example should be max seq length.
+    is_last = np.append(rows[1:] != rows[:-1], True)[: len(rows)]
+    ends = np.where(is_last & (ends == 0), max_sequence_length, ends)
+
+    lengths = np.maximum(np.minimum(ends, max_sequence_length) - starts, 0)
+    segments = np.repeat(np.arange(len(lengths)), lengths)
+    positions = (
+        np.arange(lengths.sum())
+        - (np.cumsum(lengths) - lengths)[segments]
+        + starts[segments]
+    )
+    token_rows = rows[segments]
+    return input_ids[token_rows, positions].astype(np.int64), token_rows
+
+
 def extract_text_words_given_cls_indices(
     labels, cls_indices, cls_weights, input_ids, tokenizer
 ):
@@ -218,18 +369,21 @@ def extract_text_words_given_cls_indices(
         extracted_words: Tensor with extracted words.
     """
     batch_size = labels.shape[0]
-
-    # token_ids = []
-    extracted_words_batch = []
     max_sequence_length = input_ids.shape[-1]
-    for i in range(batch_size):
-        extracted_token_ids = extract_text_tokens_given_cls_indices(
-            labels[i], cls_indices[i], cls_weights[i], input_ids[i]
-        )
-        extracted_words = extract_text_words_by_token_ids(
+
+    token_ids, rows = extract_text_token_ids_given_cls_indices(
+        labels.cpu().numpy(),
+        cls_indices.cpu().numpy(),
+        cls_weights.cpu().numpy(),
+        input_ids.cpu().numpy(),
+    )
+    row_starts = np.searchsorted(rows, np.arange(1, batch_size))
+    extracted_words_batch = [
+        extract_text_words_by_token_ids(
             extracted_token_ids, tokenizer, max_sequence_length
         )
-        extracted_words_batch.append(extracted_words)
+        for extracted_token_ids in np.split(token_ids, row_starts)
+    ]
 
     return np.array(extracted_words_batch)
 
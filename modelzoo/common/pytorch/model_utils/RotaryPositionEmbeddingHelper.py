@@ -15,15 +15,21 @@
 import torch
 
 
-def _duplicate_interleave(m):
+def _rotate_every_two(x, sin, cos):
     """
-    A simple version of `torch.repeat_interleave` for duplicating a matrix while interleaving the copy.
+    Rotate each pair of adjacent features ``(x1, x2)`` of ``x`` by an angle,
+    given its sine and cosine with one value per pair. This computes
+    ``x * cos + rotate_every_two(x) * sin`` with interleaved ``sin`` and
+    ``cos``, writing the rotated pairs through strided views of the output
+    instead of materializing the rotated copy of ``x``, interleaved copies of
+    ``sin`` and ``cos``, or a stacked copy of the result.
     """
-    dim0 = m.shape[0]
-    m = m.view(-1, 1)  # flatten the matrix
-    m = m.repeat(1, 2)  # repeat all elements into the 2nd dimension
-    m = m.view(dim0, -1)  # reshape into a matrix, interleaving the copy
-    return m
+    x1 = x[..., ::2]
+    x2 = x[..., 1::2]
+    rotated = torch.empty_like(x)
+    rotated[..., ::2] = x1 * cos - x2 * sin
+    rotated[..., 1::2] = x2 * cos + x1 * sin
+    return rotated
 
 
 class RotaryPositionEmbeddingHelper:
@@ -31,72 +37,85 @@ class RotaryPositionEmbeddingHelper:
         super(RotaryPositionEmbeddingHelper, self).__init__()
         self.max_position_embeddings = max_position_embeddings
         self.rotary_dim = rotary_dim
+        # sin and cos of all positions, computed once per (dtype, device) and
+        # shared by all layers and all offsets
+        self._tables = {}
+        # For cs runs, the slice used by the last call wrapped as a constant
         self.sin_cached = None
         self.cos_cached = None
         self.offset = 0
+        self.length = None
+
+    def _get_tables(self, dtype, device):
+        key = (dtype, device)
+        if key not in self._tables:
+            inv_freq = 1.0 / (
+                10000
+                ** (
+                    torch.arange(0, self.rotary_dim, 2, device=device)
+                    / self.rotary_dim
+                )
+            )
+            sinusoid_inp = torch.einsum(
+                "i , j -> i j",
+                torch.arange(self.max_position_embeddings, device=device),
+                inv_freq,
+            )
+            self._tables[key] = (
+                torch.sin(sinusoid_inp).to(dtype),
+                torch.cos(sinusoid_inp).to(dtype),
+            )
+        return self._tables[key]
 
     def create_fixed_pos_emb(self, x, offset):
-        if self.sin_cached is not None and self.cos_cached is not None:
-            if self.offset == offset:
-                return self.sin_cached, self.cos_cached
-        self.offset = offset
-
         from modelzoo.common.pytorch import cb_model as cm
 
-        device = "cpu" if cm.use_cs() else x.device
+        length = x.shape[1]
+        use_cs = cm.use_cs()
+        if (
+            use_cs
+            and self.sin_cached is not None
+            and self.offset == offset
+            and self.length == length
+        ):
+            return self.sin_cached, self.cos_cached
 
-        inv_freq = 1.0 / (
-            10000
-            ** (
-                torch.arange(0, self.rotary_dim, 2, device=device)
-                / self.rotary_dim
-            )
-        )
-        sinusoid_inp = torch.einsum(
-            "i , j -> i j",
-            torch.arange(self.max_position_embeddings, device=device),
-            inv_freq,
-        )
-        sin, cos = (
-            torch.sin(sinusoid_inp).to(x.dtype),
-            torch.cos(sinusoid_inp).to(x.dtype),
+        assert (
+            self.max_position_embeddings >= length + offset
+        ), "RoPE requires max position embeddings ({}) >= sequence length ({}) + offset ({})".format(
+            self.max_position_embeddings, length, offset,
         )
 
-        sin, cos = map(_duplicate_interleave, (sin, cos))
+        device = "cpu" if use_cs else x.device
+        sin, cos = self._get_tables(x.dtype, device)
 
         def slice_at_offset(t):
-            return t[None, offset : x.shape[1] + offset, None, :]
+            return t[None, offset : length + offset, None, :]
 
-        assert (
-            self.max_position_embeddings >= x.shape[1] + offset
-        ), "RoPE requires max position embeddings ({}) >= sequence length ({}) + offset ({})".format(
-            self.max_position_embeddings, x.shape[1], offset,
-        )
         sin, cos = map(slice_at_offset, (sin, cos))
+        if not use_cs:
+            return sin, cos
 
         # For cs runs, wrap the sin and cos matrices in xla_literal so that
         # constant folding is performed.
+        self.offset = offset
+        self.length = length
         self.sin_cached = cm.make_constant(sin)
         self.cos_cached = cm.make_constant(cos)
         return self.sin_cached, self.cos_cached
 
     def _apply_rotary_pos_emb(self, x, real_seq_length, offset=0):
-        def rotate_every_two(x):
-            x1 = x[:, :, :, ::2]
-            x2 = x[:, :, :, 1::2]
-            x = torch.stack((-x2, x1), dim=-1)
-            # in einsum notation: rearrange(x, '... d j -> ... (d j)')
-            return x.flatten(-2)
-
         sin, cos = self.create_fixed_pos_emb(x, offset)
-
-        # einsum notation for lambda t: repeat(t[offset:x.shape[1]+offset,:], "n d -> () n () (d j)", j=2)
-        return (x * cos) + (rotate_every_two(x) * sin)
+        return _rotate_every_two(x, sin, cos)
 
     def rotate_tensor(self, x, real_seq_length, offset=0):
         assert (
             len(x.shape) == 4
         ), "Tensor should be of shape [batch_size, seq_length, num_heads, head_dim] !"
+        if self.rotary_dim == x.shape[-1]:
+            return self._apply_rotary_pos_emb(
+                x, real_seq_length, offset=offset
+            )
         x_rotary = x[:, :, :, : self.rotary_dim]
         x_pass = x[:, :, :, self.rotary_dim :]
         x_rotated = self._apply_rotary_pos_emb(
@@ -14,12 +14,14 @@
 
 from __future__ import annotations
 
+import inspect
 import json
 import logging
 import os
 import re
 from abc import ABC, abstractmethod
 from collections import OrderedDict
+from collections.abc import MutableMapping
 from typing import Callable, List, Optional, Tuple, Union
 
 import torch
@@ -143,6 +145,8 @@ class ConversionRule:
         self.exists = exists
         self.action = action
         self.validate_segments()
+        # compiled regex of the rule for each from_index, built on first use
+        self._patterns = [None, None]
 
     def __repr__(self) -> str:
         single_line = len(self.segments) < 2
@@ -176,6 +180,53 @@ class ConversionRule:
                     seg
                 )
 
+    def get_pattern(self, from_index: int) -> re.Pattern:
+        r"""
+        Returns the compiled regex matching keys in the `from_index` format.
+        The regex has one capture group per segment (excluding a chained
+        converter) and is only built once per `from_index`.
+        """
+        if self._patterns[from_index] is None:
+            maybe_escape = (
+                lambda elm, idx: re.escape(elm[idx])
+                if isinstance(elm, EquivalentSubkey)
+                else elm
+            )
+
+            regex_str = ""
+            for elm in self.segments[: self.num_regex_segments]:
+                assert not ConversionRule.segment_is_converter(
+                    elm
+                ), "Checkpoint convert objects can only be placed at the end of rules"
+                regex_str += "({})".format(maybe_escape(elm, from_index))
+            self._patterns[from_index] = re.compile(regex_str)
+        return self._patterns[from_index]
+
+    @property
+    def num_regex_segments(self) -> int:
+        if ConversionRule.segment_is_converter(self.segments[-1]):
+            return len(self.segments) - 1
+        return len(self.segments)
+
+    def literal_prefix(self, from_index: int) -> str:
+        r"""
+        Returns a string that every key matched by this rule in the
+        `from_index` format starts with. It is used to skip rules that cannot
+        match a key without running their regex.
+        """
+        prefix = ""
+        for elm in self.segments:
+            if isinstance(elm, EquivalentSubkey):
+                prefix += elm[from_index]
+                continue
+            if ConversionRule.segment_is_converter(elm):
+                break
+            segment_prefix, complete = _regex_literal_prefix(elm)
+            prefix += segment_prefix
+            if not complete:
+                break
+        return prefix
+
     def convert_key(
         self,
         old_key: str,
@@ -187,29 +238,12 @@ class ConversionRule:
         action_fn_args: Optional[dict] = None,
         debug: bool = False,
     ) -> bool:
-        regex_str = ""
-        maybe_escape = (
-            lambda elm, idx: re.escape(elm[idx])
-            if isinstance(elm, EquivalentSubkey)
-            else elm
-        )
-
-        regex_str = ""
         chained_converter = ConversionRule.segment_is_converter(
             self.segments[-1]
         )
-        candidate_segments = len(self.segments)
-        if chained_converter:
-            candidate_segments -= 1
-
-        for i in range(candidate_segments):
-            elm = self.segments[i]
-            assert not ConversionRule.segment_is_converter(
-                elm
-            ), "Checkpoint convert objects can only be placed at the end of rules"
-            regex_str += "({})".format(maybe_escape(elm, from_index))
+        candidate_segments = self.num_regex_segments
 
-        pattern = re.compile(regex_str)
+        pattern = self.get_pattern(from_index)
         match_result = (
             pattern.fullmatch(old_key, match_start)
             if not chained_converter
@@ -362,7 +396,11 @@ class BaseDictionaryConverter(ABC):
         assert hasattr(
             self, "rules"
         ), "Converter must have a list of conversion rules"
-        for rule in self.rules:
+        for literal_prefix, rule in self.prefixed_rules(from_index):
+            # A rule can only match keys that start with its literal prefix.
+            # Checking it first is much cheaper than running the rule.
+            if not old_key.startswith(literal_prefix, match_start):
+                continue
             did_convert = rule.convert_key(
                 old_key,
                 old_state_dict,
@@ -377,6 +415,29 @@ class BaseDictionaryConverter(ABC):
                 return True
         return False
 
+    def prefixed_rules(
+        self, from_index: int
+    ) -> List[Tuple[str, ConversionRule]]:
+        r"""
+        Returns `(literal_prefix, rule)` pairs of all rules in the order they
+        were defined, where `literal_prefix` is what every key matched by the
+        rule in the `from_index` format starts with.
+        """
+        # The prefixes are computed on first use. Subclasses may replace
+        # self.rules after construction, so they are recomputed whenever they
+        # no longer correspond to the current rules.
+        rules_id = (id(self.rules), len(self.rules))
+        cached = self.__dict__.setdefault("_prefixed_rules", [None, None])
+        if cached[from_index] is None or cached[from_index][0] != rules_id:
+            cached[from_index] = (
+                rules_id,
+                [
+                    (rule.literal_prefix(from_index), rule)
+                    for rule in self.rules
+                ],
+            )
+        return cached[from_index][1]
+
     def convert_all_keys(
         self,
         old_state_dict: OrderedDict,
@@ -601,6 +662,308 @@ class BaseCheckpointConverter_PT_PT(BaseCheckpointConverter):
             torch.save(checkpoint, file)
         return file
 
+    @classmethod
+    def convert_streaming(
+        cls,
+        index_file: str,
+        configs: Tuple[dict, dict],
+        checkpoint_from_index: int,
+        file_without_ext: str,
+        **kwargs,
+    ) -> str:
+        instance = cls()
+        return instance.convert_streaming_helper(
+            index_file,
+            configs,
+            checkpoint_from_index,
+            file_without_ext,
+            **kwargs,
+        )
+
+    def convert_streaming_helper(
+        self,
+        index_file: str,
+        configs: Tuple[dict, dict],
+        from_index: int,
+        file_without_ext: str,
+        max_shard_size: int = 10 * 1024 ** 3,
+        export_h5_checkpoint: bool = False,
+        drop_unmatched_keys: bool = False,
+        no_progress_bar: bool = True,
+        debug: bool = False,
+    ) -> str:
+        r"""
+        Converts an HF style sharded checkpoint (`.index.json`) one shard at a
+        time and writes the result as a sharded checkpoint with its own index
+        file, so that the whole model never has to be held in memory. The
+        runners load the index file of a CS checkpoint like a single
+        checkpoint file.
+
+        Keys are converted in shard order. Tensors that a rule needs from
+        other keys (e.g. K and V when packing QKV) are read from their shard
+        on demand, memory-mapped when the format allows it. A key whose
+        conversion fails is kept in memory and retried after the next shard
+        in case it depends on a key that hasn't been converted yet; only the
+        last retry raises. Output shards contain the model state dict only
+        and are written once they exceed `max_shard_size` bytes.
+
+        Returns the path of the new index file.
+        """
+        with open(index_file, "r") as f:
+            weight_map = json.load(f)["weight_map"]
+        shard_files = list(dict.fromkeys(weight_map.values()))
+
+        old_state_dict = _LazyShardedStateDict(
+            os.path.dirname(index_file), weight_map
+        )
+        new_state_dict = _ShardedStateDictWriter(
+            file_without_ext,
+            self.file_formats()[1 - from_index],
+            max_shard_size,
+            cbtorch.save if export_h5_checkpoint else torch.save,
+        )
+        action_fn_args = {"configs": configs}
+
+        self.pre_model_convert(
+            old_state_dict,
+            new_state_dict,
+            configs,
+            from_index,
+            drop_unmatched_keys,
+        )
+
+        if not no_progress_bar:
+            pbar = tqdm(total=len(weight_map), desc=self.pbar_desc)
+        matched_all_keys = True
+        deferred_keys = []
+
+        def _try_convert(key, raise_errors):
+            nonlocal matched_all_keys
+            try:
+                matched_current_key = self.convert_key(
+                    key,
+                    old_state_dict,
+                    new_state_dict,
+                    from_index,
+                    action_fn_args=action_fn_args,
+                    debug=debug,
+                )
+            except (AssertionError, KeyError):
+                if raise_errors:
+                    raise
+                return False
+            if not matched_current_key:
+                logging.warning("Key not matched: {}".format(key))
+            matched_all_keys = matched_all_keys and matched_current_key
+            old_state_dict.release(key)
+            if not no_progress_bar:
+                pbar.update(1)
+            return True
+
+        for shard_file in shard_files:
+            print("Reading", shard_file)
+            keys = old_state_dict.load_shard(shard_file)
+            self.pre_shard_convert(old_state_dict, keys, configs, from_index)
+            deferred_keys = [
+                key
+                for key in deferred_keys + keys
+                if not _try_convert(key, raise_errors=False)
+            ]
+            new_state_dict.maybe_flush()
+        for key in deferred_keys:
+            _try_convert(key, raise_errors=True)
+
+        self.post_model_convert(
+            old_state_dict,
+            new_state_dict,
+            configs,
+            from_index,
+            drop_unmatched_keys,
+        )
+
+        if not matched_all_keys and not drop_unmatched_keys:
+            assert (
+                matched_all_keys
+            ), "Unable to match all keys. If you want to proceed by dropping keys that couldn't matched, rerun with --drop-unmatched-keys"
+        elif not matched_all_keys:
+            logging.warning(
+                "proceeding even though some keys weren't matched because of --drop-unmatched-keys"
+            )
+
+        new_state_dict.flush()
+        return new_state_dict.write_index()
+
+    def pre_shard_convert(
+        self,
+        old_state_dict: MutableMapping,
+        keys: List[str],
+        configs: Tuple[dict, dict],
+        from_index: int,
+    ):
+        r"""
+        Hook executes in streaming conversion after a shard is loaded, before
+        its `keys` are converted.
+        """
+
+
+def _load_shard(file: str) -> dict:
+    if "mmap" in inspect.signature(torch.load).parameters:
+        try:
+            return torch.load(file, map_location="cpu", mmap=True)
+        except RuntimeError:
+            # Only checkpoints in the zipfile format can be memory-mapped
+            pass
+    return cbtorch.load(file)
+
+
+def _tensor_nbytes(value) -> int:
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    return 0
+
+
+class _LazyShardedStateDict(MutableMapping):
+    r"""State dict of an HF style sharded checkpoint that loads tensors from
+    their shard when they are accessed. Tensors of shards loaded with
+    `load_shard` stay in memory until they are released. Other tensors are
+    read from their shard on demand, keeping only the last such shard open.
+    """
+
+    def __init__(self, index_dir: str, weight_map: dict):
+        self._index_dir = index_dir
+        self._weight_map = dict(weight_map)
+        self._tensors = {}
+        self._cached_shard = (None, None)
+
+    def load_shard(self, shard_file: str) -> List[str]:
+        if self._cached_shard[0] == shard_file:
+            shard = self._cached_shard[1]
+        else:
+            shard = _load_shard(os.path.join(self._index_dir, shard_file))
+        keys = [key for key in shard if self._weight_map.get(key) == shard_file]
+        for key in keys:
+            self._tensors[key] = shard[key]
+        return keys
+
+    def release(self, key: str):
+        if key in self._weight_map:
+            self._tensors.pop(key, None)
+
+    def __getitem__(self, key):
+        if key in self._tensors:
+            return self._tensors[key]
+        shard_file = self._weight_map[key]
+        if self._cached_shard[0] != shard_file:
+            self._cached_shard = (None, None)
+            self._cached_shard = (
+                shard_file,
+                _load_shard(os.path.join(self._index_dir, shard_file)),
+            )
+        return self._cached_shard[1][key]
+
+    def __setitem__(self, key, value):
+        self._tensors[key] = value
+
+    def __delitem__(self, key):
+        if key not in self._tensors and key not in self._weight_map:
+            raise KeyError(key)
+        self._tensors.pop(key, None)
+        self._weight_map.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._tensors or key in self._weight_map
+
+    def __iter__(self):
+        yield from self._weight_map
+        for key in list(self._tensors):
+            if key not in self._weight_map:
+                yield key
+
+    def __len__(self):
+        return len(self._weight_map) + sum(
+            key not in self._weight_map for key in self._tensors
+        )
+
+
+class _ShardedStateDictWriter(MutableMapping):
+    r"""State dict that is written to disk in shards of about
+    `max_shard_size` bytes as it is filled, with an HF style index file.
+    Keys that were already written can still be read back from their shard.
+    """
+
+    def __init__(
+        self,
+        file_without_ext: str,
+        ext: str,
+        max_shard_size: int,
+        save_fn: Callable,
+    ):
+        self._file_without_ext = file_without_ext
+        self._ext = ext
+        self._max_shard_size = max_shard_size
+        self._save_fn = save_fn
+        self._buffer = OrderedDict()
+        self._written = OrderedDict()
+        self._total_size = 0
+
+    def maybe_flush(self):
+        size = sum(_tensor_nbytes(value) for value in self._buffer.values())
+        if size >= self._max_shard_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        num_shards = len(set(self._written.values())) + 1
+        shard_file = "{}-{:05d}.{}".format(
+            self._file_without_ext, num_shards, self._ext
+        )
+        self._save_fn(self._buffer, shard_file)
+        for key, value in self._buffer.items():
+            self._written[key] = os.path.basename(shard_file)
+            self._total_size += _tensor_nbytes(value)
+        self._buffer = OrderedDict()
+
+    def write_index(self) -> str:
+        index_file = "{}.{}.index.json".format(
+            self._file_without_ext, self._ext
+        )
+        index = {
+            "metadata": {"total_size": self._total_size},
+            "weight_map": self._written,
+        }
+        with open(index_file, "w") as f:
+            json.dump(index, f, indent=2)
+        return index_file
+
+    def __getitem__(self, key):
+        if key in self._buffer:
+            return self._buffer[key]
+        shard_file = os.path.join(
+            os.path.dirname(self._file_without_ext), self._written[key]
+        )
+        return _load_shard(shard_file)[key]
+
+    def __setitem__(self, key, value):
+        self._written.pop(key, None)
+        self._buffer[key] = value
+
+    def __delitem__(self, key):
+        if key in self._buffer:
+            del self._buffer[key]
+        else:
+            del self._written[key]
+
+    def __contains__(self, key):
+        return key in self._buffer or key in self._written
+
+    def __iter__(self):
+        yield from list(self._written)
+        yield from list(self._buffer)
+
+    def __len__(self):
+        return len(self._written) + len(self._buffer)
+
 
 class BaseCheckpointConverter_HF_CS(BaseCheckpointConverter_PT_PT):
     r"""HF checkpoints contain model only while CS checkpoints package model,
@@ -630,6 +993,19 @@ class BaseCheckpointConverter_HF_CS(BaseCheckpointConverter_PT_PT):
                     weight[weight.isnan()] = 0
         return checkpoint
 
+    def pre_shard_convert(
+        self, old_state_dict, keys, configs: Tuple[dict, dict], from_index: int,
+    ):
+        if from_index == 1:
+            cs_config = configs[from_index]
+            if cs_config.get("sparsity", {}).get("type") == "sideband":
+                for key in keys:
+                    weight = old_state_dict[key]
+                    # memory-mapped tensors are read-only
+                    old_state_dict[key] = torch.where(
+                        weight.isnan(), torch.zeros_like(weight), weight
+                    )
+
     def post_checkpoint_convert(
         self, checkpoint, from_index: int,
     ):
@@ -855,6 +1231,55 @@ class BaseConfigConverter_CS_CS(BaseConfigConverter):
         return final_config
 
 
+def _regex_literal_prefix(regex: str) -> Tuple[str, bool]:
+    r"""
+    Returns the literal string that every match of `regex` starts with and
+    whether that string is the whole regex (i.e. the regex is a literal).
+    The result is conservative: it may be shorter than the longest common
+    prefix of all matches, but never longer.
+    """
+    # A top level alternation can match strings with different prefixes
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(regex):
+        char = regex[i]
+        if char == "\\":
+            i += 1
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return "", False
+        i += 1
+
+    prefix = ""
+    i = 0
+    while i < len(regex):
+        char = regex[i]
+        if char == "\\":
+            if i + 1 >= len(regex) or regex[i + 1].isalnum():
+                # character classes such as \d or anchors such as \b
+                return prefix, False
+            literal, i = regex[i + 1], i + 2
+        elif char in ".^$*+?{}[]()|":
+            return prefix, False
+        else:
+            literal, i = char, i + 1
+        if i < len(regex) and regex[i] in "*?{":
+            # the character is optional or repeated
+            return prefix, False
+        prefix += literal
+        if i < len(regex) and regex[i] == "+":
+            return prefix, False
+    return prefix, True
+
+
 def _addindent(s_, numSpaces):
     s = s_.split('\n')
     s = [(numSpaces * ' ') + line for line in s]
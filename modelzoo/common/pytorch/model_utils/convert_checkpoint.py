@@ -316,6 +316,8 @@ def convert_checkpoint_from_file(
     drop_unmatched_keys=False,
     no_progress_bar=True,
     debug=False,
+    streaming=False,
+    max_shard_size=10 * 1024 ** 3,
 ):
 
     (
@@ -327,26 +329,46 @@ def convert_checkpoint_from_file(
     if converter_class is None:
         return None, None
 
+    if streaming and not checkpoint_file.endswith(".index.json"):
+        raise ValueError(
+            "Streaming conversion requires a sharded checkpoint, i.e. an "
+            "`.index.json` file, but got {}".format(checkpoint_file)
+        )
+
     logging.info("Loading config & checkpoint...")
     config = config_converter_class.load(config_file, config_from_index)
-    checkpoint = converter_class.load(checkpoint_file, checkpoint_from_index)
+    if not streaming:
+        checkpoint = converter_class.load(
+            checkpoint_file, checkpoint_from_index
+        )
 
-    new_checkpoint, new_config = _convert_checkpoint_helper(
-        converter_class,
-        checkpoint,
-        checkpoint_from_index,
-        config_converter_class,
-        config,
-        config_from_index,
-        drop_unmatched_keys,
-        no_progress_bar,
-        debug,
-    )
+        new_checkpoint, new_config = _convert_checkpoint_helper(
+            converter_class,
+            checkpoint,
+            checkpoint_from_index,
+            config_converter_class,
+            config,
+            config_from_index,
+            drop_unmatched_keys,
+            no_progress_bar,
+            debug,
+        )
+    else:
+        new_config = config_converter_class.convert(
+            config,
+            config_from_index,
+            no_progress_bar=no_progress_bar,
+            debug=debug,
+            drop_unmatched_keys=True,
+        )
 
     if outputdir is not None and not os.path.exists(outputdir):
         os.makedirs(outputdir)
 
     checkpoint_folder, checkpoint_filename = os.path.split(checkpoint_file)
+    if streaming:
+        # strip ".<ext>.index.json"
+        checkpoint_filename = checkpoint_filename[: -len(".index.json")]
     new_checkpoint_filename_without_ext = (
         os.path.splitext(checkpoint_filename)[0] + "_to_" + tgt_fmt
     )
@@ -358,13 +380,32 @@ def convert_checkpoint_from_file(
         )
     )
 
-    logging.info("Saving...")
-    final_checkpoint_file = converter_class.save(
-        new_checkpoint_file_without_ext,
-        new_checkpoint,
-        checkpoint_from_index,
-        export_h5_checkpoint=export_h5_checkpoint,
-    )
+    if streaming:
+        logging.info("Converting and saving shard by shard...")
+        configs = (
+            (config, new_config)
+            if checkpoint_from_index == 0
+            else (new_config, config)
+        )
+        final_checkpoint_file = converter_class.convert_streaming(
+            checkpoint_file,
+            configs,
+            checkpoint_from_index,
+            new_checkpoint_file_without_ext,
+            max_shard_size=max_shard_size,
+            export_h5_checkpoint=export_h5_checkpoint,
+            drop_unmatched_keys=drop_unmatched_keys,
+            no_progress_bar=no_progress_bar,
+            debug=debug,
+        )
+    else:
+        logging.info("Saving...")
+        final_checkpoint_file = converter_class.save(
+            new_checkpoint_file_without_ext,
+            new_checkpoint,
+            checkpoint_from_index,
+            export_h5_checkpoint=export_h5_checkpoint,
+        )
 
     config_folder, config_filename = os.path.split(config_file)
     new_config_filename_without_ext = (
@@ -713,6 +754,24 @@ The following commands are supported:
             '--debug', action='store_true', help='Debug checkpoint key mapping',
         )
 
+        parser.add_argument(
+            '--streaming',
+            action='store_true',
+            help='Convert a sharded checkpoint (.index.json) one shard at a\
+            time and save the output as a sharded checkpoint with its own\
+            index file. This bounds memory usage for large models. CS\
+            outputs can be loaded by passing the index file as\
+            checkpoint_path.',
+        )
+
+        parser.add_argument(
+            '--max-shard-size-mb',
+            type=int,
+            default=10240,
+            help='Maximum size of each output shard in MiB when using\
+            --streaming',
+        )
+
         args = parser.parse_args(sys.argv[2:])
 
         (
@@ -729,6 +788,8 @@ The following commands are supported:
             args.drop_unmatched_keys,
             args.no_progress_bar,
             args.debug,
+            args.streaming,
+            args.max_shard_size_mb * 1024 ** 2,
         )
 
         if checkpoint_output_path is None or config_output_path is None:
@@ -29,6 +29,10 @@ class AdamBase(CSOptimizer):
     performing a gradual reduction of bias correction using exponential decay
     of `beta1_power` and `beta2_power` rather than recomputing `beta1^step` each
     step.
+
+    On CPU/GPU, `foreach=True` selects a multi-tensor implementation of the
+    step that updates all params of the same device and dtype with a few
+    `torch._foreach_*` calls instead of a loop over params.
     """
 
     def __init__(
@@ -41,6 +45,7 @@ class AdamBase(CSOptimizer):
         l2_regularization_rate: float = 0.0,
         correct_bias: bool = True,
         amsgrad: bool = False,
+        foreach: bool = False,
     ):
         if lr < 0.0:
             raise ValueError(f"Invalid learning rate: {lr} - should be >= 0.0")
@@ -64,7 +69,7 @@ class AdamBase(CSOptimizer):
             correct_bias=correct_bias,
             amsgrad=amsgrad,
         )
-        super().__init__(params, defaults)
+        super().__init__(params, defaults, foreach=foreach)
 
     def state_names_to_sparsify(self):
         # Only return state names which can be maskable by sparsity optimizer:
@@ -114,6 +119,10 @@ class AdamBase(CSOptimizer):
         if closure is not None:
             loss = closure()
         for group in self.param_groups:
+            if self._use_foreach():
+                self._step_foreach(group)
+                continue
+
             for p in group["params"]:
                 if p.grad is None:
                     continue
@@ -171,6 +180,78 @@ class AdamBase(CSOptimizer):
 
         return loss
 
+    def _step_foreach(self, group):
+        """
+        Multi-tensor version of the update in `step` for one param group.
+        """
+        beta1, beta2 = map(self._to_scalar, group["betas"])
+        lr = self._to_scalar(group["lr"])
+        eps = self._to_scalar(group["eps"])
+        weight_decay = self._to_scalar(group["weight_decay"])
+        l2_regularization_rate = self._to_scalar(
+            group["l2_regularization_rate"]
+        )
+        amsgrad = bool(group["amsgrad"])
+        correct_bias = bool(group["correct_bias"])
+
+        state_names = ["exp_avg", "exp_avg_sq"]
+        if amsgrad:
+            state_names.append("max_exp_avg_sq")
+        if correct_bias:
+            state_names.extend(["beta1_power", "beta2_power"])
+
+        for bucket in self._group_params_for_foreach(group, state_names):
+            params = bucket["params"]
+            grads = bucket["grads"]
+            exp_avgs = bucket["exp_avg"]
+            exp_avg_sqs = bucket["exp_avg_sq"]
+
+            if l2_regularization_rate > 0.0:
+                grads = torch._foreach_add(
+                    grads, params, alpha=l2_regularization_rate
+                )
+
+            torch._foreach_mul_(exp_avgs, beta1)
+            torch._foreach_add_(exp_avgs, grads, alpha=1.0 - beta1)
+            torch._foreach_mul_(exp_avg_sqs, beta2)
+            torch._foreach_addcmul_(
+                exp_avg_sqs, grads, grads, value=1.0 - beta2
+            )
+
+            if amsgrad:
+                max_exp_avg_sqs = bucket["max_exp_avg_sq"]
+                for max_exp_avg_sq, new_max in zip(
+                    max_exp_avg_sqs,
+                    torch._foreach_maximum(max_exp_avg_sqs, exp_avg_sqs),
+                ):
+                    max_exp_avg_sq.copy_(new_max)
+                denom = torch._foreach_sqrt(max_exp_avg_sqs)
+            else:
+                denom = torch._foreach_sqrt(exp_avg_sqs)
+            torch._foreach_add_(denom, eps)
+
+            updates = torch._foreach_div(exp_avgs, denom)
+
+            if correct_bias:
+                beta1_powers = bucket["beta1_power"]
+                beta2_powers = bucket["beta2_power"]
+                # The bias correction of all params is computed at once and
+                # kept on the device, since the `beta*_power`s may differ
+                # between params.
+                bias_correction1 = 1.0 - torch.stack(beta1_powers)
+                bias_correction2 = 1.0 - torch.stack(beta2_powers)
+                step_sizes = torch.sqrt(bias_correction2) / bias_correction1
+                self._foreach_mul_by_elements_(updates, step_sizes)
+                # Update `beta1^step` for the next step.
+                torch._foreach_mul_(beta1_powers, beta1)
+                torch._foreach_mul_(beta2_powers, beta2)
+
+            if weight_decay > 0.0:
+                torch._foreach_add_(updates, params, alpha=weight_decay)
+
+            torch._foreach_mul_(updates, lr)
+            torch._foreach_sub_(params, updates)
+
     def convert_state_dict_for_checkpoint(self, state_dict):
         """
         Converts the state_dict for compatibility with AdamW from
@@ -263,6 +344,7 @@ class AdamW(AdamBase):
         weight_decay: float = 0.0,
         correct_bias: bool = True,
         amsgrad: bool = False,
+        foreach: bool = False,
     ):
 
         super(AdamW, self).__init__(
@@ -274,6 +356,7 @@ class AdamW(AdamBase):
             l2_regularization_rate=0.0,
             correct_bias=correct_bias,
             amsgrad=amsgrad,
+            foreach=foreach,
         )
 
     def load_state_dict(self, state_dict):
@@ -301,6 +384,7 @@ class Adam(AdamBase):
         eps: float = 1e-6,
         weight_decay: float = 0.0,
         amsgrad: bool = False,
+        foreach: bool = False,
     ):
         # This init uses `weight_decay` to be in sync with PyTorch API
         super(Adam, self).__init__(
@@ -312,6 +396,7 @@ class Adam(AdamBase):
             l2_regularization_rate=weight_decay,
             correct_bias=True,
             amsgrad=amsgrad,
+            foreach=foreach,
         )
         for group in self.param_groups:
             group["l2_regularization_rate"] = group.pop("weight_decay", 0.0)
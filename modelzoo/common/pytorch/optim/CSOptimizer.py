@@ -30,15 +30,22 @@ class CSOptimizer(Optimizer, ABC):
     Cerebras Base Optimizer class
     """
 
-    def __init__(self, params, defaults, enable_global_step=False):
+    def __init__(
+        self, params, defaults, enable_global_step=False, foreach=False
+    ):
         """
         Cerebras Base Optimizer class handles preinitialization of
         optimizer states for non-CS runs, making the implementation
         of the optimizer compatible with both CS and non-CS runs.
         It also preinitializes global steps tensor and provides a method
         to retrieve the global steps.
+
+        Optimizers that implement a multi-tensor step can be asked to use it
+        on CPU/GPU by setting `foreach`. On CS, the per-param step is always
+        used.
         """
         super(CSOptimizer, self).__init__(params, defaults)
+        self.foreach = foreach
 
         if cm.use_cs():
             # Add progress updates for optimizer state initialization
@@ -136,6 +143,72 @@ class CSOptimizer(Optimizer, ABC):
         global_step = self.state[p]["step"]
         return global_step
 
+    def _use_foreach(self):
+        """
+        Returns whether the multi-tensor (foreach) step should be used.
+        """
+        return self.foreach and not cm.use_cs()
+
+    def _group_params_for_foreach(self, group, state_names=()):
+        """
+        Collects the params of `group` that have a gradient, together with
+        their gradients and the given per-param states, bucketed by device
+        and dtype so that each bucket can be updated with one
+        `torch._foreach_*` call per operation.
+
+        Returns:
+            A list of dicts, one per bucket, mapping "params", "grads" and
+            each of the `state_names` to lists of tensors.
+        """
+        buckets = {}
+        for p in group["params"]:
+            if p.grad is None:
+                continue
+            if p.grad.is_sparse:
+                raise RuntimeError(
+                    f"{self.__class__.__name__} does not support sparse "
+                    f"gradients."
+                )
+            bucket = buckets.get((p.device, p.dtype))
+            if bucket is None:
+                bucket = {"params": [], "grads": []}
+                bucket.update((name, []) for name in state_names)
+                buckets[(p.device, p.dtype)] = bucket
+            bucket["params"].append(p)
+            bucket["grads"].append(p.grad)
+            state = self.state[p]
+            for name in state_names:
+                bucket[name].append(state[name])
+        return list(buckets.values())
+
+    @staticmethod
+    def _to_scalar(value):
+        """
+        Converts a param group option that `post_load_state_dict` cast to a
+        tensor back into a python scalar, as expected by the scalar overloads
+        of the `torch._foreach_*` ops.
+        """
+        if isinstance(value, torch.Tensor):
+            return value.item()
+        return value
+
+    @staticmethod
+    def _foreach_mul_by_elements_(tensors, scalars):
+        """
+        Multiplies each of `tensors` in place by the matching element of the
+        1D tensor `scalars`, without copying `scalars` to the host. Each
+        element is expanded to the shape of its tensor, since the tensor list
+        overload of `torch._foreach_mul_` expects matching shapes.
+        """
+        scalars = scalars.to(tensors[0].dtype)
+        torch._foreach_mul_(
+            tensors,
+            [
+                scalar.expand_as(tensor)
+                for scalar, tensor in zip(scalars.unbind(), tensors)
+            ],
+        )
+
     @abstractmethod
     def state_names_to_sparsify(self):
         """
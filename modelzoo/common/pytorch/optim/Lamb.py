@@ -36,6 +36,8 @@ class Lamb(CSOptimizer):
         weight_decay (float, optional): weight decay (L2 penalty) (default: 0)
         adam (bool, optional): always use trust ratio = 1, which turns this into
             Adam. Useful for comparison purposes.
+        foreach (bool, optional): whether to use the multi-tensor
+            implementation of the step on CPU/GPU (default: False)
     
     .. _Large Batch Optimization for Deep Learning\: Training BERT in 76 minutes:
         https://arxiv.org/abs/1904.00962
@@ -50,6 +52,7 @@ class Lamb(CSOptimizer):
         eps=1e-6,
         weight_decay=0,
         adam=False,
+        foreach=False,
     ):
         if not 0.0 <= lr:
             raise ValueError("Invalid learning rate: {}".format(lr))
@@ -67,7 +70,7 @@ class Lamb(CSOptimizer):
             lr=lr, betas=betas, eps=eps, weight_decay=weight_decay, adam=adam
         )
 
-        super(Lamb, self).__init__(params, defaults)
+        super(Lamb, self).__init__(params, defaults, foreach=foreach)
 
     def state_names_to_sparsify(self):
         return ["exp_avg", "exp_avg_sq"]
@@ -102,6 +105,10 @@ class Lamb(CSOptimizer):
             loss = closure()
 
         for group in self.param_groups:
+            if self._use_foreach():
+                self._step_foreach(group)
+                continue
+
             for p in group['params']:
                 if p.grad is None:
                     continue
@@ -165,3 +172,64 @@ class Lamb(CSOptimizer):
                 p.sub_(update_step * step_size)
 
         return loss
+
+    def _step_foreach(self, group):
+        """
+        Multi-tensor version of the update in `step` for one param group.
+        """
+        beta1, beta2 = map(self._to_scalar, group['betas'])
+        lr = self._to_scalar(group['lr'])
+        eps = self._to_scalar(group['eps'])
+        weight_decay = self._to_scalar(group['weight_decay'])
+
+        for bucket in self._group_params_for_foreach(
+            group, ['exp_avg', 'exp_avg_sq']
+        ):
+            params = bucket['params']
+            grads = bucket['grads']
+            exp_avgs = bucket['exp_avg']
+            exp_avg_sqs = bucket['exp_avg_sq']
+
+            # m_t
+            torch._foreach_mul_(exp_avgs, beta1)
+            torch._foreach_add_(exp_avgs, grads, alpha=1 - beta1)
+            # v_t
+            torch._foreach_mul_(exp_avg_sqs, beta2)
+            torch._foreach_addcmul_(
+                exp_avg_sqs, grads, grads, value=1 - beta2
+            )
+
+            adam_steps = torch._foreach_sqrt(exp_avg_sqs)
+            torch._foreach_add_(adam_steps, eps)
+            adam_steps = torch._foreach_div(exp_avgs, adam_steps)
+            if weight_decay != 0:
+                torch._foreach_add_(adam_steps, params, alpha=weight_decay)
+
+            if not group['adam']:
+                # The trust ratios of all params are computed at once and
+                # kept on the device
+                weight_norms = (
+                    torch.stack(_foreach_norm(params))
+                    .clamp(0, 10)
+                    .to(torch.float)
+                )
+                adam_norms = torch.stack(_foreach_norm(adam_steps)).to(
+                    torch.float
+                )
+                trust_ratios = torch.where(
+                    torch.logical_and(weight_norms > 0, adam_norms > 0),
+                    weight_norms / adam_norms,
+                    torch.ones_like(weight_norms),
+                )
+                self._foreach_mul_by_elements_(adam_steps, trust_ratios)
+
+            torch._foreach_mul_(adam_steps, lr)
+            torch._foreach_sub_(params, adam_steps)
+
+
+def _foreach_norm(tensors):
+    """Returns the L2 norms of `tensors`, using a single multi-tensor kernel
+    where available."""
+    if hasattr(torch, "_foreach_norm"):
+        return torch._foreach_norm(tensors)
+    return [tensor.norm() for tensor in tensors]
@@ -47,6 +47,8 @@ class Lion(CSOptimizer):
         betas (Tuple[float, float], optional): coefficients used for computing
             running averages of gradient and its square (default: (0.9, 0.99))
         weight_decay (float, optional): weight decay coefficient (default: 0)
+        foreach (bool, optional): whether to use the multi-tensor
+            implementation of the step on CPU/GPU (default: False)
 
     .. _Symbolic Discovery of Optimization Algorithms: https://arxiv.org/pdf/2302.06675.pdf
 
@@ -58,6 +60,7 @@ class Lion(CSOptimizer):
         lr: float = 1e-4,
         betas: Tuple[float, float] = (0.9, 0.99),
         weight_decay: float = 0.0,
+        foreach: bool = False,
     ):
         if not 0.0 <= lr:
             raise ValueError(f"Invalid learning rate: {lr}")
@@ -68,7 +71,7 @@ class Lion(CSOptimizer):
         if not 0.0 <= weight_decay:
             raise ValueError(f"Invalid weight decay value: {weight_decay}")
         defaults = dict(lr=lr, betas=betas, weight_decay=weight_decay)
-        super().__init__(params, defaults)
+        super().__init__(params, defaults, foreach=foreach)
 
     def state_names_to_sparsify(self):
         return ["exp_avg"]
@@ -98,6 +101,10 @@ class Lion(CSOptimizer):
                 loss = closure()
 
         for group in self.param_groups:
+            if self._use_foreach():
+                self._step_foreach(group)
+                continue
+
             lr = group["lr"]
             beta1, beta2 = group["betas"]
             weight_decay = group["weight_decay"]
@@ -125,3 +132,33 @@ class Lion(CSOptimizer):
                     exp_avg.mul_(beta2).add_(grad, alpha=1 - beta2)
 
         return loss
+
+    def _step_foreach(self, group):
+        """
+        Multi-tensor version of the update in `step` for one param group.
+        """
+        lr = self._to_scalar(group["lr"])
+        beta1, beta2 = map(self._to_scalar, group["betas"])
+        weight_decay = self._to_scalar(group["weight_decay"])
+
+        for bucket in self._group_params_for_foreach(group, ["exp_avg"]):
+            params = bucket["params"]
+            grads = bucket["grads"]
+            exp_avgs = bucket["exp_avg"]
+
+            # Perform weight decay
+            if weight_decay != 0:
+                torch._foreach_mul_(params, 1 - lr * weight_decay)
+
+            # Perform weight update
+            updates = torch._foreach_mul(exp_avgs, beta1)
+            torch._foreach_add_(updates, grads, alpha=1 - beta1)
+            if hasattr(torch, "_foreach_sign_"):
+                torch._foreach_sign_(updates)
+            else:
+                for update in updates:
+                    update.sign_()
+            torch._foreach_add_(params, updates, alpha=-lr)
+            # Update exponential moving average
+            torch._foreach_mul_(exp_avgs, beta2)
+            torch._foreach_add_(exp_avgs, grads, alpha=1 - beta2)
@@ -20,7 +20,10 @@ from modelzoo.common.pytorch.optim.CSOptimizer import CSOptimizer
 class SGD(CSOptimizer):
     """
     SGD optimizer implemented to conform to execution within the constraints
-    of the Cerebras WSE, including pre-initializing optimizer state
+    of the Cerebras WSE, including pre-initializing optimizer state.
+
+    On CPU/GPU, `foreach=True` selects a multi-tensor implementation of the
+    step.
     """
 
     def __init__(
@@ -32,6 +35,7 @@ class SGD(CSOptimizer):
         weight_decay=0,
         nesterov=False,
         maximize=False,
+        foreach=False,
     ):
         if lr < 0.0:
             raise ValueError("Invalid learning rate: {}".format(lr))
@@ -56,7 +60,7 @@ class SGD(CSOptimizer):
             maximize=maximize,
         )
 
-        super(SGD, self).__init__(params, defaults)
+        super(SGD, self).__init__(params, defaults, foreach=foreach)
 
     def state_names_to_sparsify(self):
         return ["momentum_buffer"]
@@ -86,6 +90,10 @@ class SGD(CSOptimizer):
             loss = closure()
 
         for group in self.param_groups:
+            if self._use_foreach():
+                self._step_foreach(group)
+                continue
+
             lr = group["lr"]
             weight_decay = group["weight_decay"]
             momentum = group['momentum']
@@ -120,3 +128,38 @@ class SGD(CSOptimizer):
                 p.add_(-lr * grad)
 
         return loss
+
+    def _step_foreach(self, group):
+        """
+        Multi-tensor version of the update in `step` for one param group.
+        """
+        lr = self._to_scalar(group["lr"])
+        weight_decay = self._to_scalar(group["weight_decay"])
+        momentum = self._to_scalar(group["momentum"])
+        dampening = self._to_scalar(group["dampening"])
+        nesterov = bool(group["nesterov"])
+        maximize = bool(group["maximize"])
+
+        state_names = ["momentum_buffer"] if momentum != 0 else []
+        for bucket in self._group_params_for_foreach(group, state_names):
+            params = bucket["params"]
+            grads = bucket["grads"]
+
+            if maximize:
+                grads = torch._foreach_neg(grads)
+
+            if weight_decay != 0:
+                grads = torch._foreach_add(grads, params, alpha=weight_decay)
+
+            if momentum != 0:
+                bufs = bucket["momentum_buffer"]
+
+                torch._foreach_mul_(bufs, momentum)
+                torch._foreach_add_(bufs, grads, alpha=1.0 - dampening)
+
+                if nesterov:
+                    grads = torch._foreach_add(grads, bufs, alpha=momentum)
+                else:
+                    grads = bufs
+
+            torch._foreach_add_(params, grads, alpha=-lr)
@@ -34,6 +34,10 @@ from torch.utils.tensorboard import SummaryWriter
 from modelzoo.common.pytorch import cb_model as cm
 from modelzoo.common.pytorch import cbtorch, modes
 from modelzoo.common.pytorch.dump_context import DumpContext
+from modelzoo.common.pytorch.gradient_clipper import (
+    compute_grad_norms,
+    global_grad_norm,
+)
 from modelzoo.common.pytorch.loss_utils import LossSaver, extract_loss
 from modelzoo.common.pytorch.metrics import (
     compute_all_metrics,
@@ -48,6 +52,7 @@ from modelzoo.common.pytorch.summaries import (
 from modelzoo.common.pytorch.utils import (
     RunConfigParamsValidator,
     is_mup_run,
+    load_checkpoint_file,
     visit_structure,
 )
 from modelzoo.common.run_utils.utils import DeviceType, ExecutionStrategy
@@ -157,35 +162,44 @@ class PyTorchBaseRunner(metaclass=abc.ABCMeta):
         param_norm = torch.sqrt(param_norm)
         scalar_summary("model_wise_params_norm", param_norm)
 
-    def _log_summaries_grad_norm(self, is_clipped=False, is_scaled=False):
+    def _log_summaries_grad_norm(
+        self, is_clipped=False, is_scaled=False, grad_norms=None
+    ):
         """
         Args:
             is_clipped (bool): whether to log clipped gradient
             is_scaled (bool): whether to log scaled gradient
+            grad_norms (dict): optional precomputed norms of the gradients
+                by param name, as returned by `compute_grad_norms`
         """
         # This should be called after unscaling and before grad clipping
-        if cm.use_cs():
-            device = self._model.model.device
+        if grad_norms:
+            param_grad_norm = global_grad_norm(grad_norms.values())
         else:
-            device = self._model.device
-
-        param_grad_norm = torch.tensor(0.0).to(device)
-        for _, param in self._model.model.named_parameters():
-            if param.grad is not None:
-                param_grad_norm += torch.pow(torch.norm(param.grad), 2.0)
-        param_grad_norm = torch.sqrt(param_grad_norm)
+            if cm.use_cs():
+                device = self._model.model.device
+            else:
+                device = self._model.device
+
+            param_grad_norm = torch.tensor(0.0).to(device)
+            for _, param in self._model.model.named_parameters():
+                if param.grad is not None:
+                    param_grad_norm += torch.pow(torch.norm(param.grad), 2.0)
+            param_grad_norm = torch.sqrt(param_grad_norm)
         summary_str = "model_wise_grad_norm"
         summary_str += "_clipped" if is_clipped else "_unclipped"
         summary_str += "_scaled" if is_scaled else "_unscaled"
         scalar_summary(summary_str, param_grad_norm)
 
     def _log_summaries_grad_norm_per_layer(
-        self, is_clipped=False, is_scaled=False
+        self, is_clipped=False, is_scaled=False, grad_norms=None
     ):
         """
         Args:
             is_clipped (bool): whether to log clipped gradient
             is_scaled (bool): whether to log scaled gradient
+            grad_norms (dict): optional precomputed norms of the gradients
+                by param name, as returned by `compute_grad_norms`
         """
         # Computes global norm of all params, but calculating
         # norm of each set of params individually first and then
@@ -194,19 +208,33 @@ class PyTorchBaseRunner(metaclass=abc.ABCMeta):
         param_norm = {}
         layer_pattern_str = r'.*(layers\.)(\d+)(\.).*'
         layer_pattern = re.compile(layer_pattern_str)
-        for name, param in self._model.model.named_parameters():
-            if param.grad is None:
-                continue
-            # get a match if module name contains `layers.i.0` where i is layer num
-            match = layer_pattern.match(name)
-            if match:
-                layer_id = match.group(2)
-                if layer_id not in param_norm:
-                    param_norm[layer_id] = torch.tensor(0.0).to(param.device)
-                param_norm[layer_id] += torch.pow(torch.norm(param.grad), 2.0)
+        if grad_norms is not None:
+            layer_grad_norms = defaultdict(list)
+            for name, grad_norm in grad_norms.items():
+                match = layer_pattern.match(name)
+                if match:
+                    layer_grad_norms[match.group(2)].append(grad_norm)
+            for layer_id, norms in layer_grad_norms.items():
+                param_norm[layer_id] = global_grad_norm(norms)
+        else:
+            for name, param in self._model.model.named_parameters():
+                if param.grad is None:
+                    continue
+                # get a match if module name contains `layers.i.0` where i is layer num
+                match = layer_pattern.match(name)
+                if match:
+                    layer_id = match.group(2)
+                    if layer_id not in param_norm:
+                        param_norm[layer_id] = torch.tensor(0.0).to(
+                            param.device
+                        )
+                    param_norm[layer_id] += torch.pow(
+                        torch.norm(param.grad), 2.0
+                    )
+            for layer_id in param_norm:
+                param_norm[layer_id] = torch.sqrt(param_norm[layer_id])
 
         for layer_id in param_norm:
-            param_norm[layer_id] = torch.sqrt(param_norm[layer_id])
             summary_str = "per_layer_grad_norm"
             summary_str += "_clipped" if is_clipped else "_unclipped"
             summary_str += "_scaled" if is_scaled else "_unscaled"
@@ -693,19 +721,40 @@ class PyTorchBaseRunner(metaclass=abc.ABCMeta):
             # Unscales the gradients of optimizer's assigned params in-place
             self._scaler.unscale_(self._optimizer)
 
+        gradient_clipper = getattr(self._optimizer, "gradient_clipper", None)
+        grad_norms = None
+        total_norm = None
+        if (
+            gradient_clipper is not None
+            and gradient_clipper.fused
+            and not cm.use_cs()
+            and (
+                self._should_log_extra_summaries
+                or gradient_clipper.clips_by_norm
+            )
+        ):
+            # Compute the gradient norms in a single pass and use them for
+            # both the summaries and the clipping
+            grad_norms = compute_grad_norms(
+                self._model.model.named_parameters()
+            )
+            if grad_norms:
+                total_norm = global_grad_norm(grad_norms.values())
+
         if self._should_log_extra_summaries:
             # gather unclipped gradients after unscale and before grad clipping
-            self._log_summaries_grad_norm(is_clipped=False, is_scaled=False)
+            self._log_summaries_grad_norm(
+                is_clipped=False, is_scaled=False, grad_norms=grad_norms
+            )
             self._log_summaries_grad_norm_per_layer(
-                is_clipped=False, is_scaled=False
+                is_clipped=False, is_scaled=False, grad_norms=grad_norms
             )
 
         # gradient clipping
-        if (
-            hasattr(self._optimizer, "gradient_clipper")
-            and self._optimizer.gradient_clipper is not None
-        ):
-            self._optimizer.gradient_clipper(self._model.model.parameters())
+        if gradient_clipper is not None:
+            gradient_clipper(
+                self._model.model.parameters(), total_norm=total_norm
+            )
 
         if self._scaler:
             self._scaler.step(self._optimizer)
@@ -1006,7 +1055,7 @@ class PyTorchBaseRunner(metaclass=abc.ABCMeta):
             logging.info(
                 f"Loading weights from checkpoint {self._checkpoint_path}"
             )
-            state_dict = cbtorch.load(checkpoint_path)
+            state_dict = load_checkpoint_file(checkpoint_path, cbtorch.load)
             self._model.set_state(state_dict)
         else:
             logging.info(
@@ -1137,12 +1186,16 @@ class PyTorchBaseRunner(metaclass=abc.ABCMeta):
         """
         runconfig_params = params["runconfig"]
         RunConfigParamsValidator().validate(runconfig_params)
-        if runconfig_params.get("max_checkpoints"):
-            warnings.warn("`max_checkpoints` is only supported using cstorch")
         if is_mup_run(params):
             logging.info(f'This is a muP configured run')
 
         target_device = runconfig_params["target_device"]
+        if target_device == DeviceType.CSX and runconfig_params.get(
+            "max_checkpoints"
+        ):
+            warnings.warn(
+                "`max_checkpoints` is only supported on CSX using cstorch"
+            )
 
         if target_device == DeviceType.CSX:
             from cerebras_appliance import DEFAULT_COMPILE_DIR
@@ -1210,8 +1263,6 @@ class PyTorchBaseRunner(metaclass=abc.ABCMeta):
 
             return PyTorchCSAppliance(model, params)
         elif target_device == DeviceType.CPU:
-            from modelzoo.common.pytorch.pytorch_runner import PyTorchRunner
-
             device = torch.device("cpu")
 
             if params["model"]["mixed_precision"] and not params["model"].get(
@@ -1223,6 +1274,16 @@ class PyTorchBaseRunner(metaclass=abc.ABCMeta):
                 )
                 params["model"]["use_bfloat16"] = True
 
+            if params["runconfig"].get("enable_distributed", False):
+                from modelzoo.common.pytorch.pytorch_dist_runner import (
+                    PyTorchDistRunner,
+                )
+
+                model = _base_model_compat(model_fn, params, device)
+                return PyTorchDistRunner(model, params)
+
+            from modelzoo.common.pytorch.pytorch_runner import PyTorchRunner
+
             model = _base_model_compat(model_fn, params, device)
 
             return PyTorchRunner(device, model, params)
@@ -1254,9 +1315,10 @@ class PyTorchBaseRunner(metaclass=abc.ABCMeta):
             else:  # Distributed GPU
                 from modelzoo.common.pytorch.pytorch_dist_runner import (
                     PyTorchDistRunner,
+                    is_torchrun_launch,
                 )
 
-                if world_size == 1:
+                if world_size == 1 and not is_torchrun_launch():
                     warnings.warn(
                         "Distributed training was enabled, but only "
                         "1 GPU was detected."
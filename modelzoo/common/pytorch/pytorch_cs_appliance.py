@@ -47,6 +47,7 @@ from modelzoo.common.pytorch.sparsity.appliance import (
     build_sparsify_grouper,
     validate_sparsity_params,
 )
+from modelzoo.common.pytorch.utils import load_checkpoint_file
 
 COMPILE_ONLY_MSG = "Compiling the model. This may take a few minutes."
 
@@ -451,8 +452,11 @@ class PyTorchCSAppliance(PyTorchBaseCSRunner):
                 with self._appliance.tracker_execute.entry(
                     "Convert PyTorch Checkpoint"
                 ):
-                    state_dict = torch.load(
-                        checkpoint_path, map_location=torch.device('cpu'),
+                    state_dict = load_checkpoint_file(
+                        checkpoint_path,
+                        lambda path: torch.load(
+                            path, map_location=torch.device('cpu'),
+                        ),
                     )
                     self._global_step = state_dict.get("global_step", 0)
 
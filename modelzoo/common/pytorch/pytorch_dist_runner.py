@@ -24,31 +24,55 @@ from modelzoo.common.pytorch import cb_model as cm
 from modelzoo.common.pytorch.metrics import compute_all_metrics, get_all_metrics
 from modelzoo.common.pytorch.pytorch_runner import PyTorchRunner
 from modelzoo.common.pytorch.utils import visit_structure
+from modelzoo.common.run_utils.utils import DeviceType
+
+
+def is_torchrun_launch():
+    """
+    Checks if the process was started by `torchrun` or another launcher that
+    sets the torch.distributed environment variables, in which case each
+    process joins the process group directly instead of spawning workers.
+    """
+    return "RANK" in os.environ and "WORLD_SIZE" in os.environ
 
 
 class PyTorchDistRunner(PyTorchRunner):
-    """Class for running PyTorch models on multiple GPUs."""
+    """Class for running PyTorch models on multiple GPUs or CPU processes.
+
+    By default, one process per GPU (or `num_processes` processes on CPU) is
+    spawned on the current host. When launched with `torchrun`, the rank and
+    world size are read from the environment instead, which allows running
+    across multiple nodes.
+    """
 
     def __init__(self, model, params):
         self._epoch = 0
+        self._use_cuda = params["runconfig"]["target_device"] == DeviceType.GPU
         # The main process we use to aggregate results and do most IOs
         self._main_process_id = params["runconfig"].get("main_process_id", 0)
-        self._dist_backend = params["runconfig"].get("dist_backend", "nccl")
+        self._dist_backend = params["runconfig"].get(
+            "dist_backend", "nccl" if self._use_cuda else "gloo"
+        )
         self._init_method = params["runconfig"].get("init_method", "env://")
         self._should_sync_batchnorm = params["runconfig"].get(
             "sync_batchnorm", False
         )
+        self._num_processes = params["runconfig"].get("num_processes", 1)
 
         if not dist.is_available():
             raise RuntimeError(f"torch.distributed package is not available")
 
-        dist_addr = params["runconfig"].get("dist_addr", "localhost:8888")
-        master_addr, master_port = dist_addr.split(":")
-        os.environ['MASTER_ADDR'] = master_addr
-        os.environ['MASTER_PORT'] = master_port
+        # torchrun sets the address of the rendezvous host itself
+        if not is_torchrun_launch():
+            dist_addr = params["runconfig"].get("dist_addr", "localhost:8888")
+            master_addr, master_port = dist_addr.split(":")
+            os.environ['MASTER_ADDR'] = master_addr
+            os.environ['MASTER_PORT'] = master_port
 
-        # pass in an instance of the model for housing keep
-        super().__init__(device=None, model=model, params=params)
+        # pass in an instance of the model for housing keep. The GPU of each
+        # process is only known once it starts
+        device = None if self._use_cuda else torch.device("cpu")
+        super().__init__(device=device, model=model, params=params)
 
     def is_master_ordinal(self):
         """
@@ -83,18 +107,17 @@ class PyTorchDistRunner(PyTorchRunner):
         if not torch.is_tensor(loss):
             loss = torch.tensor(loss).to(self._device)
 
-        # check _is_fetch_step ahead of time to minimize loss syncing
+        # check _is_fetch_step ahead of time to minimize loss syncing. The
+        # reduction itself synchronizes the processes, so no barrier is needed
         if self._is_fetch_step(0):
-            # not using AVG since it's only available with NCCL
-            dist.reduce(loss, 0, op=dist.ReduceOp.SUM)
-            loss /= dist.get_world_size()
-            dist.barrier()
+            loss = self._all_reduce_mean(loss.detach())
 
         if self.is_master_ordinal():
             super().on_train_batch_end(loss, epoch=epoch, step=step)
 
     def on_train_end(self, early_exit: bool):
         if self.is_master_ordinal():
+            self._checkpoint_writer.wait()
             logging.info("Training Completed Successfully!")
 
     ##################################################################
@@ -104,20 +127,33 @@ class PyTorchDistRunner(PyTorchRunner):
     def on_eval_batch_start(self, data):
         return self._to_device(data, non_blocking=True)
 
+    def on_eval_epoch_start(self):
+        self._eval_loss_sum = None
+        self._eval_loss_steps = 0
+
     def on_eval_batch_end(self, loss, epoch: int = None, step: int = None):
         """Actions to perform after the eval batch iteration is complete"""
-        self._maybe_check_loss_value(loss, step_offset=step + 1)
+        eval_step = step + 1
+        self._maybe_check_loss_value(loss, step_offset=eval_step)
 
         if not torch.is_tensor(loss):
             loss = torch.tensor(loss).to(self._device)
+        loss = loss.detach()
 
-        # not using AVG since it's only available with NCCL
-        dist.reduce(loss, 0, op=dist.ReduceOp.SUM)
-        loss /= dist.get_world_size()
-        dist.barrier()
+        # Losses are summed on device and only reduced across processes once
+        # in `compute_eval_metrics`, except on steps where they are logged
+        if self._eval_loss_sum is None:
+            self._eval_loss_sum = loss.clone()
+        else:
+            self._eval_loss_sum += loss
+        self._eval_loss_steps += 1
+
+        if self._is_fetch_step(eval_step):
+            loss = self._all_reduce_mean(loss.clone())
 
         if self.is_master_ordinal():
-            super().on_eval_batch_end(loss, epoch=epoch, step=step)
+            self._maybe_write_log(loss, step_offset=eval_step, base_step=0)
+            self._maybe_save_summaries(step_offset=eval_step, base_step=0)
 
     def on_eval_end(self, early_exit: bool):
         if self.is_master_ordinal():
@@ -127,16 +163,25 @@ class PyTorchDistRunner(PyTorchRunner):
         """Compute and log the eval metrics"""
         eval_metrics = compute_all_metrics()
 
-        # aggregate eval metrics across processes
+        # aggregate the eval loss and all eval metrics across processes with a
+        # single reduction
+        values = [
+            torch.as_tensor(metric, device=self._device)
+            .detach()
+            .reshape(())
+            .double()
+            for metric in eval_metrics.values()
+        ]
+        if self._eval_loss_sum is not None:
+            values.append(self._eval_loss_sum.reshape(()).double())
         aggregated_eval_metrics = dict()
-        for key, metric in eval_metrics.items():
-            if not torch.is_tensor(metric):
-                metric = torch.tensor(metric).to(self._device)
-            dist.reduce(metric, 0, op=dist.ReduceOp.SUM)
-            metric /= dist.get_world_size()
-            dist.barrier()
-            if self.is_master_ordinal():
-                aggregated_eval_metrics[key] = metric.detach().cpu().item()
+        if values:
+            values = self._all_reduce_mean(torch.stack(values)).tolist()
+            aggregated_eval_metrics = dict(zip(eval_metrics.keys(), values))
+            if self._eval_loss_sum is not None:
+                self._loss_saver.accumulate(
+                    torch.tensor(values[-1]), num_steps=self._eval_loss_steps
+                )
 
         if self.is_master_ordinal():
             if aggregated_eval_metrics:
@@ -162,7 +207,12 @@ class PyTorchDistRunner(PyTorchRunner):
                 )
             logging.info(f"Avg Eval. Loss = {avg_eval_loss}")
 
-        dist.barrier()
+    def _all_reduce_mean(self, tensor):
+        """Average a tensor across processes in place and return it."""
+        # not using AVG since it's only available with NCCL
+        dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+        tensor /= dist.get_world_size()
+        return tensor
 
     ##################################################################
     #                        Override train/eval functions           #
@@ -172,8 +222,14 @@ class PyTorchDistRunner(PyTorchRunner):
         get_all_metrics().update(all_metrics)
         logging.getLogger().setLevel(logging.INFO)
 
-        rank = dist.get_rank()
-        self._device = torch.device(rank)
+        if self._use_cuda:
+            # the rank among the processes on this node, which is the global
+            # rank when the processes are spawned by this runner
+            local_rank = int(os.environ.get("LOCAL_RANK", dist.get_rank()))
+            torch.cuda.set_device(local_rank)
+            self._device = torch.device("cuda", local_rank)
+        else:
+            self._device = torch.device("cpu")
         self._model.model.to(self._device)
         self._optimizer = self._model.get_optimizer()
         self._optimizer.to(self._device)
@@ -182,9 +238,26 @@ class PyTorchDistRunner(PyTorchRunner):
             self._model.model = torch.nn.SyncBatchNorm.convert_sync_batchnorm(
                 self._model.model
             )
-        self._model.model = DistributedDataParallel(
-            self._model.model, device_ids=[rank], output_device=rank
-        )
+        if self._use_cuda:
+            self._model.model = DistributedDataParallel(
+                self._model.model,
+                device_ids=[self._device.index],
+                output_device=self._device.index,
+            )
+        else:
+            self._model.model = DistributedDataParallel(self._model.model)
+
+    def _launch(self, fn, *args):
+        """Run `fn(rank, world_size, *args)` in every process of the job."""
+        if is_torchrun_launch():
+            fn(int(os.environ["RANK"]), int(os.environ["WORLD_SIZE"]), *args)
+            return
+
+        if self._use_cuda:
+            world_size = torch.cuda.device_count()
+        else:
+            world_size = self._num_processes
+        mp.spawn(fn, nprocs=world_size, args=(world_size, *args))
 
     def _train_dist(self, rank, world_size, train_data_fn, all_metrics):
         dist.init_process_group(
@@ -200,13 +273,7 @@ class PyTorchDistRunner(PyTorchRunner):
         dist.destroy_process_group()
 
     def train(self, train_data_fn):
-        all_metrics = get_all_metrics()
-        world_size = torch.cuda.device_count()
-        mp.spawn(
-            self._train_dist,
-            nprocs=world_size,
-            args=(world_size, train_data_fn, all_metrics),
-        )
+        self._launch(self._train_dist, train_data_fn, get_all_metrics())
 
     def _evaluate_dist(self, rank, world_size, eval_data_fn, all_metrics):
         dist.init_process_group(
@@ -226,13 +293,7 @@ class PyTorchDistRunner(PyTorchRunner):
         Args:
             dataloader: A data loader for generating data to feed to the model.
         """
-        all_metrics = get_all_metrics()
-        world_size = torch.cuda.device_count()
-        mp.spawn(
-            self._evaluate_dist,
-            nprocs=world_size,
-            args=(world_size, eval_data_fn, all_metrics),
-        )
+        self._launch(self._evaluate_dist, eval_data_fn, get_all_metrics())
 
     def _train_and_eval_dist(
         self, rank, world_size, train_data_fn, eval_data_fn, all_metrics
@@ -256,10 +317,9 @@ class PyTorchDistRunner(PyTorchRunner):
         Args:
             dataloader: A data loader for generating data to feed to the model.
         """
-        all_metrics = get_all_metrics()
-        world_size = torch.cuda.device_count()
-        mp.spawn(
+        self._launch(
             self._train_and_eval_dist,
-            nprocs=world_size,
-            args=(world_size, train_data_fn, eval_data_fn, all_metrics),
+            train_data_fn,
+            eval_data_fn,
+            get_all_metrics(),
         )
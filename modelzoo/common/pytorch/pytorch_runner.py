@@ -22,6 +22,8 @@ from typing import Optional, Union
 import torch
 from torch.cuda.amp import GradScaler
 
+from modelzoo.common.pytorch.checkpoint_writer import CheckpointWriter
+from modelzoo.common.pytorch.data_prefetcher import DevicePrefetcher
 from modelzoo.common.pytorch.pytorch_base_runner import PyTorchBaseRunner
 from modelzoo.common.pytorch.sparsity.finalizer import finalize_cs2_sparsity
 
@@ -44,6 +46,16 @@ class PyTorchRunner(PyTorchBaseRunner):
 
         super().__init__(model=model, params=params)
 
+        self._checkpoint_writer = CheckpointWriter(
+            self._model_dir,
+            async_save=self._runconfig.get("async_checkpoint", False),
+            max_pending=self._runconfig.get("max_pending_checkpoints", 1),
+            max_checkpoints=self._runconfig.get("max_checkpoints"),
+            on_saved=self.on_checkpoint_saved,
+        )
+        self._prefetch_batches = self._runconfig.get("prefetch_batches", 1)
+        self._data_prefetcher = None
+
         if self._mixed_precision:
             use_bfloat16 = params["model"].get("use_bfloat16", False)
             dev_type = self._device.type if self._device is not None else "cuda"
@@ -83,6 +95,7 @@ class PyTorchRunner(PyTorchBaseRunner):
                 )
 
     def on_train_end(self, early_exit: bool):
+        self._checkpoint_writer.wait()
         logging.info("Training Completed Successfully!")
 
     def on_train_batch_start(self, data):
@@ -107,6 +120,39 @@ class PyTorchRunner(PyTorchBaseRunner):
     def on_eval_batch_start(self, data):
         return self._to_device(data)
 
+    ##################################################################
+    #                        Train/Eval Loops                        #
+    ##################################################################
+
+    def train_epoch(
+        self, epoch: int, dataloader: torch.utils.data.DataLoader
+    ) -> bool:
+        return super().train_epoch(epoch, self._maybe_prefetch(dataloader))
+
+    def eval_epoch(self, dataloader, epoch: int = None):
+        return super().eval_epoch(self._maybe_prefetch(dataloader), epoch)
+
+    def _maybe_prefetch(self, dataloader):
+        """Wrap the dataloader to copy batches to the device ahead of time,
+        unless prefetching is disabled with `prefetch_batches: 0`."""
+        if not self._prefetch_batches:
+            self._data_prefetcher = None
+            return dataloader
+        self._data_prefetcher = DevicePrefetcher(
+            dataloader,
+            self._to_device,
+            self._device,
+            num_batches=self._prefetch_batches,
+        )
+        return self._data_prefetcher
+
+    def _log_throughput(self, step):
+        if self._data_prefetcher is None:
+            return
+        stall_time = self._data_prefetcher.pop_stall_time()
+        if self._writer:
+            self._writer.add_scalar("data_stall_time", stall_time, step)
+
     ##################################################################
     #                   Override Abstract Methods                    #
     ##################################################################
@@ -149,9 +195,9 @@ class PyTorchRunner(PyTorchBaseRunner):
         if self._scaler:
             model_state["scaler"] = self._scaler.state_dict()
 
-        torch.save(model_state, file_name)
-
-        self.on_checkpoint_saved(file_name, step)
+        # `on_checkpoint_saved` is called by the writer once the checkpoint
+        # is complete, which may be after this returns in async mode
+        self._checkpoint_writer.save(model_state, file_name, step)
 
     def _to_device(
         self, data: Union[dict, UserDict, list, tuple], non_blocking=False
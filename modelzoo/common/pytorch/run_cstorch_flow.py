@@ -26,6 +26,7 @@ import torch
 from modelzoo.common.pytorch.half_dtype import half_dtype_instance
 from modelzoo.common.pytorch.utils import (
     is_mup_run,
+    load_checkpoint_file,
     named_parameters_requiring_grad,
     partition_params_groups_with_adjusted_lr,
     partition_params_groups_with_weight_decay,
@@ -274,7 +275,7 @@ def run_cstorch_train(params, model_fn, input_fn, cs_config):
 
     def load_checkpoint(checkpoint_path):
         logging.info(f"Loading weights from checkpoint {checkpoint_path}")
-        state_dict = cstorch.load(checkpoint_path)
+        state_dict = load_checkpoint_file(checkpoint_path, cstorch.load)
         model.load_state_dict(state_dict["model"])
         if not runconfig.get("is_pretrained_checkpoint", False):
             optimizer.load_state_dict(state_dict["optimizer"])
@@ -531,7 +532,7 @@ def run_cstorch_eval(params, model_fn, input_fn, cs_config):
 
     def load_checkpoint(checkpoint_path):
         logging.info(f"Loading weights from checkpoint {checkpoint_path}")
-        state_dict = cstorch.load(checkpoint_path)
+        state_dict = load_checkpoint_file(checkpoint_path, cstorch.load)
         model.load_state_dict(state_dict["model"])
 
         global_step = state_dict.get("global_step", 0)
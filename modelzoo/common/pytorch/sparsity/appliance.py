@@ -27,6 +27,7 @@ import functools
 import logging
 import re
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Iterable, List, Tuple
 
 import numpy as np
@@ -39,6 +40,61 @@ from cerebras_appliance.appliance_manager import (
 from modelzoo.common.pytorch import cb_model as cm
 from modelzoo.common.pytorch.PyTorchBaseModel import PyTorchBaseModel
 
+# Masks of weights with at least this many elements are computed from a
+# per-group threshold in chunks on a thread pool, as NumPy releases the GIL
+# while partitioning and comparing.
+_CHUNKED_MASK_MIN_NUMEL = 1 << 24
+_MASK_CHUNK_NUMEL = 1 << 22
+
+
+def _chunked_topk_mask(score: np.ndarray, keep: int) -> np.ndarray:
+    """
+    Compute a mask that is True for the `keep` highest scores of each group.
+
+    Instead of sorting indices with `np.argpartition`, this finds the lowest
+    kept score of each group with `np.partition` and then compares the scores
+    against it chunk by chunk in parallel. Among scores tied with the lowest
+    kept score, the first ones are kept.
+
+    Args:
+        score: Scores of shape [num_groups, numel].
+        keep: Number of scores to keep per group, in the range [1, numel].
+
+    Returns:
+        mask with np.dtype bool of the same shape as score
+    """
+    num_groups, numel = score.shape
+    kth = numel - keep
+    mask = np.empty(score.shape, dtype=bool)
+    chunks = [
+        (group, start)
+        for group in range(num_groups)
+        for start in range(0, numel, _MASK_CHUNK_NUMEL)
+    ]
+
+    def threshold(group):
+        return np.partition(score[group], kth)[kth]
+
+    def compare(chunk):
+        group, start = chunk
+        stop = min(start + _MASK_CHUNK_NUMEL, numel)
+        out = mask[group, start:stop]
+        np.greater_equal(score[group, start:stop], thresholds[group], out=out)
+        return np.count_nonzero(out)
+
+    with ThreadPoolExecutor() as pool:
+        thresholds = list(pool.map(threshold, range(num_groups)))
+        num_kept = np.zeros(num_groups, dtype=np.int64)
+        for (group, _), count in zip(chunks, pool.map(compare, chunks)):
+            num_kept[group] += count
+
+    # Only keep as many of the scores tied with the threshold as needed.
+    for group in np.flatnonzero(num_kept > keep):
+        ties = np.flatnonzero(score[group] == thresholds[group])
+        mask[group, ties[ties.size - (num_kept[group] - keep) :]] = False
+
+    return mask
+
 
 def compute_mask(
     params: dict, weight: np.ndarray
@@ -108,12 +164,15 @@ def compute_mask(
     # Compute the number of elements to keep, rounding toward sparsity
     numel = score.shape[-1]
     keep = numel - int(np.round(sparsity * numel))
-    # Compute the indices of the score to keep (within each group)
-    keep_index = np.argpartition(score, -keep, axis=-1)[:, -keep:]
+    if keep and score.size >= _CHUNKED_MASK_MIN_NUMEL:
+        mask = _chunked_topk_mask(score, keep)
+    else:
+        # Compute the indices of the score to keep (within each group)
+        keep_index = np.argpartition(score, -keep, axis=-1)[:, -keep:]
 
-    # Put True into the kept positions (within each group)
-    mask = np.zeros(score.shape, dtype=np.bool)
-    np.put_along_axis(mask, keep_index, values=True, axis=-1)
+        # Put True into the kept positions (within each group)
+        mask = np.zeros(score.shape, dtype=bool)
+        np.put_along_axis(mask, keep_index, values=True, axis=-1)
 
     # Ungroup mask back to shape of score
     if in_groups:
@@ -422,6 +481,13 @@ def build_sparsify_grouper(
     optimizer = model.get_optimizer()
     optimizer_state = state_dict.get("optimizer", {}).get("state", {})
 
+    # Index the state_dict keys of the optimizer state tensors by their id and
+    # state name, so each related tensor is found with a single lookup.
+    opt_state_keys = {}
+    for param_id, state in optimizer_state.items():
+        for state_name, state_tensor in state.items():
+            opt_state_keys.setdefault((id(state_tensor), state_name), param_id)
+
     # For printing a single info level summary log statement.
     summary_info = defaultdict(int)
 
@@ -448,15 +514,13 @@ def build_sparsify_grouper(
             if state_tensor.shape != param.shape:
                 # Only consider optimizer state of same shape as parameter.
                 continue
-            id_state = id(state_tensor)
-            for param_id, state in optimizer_state.items():
-                if state_name in state and id(state[state_name]) == id_state:
-                    # Found the state_dict key for this related tensor.
-                    opt_state_name = f"optimizer.state.{param_id}.{state_name}"
-                    opt_state_names.append(opt_state_name)
-                    cm.set_attribute(state_tensor, "sparse", True)
-                    cm.set_attribute(state_tensor, "sparsity", sparsity)
-                    break
+            param_id = opt_state_keys.get((id(state_tensor), state_name))
+            if param_id is not None:
+                # Found the state_dict key for this related tensor.
+                opt_state_name = f"optimizer.state.{param_id}.{state_name}"
+                opt_state_names.append(opt_state_name)
+                cm.set_attribute(state_tensor, "sparse", True)
+                cm.set_attribute(state_tensor, "sparsity", sparsity)
 
         # Aggregate summary before setting per weight unique seed.
         summary_info[tuple(weight_sparsify_params.items())] += 1
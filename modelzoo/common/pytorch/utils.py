@@ -14,6 +14,7 @@
 
 """General purpose Pytorch Utilities"""
 import argparse
+import json
 import logging
 import os
 import random
@@ -575,7 +576,7 @@ def get_checkpoints(model_dir: str) -> List[str]:
     """Gather checkpoints in a model directory"""
     matches = []
     for filename in os.listdir(model_dir):
-        m = re.match(r"checkpoint_(\d+)\.mdl", filename)
+        m = re.fullmatch(r"checkpoint_(\d+)\.mdl", filename)
         if m:
             matches.append(m)
     matches.sort(key=lambda x: int(x.group(1)))  # Sort by index not lexically
@@ -583,6 +584,29 @@ def get_checkpoints(model_dir: str) -> List[str]:
     return checkpoints
 
 
+def load_checkpoint_file(
+    checkpoint_path: str, load_fn: Callable = torch.load
+) -> dict:
+    """Load a checkpoint with `load_fn`.
+
+    A sharded checkpoint, i.e. the `.index.json` file written by
+    `convert_checkpoint.py convert --streaming`, is loaded one shard at a time.
+    Its shards hold the model state dict only, which is returned under the
+    "model" key like in the checkpoints saved by the runners.
+    """
+    if not checkpoint_path.endswith(".index.json"):
+        return load_fn(checkpoint_path)
+
+    with open(checkpoint_path, "r") as f:
+        weight_map = json.load(f)["weight_map"]
+    index_dir = os.path.dirname(checkpoint_path)
+    model_state_dict = {}
+    for shard_file in dict.fromkeys(weight_map.values()):
+        logging.info(f"Loading checkpoint shard {shard_file}")
+        model_state_dict.update(load_fn(os.path.join(index_dir, shard_file)))
+    return {"model": model_state_dict}
+
+
 def is_mup_run(params):
     """
     Check if the run is configured with muP hyperparameter settings
@@ -14,11 +14,14 @@
 
 """PyTorch HDF5 Dataset"""
 
+import collections
 import json
 import logging
 import math
 import os
 import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import h5py
@@ -26,6 +29,7 @@ import numpy as np
 import torch
 
 from modelzoo.common.pytorch.input_utils import get_streaming_batch_size
+from modelzoo.transformers.data_processing.h5_manifest import load_h5_manifest
 from modelzoo.transformers.pytorch.input_utils import (
     num_tasks,
     shard_list_of_chunks_contiguous,
@@ -33,6 +37,11 @@ from modelzoo.transformers.pytorch.input_utils import (
 )
 
 
+def _read_h5_rows(file_path, start_idx, end_idx):
+    with h5py.File(file_path, mode='r') as h5_file:
+        return h5_file["data"][start_idx:end_idx]
+
+
 class HDF5IterableDataset(torch.utils.data.IterableDataset):
     """
     A HDF5 dataset processor. Loads data from HDF5 files.
@@ -46,6 +55,15 @@ class HDF5IterableDataset(torch.utils.data.IterableDataset):
     - "num_workers" (int):  How many subprocesses to use for data loading.
     - "drop_last" (bool): If True and the dataset size is not divisible
        by the batch size, the last incomplete batch will be dropped.
+    - "read_ahead_chunks" (int): Maximum number of chunks of data read from
+       disk by background threads ahead of the chunk currently being
+       consumed. Defaults to 0, which disables reading ahead.
+    - "read_ahead_chunk_size" (int): Number of samples in each chunk read
+       ahead. Defaults to 16 batches.
+    - "read_ahead_threads" (int): Number of threads reading chunks.
+       Defaults to 2.
+    - "read_ahead_memory_mb" (int): Upper bound on the memory held by chunks
+       that have been read ahead but not consumed yet, in MiB. Defaults to 1024.
     """
 
     def __init__(self, params):
@@ -63,6 +81,16 @@ class HDF5IterableDataset(torch.utils.data.IterableDataset):
         self.features_list = params.get(
             "features", ["input_ids", "attention_mask", "labels"]
         )
+        self.read_ahead_chunks = params.get("read_ahead_chunks", 0)
+        self.read_ahead_chunk_size = params.get(
+            "read_ahead_chunk_size", 16 * self.batch_size
+        )
+        self.read_ahead_threads = params.get("read_ahead_threads", 2)
+        self.read_ahead_memory = (
+            params.get("read_ahead_memory_mb", 1024) * 1024 * 1024
+        )
+        self.read_ahead_stats = {}
+        self._reset_read_ahead_stats()
 
         # Load feature names from data_params.json, if present and
         # has the correct format (generated by HF > HDF5 converter script)
@@ -88,9 +116,9 @@ class HDF5IterableDataset(torch.utils.data.IterableDataset):
             assert (
                 p.is_dir()
             ), f"The path {directory} does not exist or is not a directory."
-            files.extend(p.glob('*.h5'))
+            files.extend(load_h5_manifest(p))
 
-        files = sorted(files)
+        files = sorted(files, key=lambda entry: entry["path"])
         if not files:
             raise RuntimeError("No .h5 dataset files found.")
 
@@ -98,20 +126,17 @@ class HDF5IterableDataset(torch.utils.data.IterableDataset):
         self.task_id = task_id()
 
         # Shard H5 files between the tasks and resolve the paths
-        files_in_this_task = [
-            str(file.resolve())
-            for file in files[self.task_id :: self.num_tasks]
-        ]
-
         self.files_in_this_task = []
         self.num_examples_in_this_task = 0
-        for file_path in files_in_this_task:
-            with h5py.File(file_path, mode='r') as h5_file:
-                num_examples_in_file = h5_file.attrs["n_examples"]
-                self.files_in_this_task.append(
-                    (file_path, num_examples_in_file)
+        for entry in files[self.task_id :: self.num_tasks]:
+            if entry["n_examples"] is None:
+                raise KeyError(
+                    f"File {entry['path']} has no `n_examples` attribute"
                 )
-                self.num_examples_in_this_task += num_examples_in_file
+            self.files_in_this_task.append(
+                (str(entry["path"].resolve()), entry["n_examples"])
+            )
+            self.num_examples_in_this_task += entry["n_examples"]
 
         if self.shuffle:
             random.seed(self.shuffle_seed)
@@ -243,6 +268,7 @@ class HDF5IterableDataset(torch.utils.data.IterableDataset):
 
                     break
 
+        reads = []
         for partition_idx, partition_specs in enumerate(
             data_partitions[restart_iter_partition_id:]
         ):
@@ -256,21 +282,102 @@ class HDF5IterableDataset(torch.utils.data.IterableDataset):
                     start_idx = start_idx_org
             else:
                 start_idx = start_idx_org
-            with h5py.File(file_path, mode='r') as h5_file:
-                for idx in range(
-                    start_idx, start_idx_org + num_examples, self.batch_size
-                ):
-                    load_len = min(
-                        self.batch_size, start_idx_org + num_examples - idx
-                    )
-                    load_data = h5_file["data"][idx : idx + load_len]
-                    for i in range(load_len):
-                        yield load_data[i]
+            reads.append((file_path, start_idx, start_idx_org + num_examples))
+
+        if self.read_ahead_chunks > 0:
+            yield from self._load_read_ahead(reads)
+        else:
+            for file_path, start_idx, end_idx in reads:
+                with h5py.File(file_path, mode='r') as h5_file:
+                    for idx in range(start_idx, end_idx, self.batch_size):
+                        load_len = min(self.batch_size, end_idx - idx)
+                        load_data = h5_file["data"][idx : idx + load_len]
+                        for i in range(load_len):
+                            yield load_data[i]
 
         # reset dataloader state so that subsequent epochs start
         # from the first batch
         self.prev_worker_iter_index = 0
 
+    def _reset_read_ahead_stats(self):
+        self.read_ahead_stats.update(
+            chunks=0, ready_chunks=0, stalls=0, stall_time=0.0
+        )
+
+    def _load_read_ahead(self, reads):
+        """
+        Yield the same examples as the plain loop in `_load_buffer`, but read
+        them in chunks on a pool of background threads so that disk reads of
+        upcoming chunks overlap with the consumption of the current one.
+
+        At most `read_ahead_chunks` chunks are in flight at a time, and no new
+        chunk is requested if doing so would take the memory held by chunks
+        in flight over `read_ahead_memory`.
+        """
+        chunks = (
+            (file_path, idx, min(idx + self.read_ahead_chunk_size, end_idx))
+            for file_path, start_idx, end_idx in reads
+            for idx in range(start_idx, end_idx, self.read_ahead_chunk_size)
+        )
+        in_flight = collections.deque()
+        in_flight_examples = 0
+        bytes_per_example = None
+        stats = self.read_ahead_stats
+
+        with ThreadPoolExecutor(self.read_ahead_threads) as executor:
+            while True:
+                while len(in_flight) < self.read_ahead_chunks:
+                    if in_flight:
+                        # don't go over the memory budget, using the size of
+                        # the chunks read so far as an estimate
+                        if bytes_per_example is None:
+                            break
+                        next_examples = (
+                            in_flight_examples + self.read_ahead_chunk_size
+                        )
+                        if (
+                            next_examples * bytes_per_example
+                            > self.read_ahead_memory
+                        ):
+                            break
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    num_examples = chunk[2] - chunk[1]
+                    in_flight.append(
+                        (executor.submit(_read_h5_rows, *chunk), num_examples)
+                    )
+                    in_flight_examples += num_examples
+                if not in_flight:
+                    break
+
+                # the number of chunks that are already read when the consumer
+                # asks for the next one measures how far ahead the reader is
+                stats["chunks"] += 1
+                stats["ready_chunks"] += sum(f.done() for f, _ in in_flight)
+                future, num_examples = in_flight.popleft()
+                if not future.done():
+                    stats["stalls"] += 1
+                    start = time.time()
+                    load_data = future.result()
+                    stats["stall_time"] += time.time() - start
+                else:
+                    load_data = future.result()
+                in_flight_examples -= num_examples
+                if bytes_per_example is None and num_examples:
+                    bytes_per_example = load_data.nbytes / num_examples
+
+                for i in range(num_examples):
+                    yield load_data[i]
+
+        if stats["chunks"]:
+            logging.info(
+                f"Read ahead {stats['chunks']} chunks with an average of "
+                f"{stats['ready_chunks'] / stats['chunks']:.2f} chunks ready, "
+                f"stalled {stats['stalls']} times for a total of "
+                f"{stats['stall_time']:.2f}s"
+            )
+
     def __iter__(self):
         """
         Iterating over the data to construct input features.
@@ -288,6 +395,8 @@ class HDF5IterableDataset(torch.utils.data.IterableDataset):
         data_partitions = shard_list_of_chunks_contiguous(
             self.files_in_this_task, worker_id, num_workers
         )
+        # the read ahead stats are logged per pass over the data
+        self._reset_read_ahead_stats()
 
         for example in self._load_buffer(data_partitions):
             yield {
@@ -0,0 +1,131 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A persistent cache of the metadata of the h5 files in a directory.
+
+Readers need the shape of the `data` array (and sometimes the `n_examples`
+attribute) of every file they read before they can index into a dataset. On
+large corpora opening every file at startup is slow, and it is repeated by
+every task and worker of every job. The manifest written by this module next
+to the data records that information once, and is updated incrementally for
+the files whose size or modification time changed since it was written.
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import h5py
+
+MANIFEST_FILE_NAME = ".h5_manifest.json"
+_MANIFEST_VERSION = 1
+# scanning only a handful of files isn't worth the cost of starting a pool
+_MIN_FILES_FOR_PARALLEL_SCAN = 16
+
+
+def _scan_h5_file(path):
+    with h5py.File(path, "r") as f:
+        dset = f["data"]
+        n_examples = f.attrs.get("n_examples", None)
+        return {
+            "shape": list(dset.shape),
+            "dtype": dset.dtype.str,
+            "n_examples": None if n_examples is None else int(n_examples),
+        }
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != _MANIFEST_VERSION:
+        return {}
+    return {entry["name"]: entry for entry in manifest.get("files", [])}
+
+
+def _write_manifest(manifest_path, entries):
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"version": _MANIFEST_VERSION, "files": entries}, f)
+        # an atomic rename means that concurrent readers and writers only
+        # ever see complete manifests
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        logging.warning(
+            f"Unable to write h5 manifest {manifest_path}, metadata will be "
+            f"recomputed on the next run: {e}"
+        )
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_h5_manifest(data_dir, num_workers=None):
+    """
+    Get the metadata of every h5 file in `data_dir`, using the cached
+    manifest where it is still valid and rescanning the files where it isn't.
+
+    Args:
+        data_dir (str): A directory containing h5 files with a `data` dataset.
+        num_workers (int): The number of processes used to scan files that are
+            missing from the manifest. Defaults to the number of CPUs.
+    Returns:
+        A list with one dictionary per file, in the order in which
+        `Path(data_dir).glob("*.h5")` lists them. Each dictionary contains
+        the keys `path`, `name`, `size`, `mtime_ns`, `shape`, `dtype`, and
+        `n_examples` (`None` if the file has no such attribute).
+    """
+    data_dir = Path(data_dir)
+    manifest_path = data_dir / MANIFEST_FILE_NAME
+    cached = _read_manifest(manifest_path)
+
+    entries = []
+    stale = []
+    for path in data_dir.glob("*.h5"):
+        stat = path.stat()
+        entry = cached.get(path.name)
+        if (
+            entry is None
+            or entry["size"] != stat.st_size
+            or entry["mtime_ns"] != stat.st_mtime_ns
+        ):
+            entry = {
+                "name": path.name,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+            stale.append(entry)
+        entries.append(entry)
+
+    if stale:
+        paths = [str(data_dir / entry["name"]) for entry in stale]
+        if len(stale) < _MIN_FILES_FOR_PARALLEL_SCAN or num_workers == 1:
+            results = map(_scan_h5_file, paths)
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                results = list(executor.map(_scan_h5_file, paths, chunksize=8))
+        for entry, result in zip(stale, results):
+            entry.update(result)
+        logging.info(
+            f"Scanned {len(stale)} of {len(entries)} h5 files in {data_dir}"
+        )
+    if stale or len(cached) != len(entries):
+        _write_manifest(manifest_path, entries)
+
+    return [{"path": data_dir / entry["name"], **entry} for entry in entries]
@@ -0,0 +1,195 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Convert a directory of h5 files written by `preprocess_pile.py` or by
+`../scripts/hdf5_preprocessing/create_hdf5_dataset.py` into the flat binary
+format read by `MemmapReader`.
+
+The `data` arrays of all input files are concatenated along their first
+dimension into one raw binary file. The offset at which each input file starts
+is stored in a separate index so that `MemmapReader` splits the data into
+sequences exactly like `H5Reader` does for the original files. For example,
+```
+python convert_h5_to_memmap.py \
+       --input_dir /path/to/h5/dir \
+       --output_dir /path/to/memmap/dir
+```
+After conversion, set `use_memmap: True` and point `data_dir` at the output
+directory in the data processor config.
+"""
+import argparse
+import json
+import logging
+import os
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from modelzoo.transformers.data_processing.h5_map_dataset.readers import (
+    MEMMAP_DATA_FILE,
+    MEMMAP_INDEX_FILE,
+    MEMMAP_METADATA_FILE,
+)
+
+logging.basicConfig()
+logger = logging.getLogger(__file__)
+logger.setLevel(logging.INFO)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--input_dir",
+        required=True,
+        help="a directory of h5 files to convert",
+    )
+    parser.add_argument(
+        "--output_dir",
+        required=True,
+        help="the directory to write the converted data to",
+    )
+    parser.add_argument(
+        "--dtype",
+        choices=["auto", "uint16", "uint32", "int32"],
+        default="auto",
+        help=(
+            "the dtype used to store tokens on disk. `auto` picks the smallest "
+            "dtype that can represent every value in the input, which requires "
+            "an extra pass over the data"
+        ),
+    )
+    parser.add_argument(
+        "--chunk_size",
+        type=int,
+        default=2 ** 24,
+        help="the number of rows of each h5 file to hold in memory at once",
+    )
+    parser.add_argument(
+        "--overwrite_output",
+        action="store_true",
+        help="overwrite previous output if it exists",
+    )
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        raise ValueError(
+            f"input_dir must be a valid directory, got {args.input_dir}"
+        )
+    if args.chunk_size < 1:
+        raise ValueError(
+            f"chunk_size must be a positive integer, got {args.chunk_size}"
+        )
+    return args
+
+
+def iter_chunks(dset, chunk_size):
+    for start in range(0, len(dset), chunk_size):
+        yield dset[start : start + chunk_size]
+
+
+def infer_dtype(files, chunk_size):
+    """
+    Find the smallest dtype that can represent every value stored in `files`.
+    """
+    min_value, max_value = 0, 0
+    for path in files:
+        with h5py.File(path, "r") as f:
+            for chunk in iter_chunks(f["data"], chunk_size):
+                if chunk.size:
+                    min_value = min(min_value, int(chunk.min()))
+                    max_value = max(max_value, int(chunk.max()))
+    if min_value >= 0 and max_value < 2 ** 16:
+        return np.uint16
+    if min_value >= 0 and max_value < 2 ** 32:
+        return np.uint32
+    if min_value >= -(2 ** 31) and max_value < 2 ** 31:
+        return np.int32
+    raise ValueError(
+        f"only values in the range of a 32 bit integer are supported, got "
+        f"values in the range [{min_value}, {max_value}]"
+    )
+
+
+def convert(input_dir, output_dir, dtype="auto", chunk_size=2 ** 24):
+    # use the same file order as `H5Reader` so that sample indices match
+    files = list(Path(input_dir).glob("*.h5"))
+    if not files:
+        raise ValueError(f"no h5 files found in {input_dir}")
+
+    sample_shape = None
+    offsets = [0]
+    for path in files:
+        with h5py.File(path, "r") as f:
+            shape = f["data"].shape
+        if sample_shape is None:
+            sample_shape = shape[1:]
+        elif shape[1:] != sample_shape:
+            raise ValueError(
+                f"all input files must contain samples of the same shape, but "
+                f"{path} has data of shape {shape} while previous files have "
+                f"samples of shape {sample_shape}"
+            )
+        offsets.append(offsets[-1] + shape[0])
+
+    if dtype == "auto":
+        dtype = infer_dtype(files, chunk_size)
+    dtype = np.dtype(dtype)
+    logger.info(
+        f"converting {len(files)} files with {offsets[-1]} rows of shape "
+        f"{sample_shape} to dtype {dtype.name}"
+    )
+
+    metadata_path = os.path.join(output_dir, MEMMAP_METADATA_FILE)
+    if os.path.exists(metadata_path):
+        os.remove(metadata_path)
+    data_path = os.path.join(output_dir, MEMMAP_DATA_FILE)
+    with open(data_path, "wb") as out:
+        for path in files:
+            logger.info(f"converting {path}")
+            with h5py.File(path, "r") as f:
+                for chunk in iter_chunks(f["data"], chunk_size):
+                    np.ascontiguousarray(chunk, dtype=dtype).tofile(out)
+
+    np.save(
+        os.path.join(output_dir, MEMMAP_INDEX_FILE),
+        np.array(offsets, dtype=np.int64),
+    )
+    metadata = {
+        "dtype": dtype.name,
+        "sample_shape": list(sample_shape),
+        "files": [p.name for p in files],
+    }
+    # the metadata file is written last so that its presence marks a complete
+    # conversion
+    with open(metadata_path, "w") as f:
+        json.dump(metadata, f, indent=4)
+
+
+def main():
+    args = parse_args()
+    if os.path.exists(
+        os.path.join(args.output_dir, MEMMAP_METADATA_FILE)
+    ) and not args.overwrite_output:
+        raise ValueError(
+            f"Output directory {args.output_dir} already contains converted "
+            f"data. To overwrite, rerun with `--overwrite_output`"
+        )
+    os.makedirs(args.output_dir, exist_ok=True)
+    convert(args.input_dir, args.output_dir, args.dtype, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,12 +16,13 @@ import glob
 import logging
 import os
 
+import numpy as np
 import torch
 
 from modelzoo.common.pytorch import cb_model as cm
 from modelzoo.vision.pytorch.input.utils import create_worker_cache
 
-from .readers import H5Reader, Mixture
+from .readers import H5Reader, MemmapReader, Mixture, read_batch
 from .samplers import CBSampler
 
 
@@ -62,6 +63,11 @@ class HDF5Dataset(torch.utils.data.Dataset):
                 that is directly attached to each individual worker node.
                 Useful when your network storage is unusually slow, but
                 otherwise discouraged.
+            - "use_memmap" (bool): whether to read data from the flat binary
+                format written by `convert_h5_to_memmap.py` through
+                `MemmapReader` rather than from h5 files through `H5Reader`.
+                All data directories must then contain converted data.
+                Defaults to `False`.
             - "max_sequence_length" (int): the sequence length of samples
                 produced by the dataloader. When using the 'corpus' data format,
                 the same preprocessed data will work with any max sequence
@@ -92,6 +98,7 @@ class HDF5Dataset(torch.utils.data.Dataset):
 
     def __init__(self, params):
         self.use_worker_cache = params.get("use_worker_cache", False)
+        self.use_memmap = params.get("use_memmap", False)
         self.msl = params.get("max_sequence_length", None)
         shuffle = params.get("shuffle", True)
         seed = params.get("shuffle_seed", 0)
@@ -159,7 +166,8 @@ class HDF5Dataset(torch.utils.data.Dataset):
             else:
                 data_dir = [create_worker_cache(d) for d in data_dir]
 
-        reader = H5Reader(data_dir, self.msl, True, subset)
+        reader_cls = MemmapReader if self.use_memmap else H5Reader
+        reader = reader_cls(data_dir, self.msl, True, subset)
         return reader
 
     def _get_global_samples_from_ckpt(self, dataloader_state):
@@ -204,10 +212,24 @@ class HDF5Dataset(torch.utils.data.Dataset):
         return total_samples
 
     def __getitem__(self, i):
+        if isinstance(i, (list, tuple, np.ndarray)):
+            return self.__getitems__(i)
         x = self.reader[i]
         if self.map_fn is not None:
             return self.map_fn(x)
         return x
 
+    def __getitems__(self, indices):
+        """
+        Batched version of `__getitem__`. `__getitem__` dispatches here when
+        it is given all of the indices of a batch produced by `self.sampler`,
+        which lets the reader coalesce the whole batch into a few large disk
+        reads.
+        """
+        xs = read_batch(self.reader, indices)
+        if self.map_fn is not None:
+            return [self.map_fn(x) for x in xs]
+        return xs
+
     def __len__(self):
         return len(self.reader)
@@ -12,84 +12,58 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import contextlib
+import json
 from pathlib import Path
 
 import h5py
 import numpy as np
 
+from modelzoo.transformers.data_processing.h5_manifest import load_h5_manifest
+
+
+MEMMAP_DATA_FILE = "data.bin"
+MEMMAP_INDEX_FILE = "index.npy"
+MEMMAP_METADATA_FILE = "metadata.json"
+
 
 @contextlib.contextmanager
 def trivial_context_manager(f):
     yield f
 
 
-class H5Reader:
+def read_batch(dataset, indices):
     """
-    An abstraction for reading individual sequences from h5 files on disk.
-
-    Supports 2 formats of data on disk. The first is a rank-1 tensor of
-    concatenated tokenized documents. The second is a rank > 1 tensor of
-    preprocessed samples where the 0th index of the data on disk indexes the
-    data by sample.
+    Read several samples from a map-style dataset, using the dataset's batched
+    `__getitems__` API when it exists and falling back to one `__getitem__`
+    call per sample otherwise.
     """
+    if hasattr(dataset, "__getitems__"):
+        return dataset.__getitems__(indices)
+    return [dataset[i] for i in indices]
 
-    _MAX_OPEN_FILES = 35
 
-    def __init__(
-        self,
-        data_dirs,
-        sequence_length=None,
-        read_extra_token=False,
-        data_subset=None,
-    ):
-        """
-        Creates a reader for an h5 corpus
+class BaseReader:
+    """
+    Functionality shared by the readers in this module: validation of the
+    layout of the data on disk, data subsetting, and length bookkeeping.
+    Subclasses are expected to set `self.msl`, `self._num_extra_tokens`, and
+    `self._num_sequences`.
+    """
 
-        Args:
-            data_dirs (list[str]): Directories containing h5 files to read from
-            sequence_length (int): The number of tokens per sample if reading
-                from a corpus. Must be `None` if the data has already been
-                preprocessed into samples.
-            read_extra_token (bool): Whether to read and return one extra token
-                after the end of the sequence. This can be useful for language
-                modeling tasks where you want to construct the labels as an
-                shifted version of the inputs. Setting this to `True` differs
-                from increasing `sequence_length` by one in that the extra token
-                returned due to this flag will be included in some other
-                sequence as the first token. Will be ignored if
-                `sequence_length` is `None`.
-            data_subset (str): A string specifying the subset of the corpus to
-                consider. E.g. if `data_subset="0.0-0.75"` is specified, only
-                samples in the first 3/4 of the dataset will be considered and
-                the last 1/4 of the dataset will be completely untouched. The
-                self reported length will be the length of the valid portion
-                of the dataset (e.g. the first 3/4), and any attempt to access
-                an element beyond this length will result in an exception.
+    def _set_by_sample(self, data_shape, source):
+        """
+        Decide whether samples are read by indexing into preprocessed data or
+        by slicing a corpus, given the shape of the data stored on disk.
         """
-        self.msl = sequence_length
-        self._num_extra_tokens = 1 if read_extra_token else 0
-
-        self._files = []
-        if not isinstance(data_dirs, list):
-            data_dirs = [data_dirs]
-        for data_dir in data_dirs:
-            p = Path(data_dir)
-            if not p.is_dir():
-                raise ValueError(
-                    f"The path {p} does not exist or is not a directory"
-                )
-            self._files.extend(p.glob("*.h5"))
-
         self._by_sample = False
-        with h5py.File(self._files[0], "r") as f:
-            data_shape = f["data"].shape
         if self.msl is None:
             if len(data_shape) < 2:
                 raise ValueError(
                     "If you don't specify `sequence_length`, then the data "
                     "being read must be preprocessed by sample, but the data "
-                    f"written to {self._files[0]} has rank 1"
+                    f"written to {source} has rank 1"
                 )
             self._by_sample = True
         elif len(data_shape) > 1:
@@ -98,34 +72,16 @@ class H5Reader:
                     "If loading data that has been preprocessed into sequences "
                     "the sequence length provided must either be None or match "
                     "dimension 1 of the data on disk. Got sequence length "
-                    f"{self.msl}, but the shape of the data in {self._files[0]}"
+                    f"{self.msl}, but the shape of the data in {source}"
                     f" is {data_shape}"
                 )
             self._by_sample = True
 
-        sequence_counts = []
-        for f in self._files:
-            with h5py.File(f, "r") as f:
-                if self._by_sample:
-                    sequence_counts.append(len(f["data"]))
-                else:
-                    sequence_counts.append(
-                        (len(f["data"]) - self._num_extra_tokens) // self.msl
-                    )
-        self._num_sequences = sum(sequence_counts)
-        self._file_end_counts = np.cumsum(sequence_counts)
-        self._file_start_indices = np.insert(self._file_end_counts, 0, 0)[:-1]
-
-        if self._by_sample or len(self._files) > self._MAX_OPEN_FILES:
-            self.keep_files_open = False
-        else:
-            self.keep_files_open = True
-            self._files = [h5py.File(f, "r") for f in self._files]
-        if self._by_sample:
-            self.prev_file_descriptor = None
-            self.prev_file_name = None
-
-        # handle data subsetting
+    def _set_up_data_subset(self, data_subset):
+        """
+        Restrict the reader to the subset of its samples described by
+        `data_subset`. Must be called once `self._num_sequences` is known.
+        """
         self.offsets_full_dataset = []
         self.offsets_skipped_dataset = []
         if data_subset is not None:
@@ -184,6 +140,103 @@ class H5Reader:
     def by_sample(self):
         return self._by_sample
 
+    def _to_global_index(self, i):
+        """
+        Map an index (or array of indices) into the valid subset of the
+        dataset onto the corresponding index into the full dataset on disk.
+        """
+        if len(self.offsets_full_dataset):
+            chunk_idx = self.offsets_full_dataset.searchsorted(i, side="right")
+            i = i + self.offsets_skipped_dataset[chunk_idx]
+        return i
+
+    def __len__(self):
+        return self._num_sequences
+
+
+class H5Reader(BaseReader):
+    """
+    An abstraction for reading individual sequences from h5 files on disk.
+
+    Supports 2 formats of data on disk. The first is a rank-1 tensor of
+    concatenated tokenized documents. The second is a rank > 1 tensor of
+    preprocessed samples where the 0th index of the data on disk indexes the
+    data by sample.
+    """
+
+    _MAX_OPEN_FILES = 35
+
+    def __init__(
+        self,
+        data_dirs,
+        sequence_length=None,
+        read_extra_token=False,
+        data_subset=None,
+    ):
+        """
+        Creates a reader for an h5 corpus
+
+        Args:
+            data_dirs (list[str]): Directories containing h5 files to read from
+            sequence_length (int): The number of tokens per sample if reading
+                from a corpus. Must be `None` if the data has already been
+                preprocessed into samples.
+            read_extra_token (bool): Whether to read and return one extra token
+                after the end of the sequence. This can be useful for language
+                modeling tasks where you want to construct the labels as an
+                shifted version of the inputs. Setting this to `True` differs
+                from increasing `sequence_length` by one in that the extra token
+                returned due to this flag will be included in some other
+                sequence as the first token. Will be ignored if
+                `sequence_length` is `None`.
+            data_subset (str): A string specifying the subset of the corpus to
+                consider. E.g. if `data_subset="0.0-0.75"` is specified, only
+                samples in the first 3/4 of the dataset will be considered and
+                the last 1/4 of the dataset will be completely untouched. The
+                self reported length will be the length of the valid portion
+                of the dataset (e.g. the first 3/4), and any attempt to access
+                an element beyond this length will result in an exception.
+        """
+        self.msl = sequence_length
+        self._num_extra_tokens = 1 if read_extra_token else 0
+
+        manifest = []
+        if not isinstance(data_dirs, list):
+            data_dirs = [data_dirs]
+        for data_dir in data_dirs:
+            p = Path(data_dir)
+            if not p.is_dir():
+                raise ValueError(
+                    f"The path {p} does not exist or is not a directory"
+                )
+            manifest.extend(load_h5_manifest(p))
+        self._files = [entry["path"] for entry in manifest]
+
+        self._set_by_sample(manifest[0]["shape"], self._files[0])
+
+        sequence_counts = []
+        for entry in manifest:
+            if self._by_sample:
+                sequence_counts.append(entry["shape"][0])
+            else:
+                sequence_counts.append(
+                    (entry["shape"][0] - self._num_extra_tokens) // self.msl
+                )
+        self._num_sequences = sum(sequence_counts)
+        self._file_end_counts = np.cumsum(sequence_counts)
+        self._file_start_indices = np.insert(self._file_end_counts, 0, 0)[:-1]
+
+        if self._by_sample or len(self._files) > self._MAX_OPEN_FILES:
+            self.keep_files_open = False
+        else:
+            self.keep_files_open = True
+            self._files = [h5py.File(f, "r") for f in self._files]
+        if self._by_sample:
+            self.prev_file_descriptor = None
+            self.prev_file_name = None
+
+        self._set_up_data_subset(data_subset)
+
     def _maybe_open_file(self, f):
         if self._by_sample:
             # if we're loading data by sample, we expect the common access
@@ -216,9 +269,7 @@ class H5Reader:
             shape `(sequence_length, )` otherwise. The dtype of the returned
             array is `np.int32` regardless of how the data was written to disk.
         """
-        if len(self.offsets_full_dataset):
-            chunk_idx = self.offsets_full_dataset.searchsorted(i, side="right")
-            i += self.offsets_skipped_dataset[chunk_idx]
+        i = self._to_global_index(i)
         file_index = np.searchsorted(self._file_end_counts, i, side="right")
         f = self._files[file_index]
         with self._maybe_open_file(f) as f:
@@ -232,8 +283,65 @@ class H5Reader:
                 ]
         return x.astype(np.int32)
 
-    def __len__(self):
-        return self._num_sequences
+    def __getitems__(self, indices):
+        """
+        Reads a batch of items of the dataset from disk
+
+        Samples are grouped by the file they live in and neighboring samples
+        within a file are coalesced into a single contiguous read, so a batch
+        costs roughly one HDF5 read per run of nearby samples rather than one
+        read per sample.
+
+        Args:
+            indices (list[int]): The indices of the items to return.
+        Returns:
+            A list of samples in the same order as `indices`. Each sample is
+            identical to what `self[i]` would return.
+        """
+        indices = self._to_global_index(np.asarray(indices, dtype=np.int64))
+        file_indices = np.searchsorted(
+            self._file_end_counts, indices, side="right"
+        )
+        samples = [None] * len(indices)
+        if not len(indices):
+            return samples
+
+        # group requests by file and order them by position within each file
+        order = np.lexsort((indices, file_indices))
+        file_breaks = np.flatnonzero(np.diff(file_indices[order])) + 1
+        for group in np.split(order, file_breaks):
+            file_index = file_indices[group[0]]
+            file_start = self._file_start_indices[file_index]
+            sequence_indices = indices[group] - file_start
+            if self._by_sample:
+                starts = sequence_indices
+                length = 1
+                max_gap = 0
+            else:
+                starts = self.msl * sequence_indices
+                length = self.msl + self._num_extra_tokens
+                # reading a few unused tokens is much cheaper than paying for
+                # an additional round trip to the file system
+                max_gap = self.msl
+            ends = starts + length
+            run_breaks = np.flatnonzero(starts[1:] > ends[:-1] + max_gap) + 1
+            run_first = np.insert(run_breaks, 0, 0)
+            run_last = np.append(run_breaks, len(group))
+
+            f = self._files[file_index]
+            with self._maybe_open_file(f) as f:
+                data = f["data"]
+                for first, last in zip(run_first, run_last):
+                    run_start = starts[first]
+                    chunk = data[run_start : ends[last - 1]]
+                    for j in range(first, last):
+                        offset = starts[j] - run_start
+                        if self._by_sample:
+                            x = chunk[offset]
+                        else:
+                            x = chunk[offset : offset + length]
+                        samples[group[j]] = x.astype(np.int32)
+        return samples
 
     def __del__(self):
         # not necessary for most python runtimes, but good for completeness
@@ -244,6 +352,140 @@ class H5Reader:
                 f.close()
 
 
+class MemmapReader(BaseReader):
+    """
+    A drop-in replacement for `H5Reader` that reads from the flat binary
+    format written by `convert_h5_to_memmap.py`.
+
+    Each data directory contains a single file of raw tokens
+    (`MEMMAP_DATA_FILE`), an index of the offsets at which each of the original
+    h5 files starts within it (`MEMMAP_INDEX_FILE`), and a small metadata file
+    recording the dtype and per-sample shape (`MEMMAP_METADATA_FILE`). The
+    token file is accessed through `np.memmap`, so reading a sample is a copy
+    out of the page cache rather than a file system call, and there is no limit
+    on the number of source files that can be read from at once.
+
+    Samples are indexed exactly as they would be by an `H5Reader` pointed at
+    the h5 files the data was converted from, so the two readers may be used
+    interchangeably without changing the order of the data.
+    """
+
+    def __init__(
+        self,
+        data_dirs,
+        sequence_length=None,
+        read_extra_token=False,
+        data_subset=None,
+    ):
+        """
+        Creates a reader for a memory-mapped corpus
+
+        Args:
+            data_dirs (list[str]): Directories containing converted data to
+                read from
+            sequence_length (int): See `H5Reader`.
+            read_extra_token (bool): See `H5Reader`.
+            data_subset (str): See `H5Reader`.
+        """
+        self.msl = sequence_length
+        self._num_extra_tokens = 1 if read_extra_token else 0
+
+        if not isinstance(data_dirs, list):
+            data_dirs = [data_dirs]
+        self._data = []
+        file_dirs = []
+        file_row_starts = []
+        file_row_counts = []
+        data_shape = None
+        for dir_index, data_dir in enumerate(data_dirs):
+            p = Path(data_dir)
+            if not p.is_dir():
+                raise ValueError(
+                    f"The path {p} does not exist or is not a directory"
+                )
+            with open(p / MEMMAP_METADATA_FILE, "r") as f:
+                metadata = json.load(f)
+            offsets = np.load(p / MEMMAP_INDEX_FILE)
+            sample_shape = tuple(metadata["sample_shape"])
+            if data_shape is None:
+                data_shape = (int(offsets[-1]),) + sample_shape
+                self._set_by_sample(data_shape, p)
+            elif sample_shape != data_shape[1:]:
+                raise ValueError(
+                    f"All data directories must contain samples of the same "
+                    f"shape, but {p} has samples of shape {sample_shape} "
+                    f"while previous directories have samples of shape "
+                    f"{data_shape[1:]}"
+                )
+            self._data.append(
+                np.memmap(
+                    p / MEMMAP_DATA_FILE,
+                    dtype=np.dtype(metadata["dtype"]),
+                    mode="r",
+                    shape=(int(offsets[-1]),) + sample_shape,
+                )
+            )
+            file_dirs.append(np.full(len(offsets) - 1, dir_index))
+            file_row_starts.append(offsets[:-1])
+            file_row_counts.append(np.diff(offsets))
+
+        self._file_dirs = np.concatenate(file_dirs)
+        self._file_row_starts = np.concatenate(file_row_starts)
+        sequence_counts = np.concatenate(file_row_counts)
+        if not self._by_sample:
+            sequence_counts = (
+                sequence_counts - self._num_extra_tokens
+            ) // self.msl
+        self._num_sequences = int(sequence_counts.sum())
+        self._file_end_counts = np.cumsum(sequence_counts)
+        self._file_start_indices = np.insert(self._file_end_counts, 0, 0)[:-1]
+
+        self._set_up_data_subset(data_subset)
+
+    def _locate(self, i):
+        """
+        Map an index (or array of indices) onto the directory containing it
+        and the first row of that directory's memory map to read from.
+        """
+        i = self._to_global_index(i)
+        file_index = np.searchsorted(self._file_end_counts, i, side="right")
+        sequence_index = i - self._file_start_indices[file_index]
+        if not self._by_sample:
+            sequence_index = self.msl * sequence_index
+        row = self._file_row_starts[file_index] + sequence_index
+        return self._file_dirs[file_index], row
+
+    def __getitem__(self, i):
+        """
+        Reads a single item of the dataset. See `H5Reader.__getitem__`.
+        """
+        dir_index, row = self._locate(i)
+        data = self._data[dir_index]
+        if self._by_sample:
+            x = data[row]
+        else:
+            x = data[row : row + self.msl + self._num_extra_tokens]
+        return x.astype(np.int32)
+
+    def __getitems__(self, indices):
+        """
+        Reads a batch of items of the dataset with one vectorized gather per
+        data directory. See `H5Reader.__getitems__`.
+        """
+        dir_indices, rows = self._locate(np.asarray(indices, dtype=np.int64))
+        samples = [None] * len(rows)
+        for dir_index in np.unique(dir_indices):
+            positions = np.flatnonzero(dir_indices == dir_index)
+            selected_rows = rows[positions]
+            if not self._by_sample:
+                length = self.msl + self._num_extra_tokens
+                selected_rows = selected_rows[:, None] + np.arange(length)
+            batch = self._data[dir_index][selected_rows].astype(np.int32)
+            for pos, x in zip(positions, batch):
+                samples[pos] = x
+        return samples
+
+
 class Mixture:
     """
     Mix several map-style datasets according to provided weights.
@@ -266,6 +508,11 @@ class Mixture:
             is `False`.
     """
 
+    # interleaving is computed lazily in blocks of this many samples so that
+    # memory use doesn't grow with the size of the mixture
+    _BLOCK_SIZE = 1024
+    _BLOCK_CACHE_SIZE = 64
+
     def __init__(self, datasets, weights, interleave=False, seed=0):
         self.interleave = interleave
 
@@ -306,52 +553,147 @@ class Mixture:
         total_samples = max(
             len(d) / w for (d, w) in zip(datasets, weights) if w > 0.05
         )
+        dataset_sizes = [int(total_samples * w) for w in weights]
+        self._dataset_lengths = np.array([len(d) for d in self.datasets])
         if self.interleave:
-            self.dataset_indices = [
-                np.full(int(total_samples * w), i, dtype=np.uint16)
-                for i, w in enumerate(weights)
-            ]
-            self.dataset_samples = [
-                np.arange(int(total_samples * w)) % len(d)
-                for d, w in zip(self.datasets, weights)
-            ]
-            self.dataset_indices = np.concatenate(self.dataset_indices)
-            self.dataset_samples = np.concatenate(self.dataset_samples)
-            self.total_samples = len(self.dataset_indices)
-            indices = np.arange(self.total_samples)
-            rng = np.random.default_rng(seed)
-            rng.shuffle(indices)
-            # we want samples within a dataset to appear in order to take
-            # advantage of sequential read patterns, so we sort the
-            # sub-components after the shuffle
-            boundaries = [int(total_samples * w) for w in weights]
-            boundaries = np.insert(np.cumsum(boundaries), 0, 0)
-            for start, end in zip(boundaries[:-1], boundaries[1:]):
-                indices[
-                    np.where((start <= indices) & (indices < end))
-                ] = np.arange(start, end)
-            self.dataset_indices = self.dataset_indices[indices]
-            self.dataset_samples = self.dataset_samples[indices]
+            self._dataset_sizes = np.array(dataset_sizes, dtype=np.int64)
+            self.total_samples = sum(dataset_sizes)
+            if seed is None:
+                seed = np.random.SeedSequence().entropy
+            self._seed = seed
+            self._block_cache = collections.OrderedDict()
         else:
-            self.boundaries = [int(total_samples * w) for w in weights]
-            self.boundaries = np.cumsum(self.boundaries)
+            self.boundaries = np.cumsum(dataset_sizes)
             self.total_samples = self.boundaries[-1]
             self.boundaries = self.boundaries[:-1]
+            self._dataset_offsets = np.insert(self.boundaries, 0, 0)
 
     @property
     def by_sample(self):
         return self._by_sample
 
-    def __getitem__(self, i):
+    def _samples_before(self, positions):
+        """
+        The number of samples of each dataset among the first `position`
+        samples of an interleaved mixture, for each of `positions`.
+
+        Returns:
+            An array of shape `positions.shape + (num_datasets,)`.
+        """
+        positions = np.minimum(
+            np.asarray(positions, dtype=np.int64), self.total_samples
+        )[..., None]
+        sizes = self._dataset_sizes
+        total = self.total_samples
+        # `positions * sizes // total` can overflow for mixtures of billions of
+        # samples. Estimate it in floating point, which is off by at most one,
+        # and correct the estimate using the exact remainder. The remainder is
+        # small, so computing it with wrapping int64 arithmetic is exact.
+        counts = np.floor(positions * (sizes / total)).astype(np.int64)
+        with np.errstate(over="ignore"):
+            remainders = positions * sizes - counts * total
+        counts -= (remainders < 0).astype(np.int64)
+        counts += (remainders >= total).astype(np.int64)
+        return counts
+
+    def _block_starts(self, blocks):
+        return self._samples_before(blocks * self._BLOCK_SIZE).sum(axis=-1)
+
+    def _get_block(self, block):
+        """
+        Compute the dataset and sample indices of every sample in a block of
+        an interleaved mixture.
+
+        Each block receives a share of the samples of each dataset that is
+        proportional to the dataset's weight, and the order of the datasets
+        within the block is shuffled with a seed unique to the block. Samples
+        of the same dataset stay in order, both within and across blocks.
+        """
+        if block in self._block_cache:
+            self._block_cache.move_to_end(block)
+            return self._block_cache[block]
+
+        start_counts, end_counts = self._samples_before(
+            [block * self._BLOCK_SIZE, (block + 1) * self._BLOCK_SIZE]
+        )
+        counts = end_counts - start_counts
+        dataset_indices = np.repeat(np.arange(len(counts)), counts)
+        rng = np.random.default_rng([self._seed, block])
+        rng.shuffle(dataset_indices)
+        # rank of each sample among the samples of the same dataset
+        order = np.argsort(dataset_indices, kind="stable")
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(len(order)) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        sample_indices = start_counts[dataset_indices] + ranks
+        result = (int(start_counts.sum()), dataset_indices, sample_indices)
+
+        self._block_cache[block] = result
+        if len(self._block_cache) > self._BLOCK_CACHE_SIZE:
+            self._block_cache.popitem(last=False)
+        return result
+
+    def _locate_interleaved(self, indices):
+        blocks = indices // self._BLOCK_SIZE
+        # blocks never start after `block * _BLOCK_SIZE` but may start up to
+        # one sample per dataset earlier, so an index may belong to the next
+        # block
+        while True:
+            in_next_block = indices >= self._block_starts(blocks + 1)
+            if not in_next_block.any():
+                break
+            blocks += in_next_block.astype(np.int64)
+
+        dataset_indices = np.empty_like(indices)
+        sample_indices = np.empty_like(indices)
+        for block in np.unique(blocks):
+            positions = np.flatnonzero(blocks == block)
+            start, block_datasets, block_samples = self._get_block(int(block))
+            offsets = indices[positions] - start
+            dataset_indices[positions] = block_datasets[offsets]
+            sample_indices[positions] = block_samples[offsets]
+        return dataset_indices, sample_indices
+
+    def _locate(self, i):
+        """
+        Map an index (or array of indices) of the mixture onto the index of
+        the sub-dataset it comes from and the index of the sample within that
+        sub-dataset.
+        """
         if self.interleave:
-            dataset = self.datasets[self.dataset_indices[i]]
-            return dataset[self.dataset_samples[i]]
+            dataset_index, sample_index = self._locate_interleaved(
+                np.asarray(i, dtype=np.int64).reshape(-1)
+            )
+            if np.ndim(i) == 0:
+                dataset_index, sample_index = dataset_index[0], sample_index[0]
         else:
             dataset_index = np.searchsorted(self.boundaries, i, side="right")
-            dataset = self.datasets[dataset_index]
-            offset = self.boundaries[dataset_index - 1] if dataset_index else 0
-            sample_index = (i - offset) % len(dataset)
-            return dataset[sample_index]
+            sample_index = i - self._dataset_offsets[dataset_index]
+        length = self._dataset_lengths[dataset_index]
+        return dataset_index, sample_index % length
+
+    def __getitem__(self, i):
+        dataset_index, sample_index = self._locate(i)
+        return self.datasets[dataset_index][sample_index]
+
+    def __getitems__(self, indices):
+        """
+        Reads a batch of samples, dispatching a single batched read to each
+        sub-dataset that supports one.
+        """
+        dataset_indices, sample_indices = self._locate(
+            np.asarray(indices, dtype=np.int64)
+        )
+        samples = [None] * len(indices)
+        for dataset_index in np.unique(dataset_indices):
+            positions = np.flatnonzero(dataset_indices == dataset_index)
+            batch = read_batch(
+                self.datasets[dataset_index], sample_indices[positions]
+            )
+            for pos, x in zip(positions, batch):
+                samples[pos] = x
+        return samples
 
     def __len__(self):
         return self.total_samples
@@ -14,8 +14,11 @@
 
 import argparse
 import os
+import time
 from glob import glob
+from multiprocessing import Pool, shared_memory
 
+import numpy as np
 from lm_dataformat import Reader
 from tqdm import tqdm
 
@@ -30,58 +33,158 @@ from modelzoo.transformers.data_processing.slimpajama.utils.utils import (
     write_lmd_dataset,
 )
 
+# set in each worker process by `_init_worker`
+_holdout_hashes = None
 
-def deduplicate_train_holdout_sets(
-    train_path, holdout_path, deduped_train_path, chunk_id
-):
+
+class HashSet:
+    """
+    A compact set of sha256 hashes, stored as a `uint64[4, n]` array of the
+    words of the sorted digests. Lookups binary search the first word of each
+    digest and confirm matches against the remaining words, so the set is
+    exact while taking 32 bytes per hash instead of a Python string. The array
+    can be placed in shared memory to share the set between processes without
+    copying it.
+    """
+
+    def __init__(self, words):
+        self.words = words
+        self.keys = words[0]
+
+    @classmethod
+    def from_hex(cls, hex_hashes):
+        digests = b"".join(bytes.fromhex(h) for h in hex_hashes)
+        words = (
+            np.frombuffer(digests, dtype=">u8").reshape(-1, 4).astype(np.uint64)
+        )
+        words = np.unique(words, axis=0)
+        return cls(np.ascontiguousarray(words.T))
+
+    def __len__(self):
+        return self.words.shape[1]
+
+    def __contains__(self, hex_hash):
+        words = [int(hex_hash[i : i + 16], 16) for i in range(0, 64, 16)]
+        i = np.searchsorted(self.keys, np.uint64(words[0]), side="left")
+        while i < len(self) and self.keys[i] == words[0]:
+            if all(self.words[j, i] == words[j] for j in range(1, 4)):
+                return True
+            i += 1
+        return False
+
+    def to_shared_memory(self):
+        """
+        Copy the set into a new shared memory block. The caller owns the
+        returned block and must unlink it once done.
+        """
+        # shared memory blocks can't be empty
+        size = max(self.words.nbytes, 1)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        words = np.ndarray(self.words.shape, dtype=np.uint64, buffer=shm.buf)
+        words[:] = self.words
+        return shm
+
+    @classmethod
+    def from_shared_memory(cls, shm, size):
+        return cls(np.ndarray((4, size), dtype=np.uint64, buffer=shm.buf))
+
+
+def collect_holdout_hashes(holdout_path):
     # Calculate hashes on holdout set.
-    seen = set()
     if os.path.exists("hashes.txt"):
         with open("hashes.txt") as fh:
-            for line in tqdm(fh):
-                seen.add(line.strip())
-    else:
-        hashf = open("hashes.txt", "w")
+            return HashSet.from_hex(line.strip() for line in tqdm(fh))
+
+    hashes = []
+    with open("hashes.txt", "w") as hashf:
         for f in tqdm(glob(f"{holdout_path}/*/*.zst")):
             reader = Reader(f)
-            for doc_id, text in enumerate(
-                reader._stream_data(jsonl_key="text")
-            ):
+            for text in reader._stream_data(jsonl_key="text"):
                 hash = sha256str(text)
                 hashf.write(hash + "\n")
-                seen.add(hash)
-        hashf.close()
+                hashes.append(hash)
+    return HashSet.from_hex(hashes)
+
+
+def _init_worker(shm_name, size):
+    global _holdout_hashes
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # keep a reference to the block so that it stays mapped
+    _holdout_hashes = (HashSet.from_shared_memory(shm, size), shm)
 
+
+def _dedup_file(f, out_dir, seen=None):
+    """
+    Write the documents of train file `f` whose hashes aren't in `seen` to
+    `out_dir`. Returns the number of documents read and written.
+    """
+    if seen is None:
+        seen = _holdout_hashes[0]
+    total_read = 0
+
+    def filtered_docs():
+        nonlocal total_read
+        reader = Reader(f)
+        for text, meta in reader._stream_data(get_meta=True):
+            total_read += 1
+            if sha256str(text) not in seen:
+                yield text, meta
+
+    with open(os.path.join(out_dir, os.path.basename(f)), "wb") as fout:
+        total_written = write_lmd_dataset(
+            fout, filtered_docs(), indices=None, return_total_written=True,
+        )
+    return total_read, total_written
+
+
+def _dedup_file_star(args):
+    return _dedup_file(*args)
+
+
+def deduplicate_train_holdout_sets(
+    train_path, holdout_path, deduped_train_path, chunk_id, processes=1
+):
+    seen = collect_holdout_hashes(holdout_path)
     print("Finished collecting hashes for eval", len(seen))
 
-    rm_if_exists(f"{deduped_train_path}/chunk{chunk_id}")
-    os.makedirs(f"{deduped_train_path}/chunk{chunk_id}")
+    out_dir = f"{deduped_train_path}/chunk{chunk_id}"
+    rm_if_exists(out_dir)
+    os.makedirs(out_dir)
 
-    total_written = 0
     # Remove elements from train set with hashes seen in eval set.
-    for f in tqdm(glob(f"{train_path}/chunk{chunk_id}/*.zst")):
-
-        def filtered_docs():
-            reader = Reader(f)
-            for doc_id, doc in enumerate(reader._stream_data(get_meta=True)):
-                text, meta = doc
-                hash = sha256str(text)
-                if hash not in seen:
-                    yield text, meta
-                else:
-                    print("Found an intersection!!!")
-
-        with open(
-            f"{deduped_train_path}/chunk{chunk_id}/" + f.split("/")[-1], "wb"
-        ) as fout_dedup_train:
-            total_written += write_lmd_dataset(
-                fout_dedup_train,
-                filtered_docs(),
-                indices=None,
-                return_total_written=True,
-            )
+    start = time.time()
+    files = glob(f"{train_path}/chunk{chunk_id}/*.zst")
+    if processes > 1:
+        shm = seen.to_shared_memory()
+        try:
+            with Pool(
+                processes,
+                initializer=_init_worker,
+                initargs=(shm.name, len(seen)),
+            ) as pool:
+                counts = list(
+                    tqdm(
+                        pool.imap_unordered(
+                            _dedup_file_star, [(f, out_dir) for f in files]
+                        ),
+                        total=len(files),
+                    )
+                )
+        finally:
+            shm.close()
+            shm.unlink()
+    else:
+        counts = [_dedup_file(f, out_dir, seen) for f in tqdm(files)]
 
+    total_read = sum(c[0] for c in counts)
+    total_written = sum(c[1] for c in counts)
+    elapsed = time.time() - start
+    print(f"Found {total_read - total_written} intersections")
     print(f"Total written: {total_written}")
+    print(
+        f"Processed {total_read} documents in {elapsed:.1f}s "
+        f"({total_read / max(elapsed, 1e-9):.1f} docs/s)"
+    )
 
 
 if __name__ == "__main__":
@@ -90,7 +193,16 @@ if __name__ == "__main__":
     parser.add_argument("--src_dir", type=str)
     parser.add_argument("--tgt_dir", type=str)
     parser.add_argument("--out_dir", type=str)
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help=(
+            "Number of processes used to filter the train files of the chunk "
+            "concurrently. The holdout hashes are shared through shared memory."
+        ),
+    )
     args = parser.parse_args()
     deduplicate_train_holdout_sets(
-        args.src_dir, args.tgt_dir, args.out_dir, args.chunk_id,
+        args.src_dir, args.tgt_dir, args.out_dir, args.chunk_id, args.processes,
     )
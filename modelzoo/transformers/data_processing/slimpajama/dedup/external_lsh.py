@@ -0,0 +1,340 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+MinHashLSH duplicate pair generation with bounded memory.
+
+Instead of keeping a dictionary of band hashes per band in memory, this engine
+works in two resumable phases:
+
+1. Every minhash file is loaded by a pool of workers, each document gets an
+   integer id, and each of its bands is reduced to a 64-bit hash. Workers
+   write `(band hash, doc id)` pairs to disk as sorted runs, one per band,
+   flushing whenever the memory budget of the worker is exhausted. Each run
+   is stored as two contiguous arrays, the sorted band hashes and the doc
+   ids in the same order.
+2. The runs of each band are merged by splitting the hash space into ranges
+   small enough to fit in memory. Since runs are sorted, the slice of each run
+   falling into a range is found by binary search on a memory map of its
+   hashes, and only that slice of the hashes and doc ids is read. Documents
+   whose band hashes collide are written out as pairs of integer doc ids.
+
+All intermediate files are written atomically, so an interrupted job can be
+restarted with the same arguments and only redoes unfinished work.
+
+Outputs in `work_dir`:
+    - `docs/<file index>.npz`: for each input file, the file names and doc ids
+      of its documents in order.
+    - `doc_counts.npy`: the number of documents in each input file. The
+      integer id of document `j` of input file `i` is
+      `sum(doc_counts[:i]) + j`.
+    - `pairs/<band>-<range>.npy`: `uint64[n, 2]` arrays of duplicate pairs.
+      The first element of each pair is the first document in id order that
+      has the same band hash as the second one.
+"""
+
+import glob
+import os
+import pickle
+import shutil
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+# files written by `to_hash.py --format numpy`
+SIGNATURES_SUFFIX = ".signatures.npy"
+DOC_TABLE_SUFFIX = ".docs.npz"
+
+# arrays of a sorted run in `runs/<band>/`
+RUN_HASHES_SUFFIX = ".hashes.npy"
+RUN_IDS_SUFFIX = ".ids.npy"
+
+# document ids are `(input file index << _FILE_SHIFT) | position in file` until
+# the number of documents in each input file is known
+_FILE_SHIFT = np.uint64(32)
+_LOCAL_MASK = np.uint64((1 << 32) - 1)
+# bytes used per (band hash, doc id) entry, including sorting scratch space
+_BYTES_PER_ENTRY = 4 * 16
+
+
+def load_signatures(path):
+    """
+    Load a file of minhash signatures written by `to_hash.py`, either as
+    pickled `MinHash` objects or as a signature array with a doc table. The
+    signature array is memory-mapped rather than read into memory.
+
+    Returns:
+        A tuple `(file_names, name_index, doc_ids, hashvalues)` where
+        `file_names` is a list of the distinct file names of the documents,
+        `name_index` is a `uint32` array giving the index into `file_names`
+        of each document, `doc_ids` is a `uint64` array of the id of each
+        document within its file, and `hashvalues` is a `uint64` array with
+        one row of minhash values per document.
+    """
+    if path.endswith(SIGNATURES_SUFFIX):
+        doc_table_path = path[: -len(SIGNATURES_SUFFIX)] + DOC_TABLE_SUFFIX
+        with np.load(doc_table_path) as docs:
+            file_names = docs["file_names"].tolist()
+            name_index = docs["name_index"]
+            doc_ids = docs["doc_ids"]
+        return file_names, name_index, doc_ids, np.load(path, mmap_mode="r")
+
+    with open(path, "rb") as fin:
+        items = pickle.load(fin)
+    file_names = []
+    name_to_index = {}
+    name_index = np.empty(len(items), dtype=np.uint32)
+    doc_ids = np.empty(len(items), dtype=np.uint64)
+    for i, item in enumerate(items):
+        name = item["file_name"]
+        if name not in name_to_index:
+            name_to_index[name] = len(file_names)
+            file_names.append(name)
+        name_index[i] = name_to_index[name]
+        doc_ids[i] = item["doc_id"]
+    if items:
+        hashvalues = np.stack([item["hash"].hashvalues for item in items])
+    else:
+        hashvalues = np.empty((0, 0), dtype=np.uint64)
+    return file_names, name_index, doc_ids, hashvalues.astype(np.uint64)
+
+
+def band_hashes(hashvalues, bands, r):
+    """
+    Reduce each band of `r` minhash values of each document to a single
+    64-bit hash. Returns a `uint64[num_docs, bands]` array.
+    """
+    hashvalues = hashvalues[:, : bands * r].reshape(len(hashvalues), bands, r)
+    h = np.full(hashvalues.shape[:2], 0xCBF29CE484222325, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for j in range(r):
+            h = (h ^ hashvalues[:, :, j]) * np.uint64(0x100000001B3)
+        # splitmix64 finalizer to spread the bits of the result
+        h ^= h >> np.uint64(30)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(27)
+        h *= np.uint64(0x94D049BB133111EB)
+        h ^= h >> np.uint64(31)
+    return h
+
+
+def _save_atomic(path, array):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fout:
+        np.save(fout, array)
+    os.replace(tmp_path, path)
+
+
+def _run_dir(work_dir, band):
+    return os.path.join(work_dir, "runs", f"{band:03d}")
+
+
+def _write_runs(work_dir, bands, band_entries, doc_tables, run_name):
+    """
+    Sort and write the buffered entries of each band as one run per band, then
+    write the doc tables of the files they came from. The doc table of a file
+    doubles as the marker that the file is done, so it is only written once
+    all runs containing the file are on disk.
+    """
+    for band in range(bands):
+        hashes = np.concatenate([entries[band][0] for entries in band_entries])
+        ids = np.concatenate([entries[band][1] for entries in band_entries])
+        order = np.lexsort((ids, hashes))
+        run_path = os.path.join(_run_dir(work_dir, band), run_name)
+        # runs are found by their hashes file, so it is written last and a
+        # stale one from an interrupted job never pairs up with new ids
+        if os.path.exists(run_path + RUN_HASHES_SUFFIX):
+            os.remove(run_path + RUN_HASHES_SUFFIX)
+        _save_atomic(run_path + RUN_IDS_SUFFIX, ids[order])
+        _save_atomic(run_path + RUN_HASHES_SUFFIX, hashes[order])
+    for path, file_names, name_index, doc_ids in doc_tables:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fout:
+            np.savez(
+                fout,
+                file_names=np.array(file_names),
+                name_index=name_index,
+                doc_ids=doc_ids,
+            )
+        os.replace(tmp_path, path)
+
+
+def _build_runs(task):
+    """
+    Phase 1: compute band hashes for a group of input files and write them as
+    sorted runs.
+    """
+    work_dir, files, bands, r, max_entries = task
+    band_entries, doc_tables = [], []
+    buffered = 0
+    for file_index, path in files:
+        doc_table_path = os.path.join(
+            work_dir, "docs", f"{file_index:08d}.npz"
+        )
+        if os.path.exists(doc_table_path):
+            # already processed by a previous, interrupted job
+            continue
+        file_names, name_index, doc_ids, hashvalues = load_signatures(path)
+        ids = np.arange(len(doc_ids), dtype=np.uint64) | (
+            np.uint64(file_index) << _FILE_SHIFT
+        )
+        hashes = band_hashes(hashvalues, bands, r)
+        band_entries.append([(hashes[:, band], ids) for band in range(bands)])
+        doc_tables.append((doc_table_path, file_names, name_index, doc_ids))
+        buffered += len(ids) * bands
+        if buffered >= max_entries:
+            _write_runs(
+                work_dir, bands, band_entries, doc_tables, f"{file_index:08d}"
+            )
+            band_entries, doc_tables = [], []
+            buffered = 0
+    if band_entries:
+        _write_runs(
+            work_dir, bands, band_entries, doc_tables, f"{file_index:08d}"
+        )
+
+
+def _merge_range(task):
+    """
+    Phase 2: find all band hash collisions within one range of the hash
+    space of one band.
+    """
+    work_dir, band, range_index, low, high, doc_offsets = task
+    out_path = os.path.join(
+        work_dir, "pairs", f"{band:03d}-{range_index:06d}.npy"
+    )
+    if os.path.exists(out_path):
+        return 0
+
+    hash_pieces, id_pieces = [], []
+    hashes_paths = glob.glob(
+        os.path.join(_run_dir(work_dir, band), "*" + RUN_HASHES_SUFFIX)
+    )
+    for hashes_path in sorted(hashes_paths):
+        # binary search on the contiguous memory map only touches the pages
+        # it visits, and only the slice in range is read
+        run_hashes = np.load(hashes_path, mmap_mode="r")
+        start = np.searchsorted(run_hashes, np.uint64(low), side="left")
+        if high is None:
+            end = len(run_hashes)
+        else:
+            end = np.searchsorted(run_hashes, np.uint64(high), side="left")
+        if end > start:
+            run_ids = np.load(
+                hashes_path[: -len(RUN_HASHES_SUFFIX)] + RUN_IDS_SUFFIX,
+                mmap_mode="r",
+            )
+            hash_pieces.append(np.array(run_hashes[start:end]))
+            id_pieces.append(np.array(run_ids[start:end]))
+    if not hash_pieces:
+        _save_atomic(out_path, np.empty((0, 2), dtype=np.uint64))
+        return 0
+
+    hashes = np.concatenate(hash_pieces)
+    ids = np.concatenate(id_pieces)
+    order = np.lexsort((ids, hashes))
+    hashes, ids = hashes[order], ids[order]
+    # a file reprocessed after an interruption may appear in two runs
+    is_unique = np.ones(len(hashes), dtype=bool)
+    is_unique[1:] = (hashes[1:] != hashes[:-1]) | (ids[1:] != ids[:-1])
+    hashes, ids = hashes[is_unique], ids[is_unique]
+    # dense ids in input file order
+    ids = doc_offsets[(ids >> _FILE_SHIFT).astype(np.int64)] + (
+        ids & _LOCAL_MASK
+    )
+    is_first = np.ones(len(hashes), dtype=bool)
+    is_first[1:] = hashes[1:] != hashes[:-1]
+    first_of_group = np.maximum.accumulate(
+        np.where(is_first, np.arange(len(hashes)), 0)
+    )
+    duplicates = ~is_first
+    pairs = np.stack(
+        [ids[first_of_group[duplicates]], ids[duplicates]], axis=1
+    ).astype(np.uint64)
+    _save_atomic(out_path, pairs)
+    return len(pairs)
+
+
+def generate_pairs_external(
+    files, work_dir, bands, r, processes, memory_limit_mb
+):
+    """
+    Find all pairs of documents that share at least one band hash.
+
+    Args:
+        files (list[str]): Minhash files to read, in a fixed order.
+        work_dir (str): Directory for intermediate files and outputs.
+        bands (int): Number of LSH bands.
+        r (int): Number of minhash values per band.
+        processes (int): Number of worker processes.
+        memory_limit_mb (int): Approximate bound on the total memory used by
+            all worker processes, in MiB.
+    """
+    start_time = time.time()
+    os.makedirs(os.path.join(work_dir, "docs"), exist_ok=True)
+    os.makedirs(os.path.join(work_dir, "pairs"), exist_ok=True)
+    for band in range(bands):
+        os.makedirs(_run_dir(work_dir, band), exist_ok=True)
+    max_entries = max(
+        1, memory_limit_mb * 1024 * 1024 // (_BYTES_PER_ENTRY * processes)
+    )
+
+    done_marker = os.path.join(work_dir, "runs", "DONE")
+    if not os.path.exists(done_marker):
+        indexed_files = list(enumerate(files))
+        groups = [indexed_files[i::processes] for i in range(processes)]
+        with Pool(processes) as pool:
+            pool.map(
+                _build_runs,
+                [(work_dir, g, bands, r, max_entries) for g in groups if g],
+            )
+        open(done_marker, "w").close()
+        print("Finished writing sorted runs.", time.time() - start_time)
+
+    doc_counts = []
+    for file_index in range(len(files)):
+        with np.load(
+            os.path.join(work_dir, "docs", f"{file_index:08d}.npz")
+        ) as docs:
+            doc_counts.append(len(docs["doc_ids"]))
+    doc_counts = np.array(doc_counts, dtype=np.uint64)
+    _save_atomic(os.path.join(work_dir, "doc_counts.npy"), doc_counts)
+    doc_offsets = np.concatenate([[0], np.cumsum(doc_counts)[:-1]]).astype(
+        np.uint64
+    )
+
+    # split the hash space of each band into ranges that fit in memory
+    num_entries = int(doc_counts.sum())
+    num_ranges = max(1, -(-num_entries // max_entries))
+    bounds = [(1 << 64) * i // num_ranges for i in range(num_ranges)]
+    tasks = [
+        (
+            work_dir,
+            band,
+            i,
+            bounds[i],
+            bounds[i + 1] if i + 1 < num_ranges else None,
+            doc_offsets,
+        )
+        for band in range(bands)
+        for i in range(num_ranges)
+    ]
+    with Pool(processes) as pool:
+        num_pairs = sum(pool.imap_unordered(_merge_range, tasks))
+    print(
+        f"Found {num_pairs} duplicate pairs among {num_entries} documents.",
+        time.time() - start_time,
+    )
+    shutil.rmtree(os.path.join(work_dir, "runs"))
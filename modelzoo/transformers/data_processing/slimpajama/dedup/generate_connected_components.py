@@ -13,11 +13,14 @@
 # limitations under the License.
 
 import argparse
+import os
 import pickle
 import time
+from collections import defaultdict
 from glob import glob
 
 import networkit as nk
+import numpy as np
 import tqdm
 
 
@@ -73,9 +76,123 @@ def generate_connected_components_mp(args):
     print("Graph generated duplicates list!!!", time.time() - start)
 
 
+def _find_roots(parent, x):
+    roots = parent[x]
+    while True:
+        next_roots = parent[roots]
+        if np.array_equal(next_roots, roots):
+            return roots
+        roots = next_roots
+
+
+def _union(parent, u, v):
+    """
+    Merge the sets containing `u[i]` and `v[i]` for every `i`, hooking the
+    root with the larger id under the root with the smaller one. All pairs are
+    processed at once. When several pairs try to hook the same root only one
+    of them succeeds, so the remaining pairs are retried until every pair is
+    in a single set. Since a parent never has a larger id than its child, this
+    can't create cycles.
+    """
+    while len(u):
+        u_roots, v_roots = _find_roots(parent, u), _find_roots(parent, v)
+        # path compression
+        parent[u], parent[v] = u_roots, v_roots
+        unmerged = u_roots != v_roots
+        u, v = u[unmerged], v[unmerged]
+        u_roots, v_roots = u_roots[unmerged], v_roots[unmerged]
+        parent[np.maximum(u_roots, v_roots)] = np.minimum(u_roots, v_roots)
+
+
+def _compress(parent):
+    while True:
+        grandparent = parent[parent]
+        if np.array_equal(grandparent, parent):
+            return parent
+        parent = grandparent
+
+
+def union_find_components(num_docs, pair_files):
+    """
+    Find the connected components of the graph of duplicate pairs with an
+    array-based union-find over integer doc ids. Pair files are streamed one
+    at a time, so memory is dominated by the parent array.
+
+    Returns:
+        An array mapping each doc id to the smallest doc id in its component.
+    """
+    dtype = np.uint32 if num_docs < 2 ** 32 else np.uint64
+    parent = np.arange(num_docs, dtype=dtype)
+    for fp in tqdm.tqdm(pair_files):
+        pairs = np.load(fp).astype(dtype)
+        _union(parent, pairs[:, 0], pairs[:, 1])
+    return _compress(parent)
+
+
+def generate_duplicates_union_find(args):
+    """
+    Build the lookup table of duplicates directly from the outputs of
+    `generate_duplicate_pairs.py --engine external`. The first document of
+    each component in doc id order is kept and all others are marked as
+    duplicates. The output has the same format as that of
+    `generate_duplicates_dict.py`.
+    """
+    start = time.time()
+    doc_counts = np.load(os.path.join(args.input_dir, "doc_counts.npy"))
+    num_docs = int(doc_counts.sum())
+    pair_files = sorted(glob(os.path.join(args.input_dir, "pairs", "*.npy")))
+    parent = union_find_components(num_docs, pair_files)
+    is_duplicate = parent != np.arange(num_docs, dtype=parent.dtype)
+    del parent
+    print(
+        "number of duplicate documents that will be removed:",
+        int(is_duplicate.sum()),
+        time.time() - start,
+    )
+
+    duplicates = defaultdict(set)
+    offset = 0
+    for file_index, count in enumerate(doc_counts.tolist()):
+        local = np.flatnonzero(is_duplicate[offset : offset + count])
+        offset += count
+        if not len(local):
+            continue
+        with np.load(
+            os.path.join(args.input_dir, "docs", f"{file_index:08d}.npz")
+        ) as docs:
+            file_names = docs["file_names"]
+            name_index = docs["name_index"][local]
+            doc_ids = docs["doc_ids"][local]
+        for name, doc_id in zip(file_names[name_index], doc_ids.tolist()):
+            duplicates[str(name)].add(doc_id)
+
+    with open(args.out_file, "wb") as fout:
+        pickle.dump(duplicates, fout)
+    print("Union-find generated duplicates list!!!", time.time() - start)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--input_dir")
+    parser.add_argument(
+        "--input_dir",
+        help=(
+            "Directory of duplicate pairs. With `--engine union_find`, the "
+            "`--work_dir` of `generate_duplicate_pairs.py --engine external`."
+        ),
+    )
     parser.add_argument("--out_file")
+    parser.add_argument(
+        "--engine",
+        choices=["networkit", "union_find"],
+        default="networkit",
+        help=(
+            "`networkit` writes connected components to be processed by "
+            "`generate_duplicates_dict.py`. `union_find` works on integer doc "
+            "ids and writes the final lookup table of duplicates directly."
+        ),
+    )
     args = parser.parse_args()
-    generate_connected_components_mp(args)
+    if args.engine == "union_find":
+        generate_duplicates_union_find(args)
+    else:
+        generate_connected_components_mp(args)
@@ -13,16 +13,27 @@
 # limitations under the License.
 
 import argparse
-import pickle
+import os
 import queue
 import time
 from collections import defaultdict
 from glob import glob
 from multiprocessing import Process, Queue
 
-from datasketch.lean_minhash import LeanMinHash
+import numpy as np
 from more_itertools import divide
 
+# isort: off
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../../../.."))
+# isort: on
+from modelzoo.transformers.data_processing.slimpajama.dedup.external_lsh import (
+    DOC_TABLE_SUFFIX,
+    generate_pairs_external,
+    load_signatures,
+)
+
 
 def _H(hs):
     return bytes(hs.byteswap().data)
@@ -43,20 +54,20 @@ def split_files(input_dir, n_proc):
             files.extend(glob(f"{input_dir}/{dataset}/*/minhash_nfc/*"))
         else:
             files.extend(glob(f"{input_dir}/{dataset}/minhash_nfc/*"))
-    files = sorted(files)
+    # doc tables are read along with the signatures they belong to
+    files = sorted(f for f in files if not f.endswith(DOC_TABLE_SUFFIX))
     parts = divide(n_proc, files)
     return [list(p) for p in parts]
 
 
 def get_hashes(files, doc_queues, r):
     for fp in files:
-        with open(fp, "rb") as fin:
-            for item in pickle.load(fin):
-                key = f"{item['file_name']}@{item['doc_id']}"
-                minhash = LeanMinHash(item["hash"])
-                for i, doc_queue in enumerate(doc_queues):
-                    H = _H(minhash.hashvalues[i * r : (i + 1) * r])
-                    doc_queue.put((key, H))
+        file_names, name_index, doc_ids, hashvalues = load_signatures(fp)
+        for j in range(len(doc_ids)):
+            key = f"{file_names[name_index[j]]}@{doc_ids[j]}"
+            for i, doc_queue in enumerate(doc_queues):
+                H = _H(np.array(hashvalues[j, i * r : (i + 1) * r]))
+                doc_queue.put((key, H))
 
 
 def lsh(out_file, doc_queue, idx):
@@ -87,6 +98,18 @@ def lsh(out_file, doc_queue, idx):
 
 
 def generate_pairs(args):
+    if getattr(args, "engine", "queue") == "external":
+        files = [f for part in split_files(args.input_dir, 1) for f in part]
+        generate_pairs_external(
+            files,
+            args.work_dir,
+            args.bands,
+            args.range,
+            args.processes,
+            args.memory_limit_mb,
+        )
+        return
+
     # size of the queue was tuned for optimal perf and memory constraints.
     doc_queues = [Queue(1000000) for _ in range(args.bands)]
     files = split_files(args.input_dir, args.processes)
@@ -125,6 +148,29 @@ if __name__ == "__main__":
     parser.add_argument(
         "--processes", type=int,
     )
+    parser.add_argument(
+        "--engine",
+        choices=["queue", "external"],
+        default="queue",
+        help=(
+            "`queue` keeps an in-memory LSH index per band. `external` "
+            "writes sorted runs of band hashes to `--work_dir` and finds "
+            "collisions by merging them, with bounded memory and support for "
+            "resuming an interrupted job."
+        ),
+    )
+    parser.add_argument(
+        "--work_dir",
+        help="Directory for intermediate files and outputs of `external`.",
+    )
+    parser.add_argument(
+        "--memory_limit_mb",
+        type=int,
+        default=64 * 1024,
+        help="Approximate memory budget of the `external` engine in MiB.",
+    )
     args = parser.parse_args()
+    if args.engine == "external" and args.work_dir is None:
+        parser.error("--work_dir is required when using --engine external")
 
     generate_pairs(args)
@@ -22,12 +22,24 @@ from itertools import repeat
 from multiprocessing import Pool, cpu_count
 
 import jsonlines
+import numpy as np
 from datasketch import MinHash
 from lm_dataformat import Reader
 from more_itertools import chunked
 from nltk import ngrams
+from numpy.lib.stride_tricks import sliding_window_view
 from tqdm import tqdm
 
+# isort: off
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../../../.."))
+# isort: on
+from modelzoo.transformers.data_processing.slimpajama.dedup.external_lsh import (
+    DOC_TABLE_SUFFIX,
+    SIGNATURES_SUFFIX,
+)
+
 
 def get_features(s, width):
     # lower cased
@@ -39,6 +51,81 @@ def get_features(s, width):
     return map(lambda x: "".join(x), ngrams(s, width))
 
 
+# constants and permutations match `datasketch.MinHash` with its default seed
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# number of n-grams permuted at once, bounds memory for very long documents
+_NGRAM_BLOCK_SIZE = 4096
+
+
+def get_permutations(num_perm, seed=1):
+    gen = np.random.RandomState(seed)
+    return np.array(
+        [
+            (
+                gen.randint(1, _MERSENNE_PRIME, dtype=np.uint64),
+                gen.randint(0, _MERSENNE_PRIME, dtype=np.uint64),
+            )
+            for _ in range(num_perm)
+        ],
+        dtype=np.uint64,
+    ).T
+
+
+def get_feature_hashes(s, width):
+    """
+    Hash all character n-grams of the normalized text of `s` at once.
+
+    Applies the same normalization as `get_features`, then computes a
+    polynomial rolling hash over a sliding window of the code points of the
+    text and returns the unique 32-bit n-gram hashes.
+    """
+    s = s.lower()
+    s = s.translate(str.maketrans("", "", string.punctuation))
+    s = re.sub(r"\s+", " ", s.strip())
+    codes = np.frombuffer(s.encode("utf-32-le"), dtype=np.uint32)
+    if len(codes) < width:
+        return np.empty(0, dtype=np.uint64)
+    windows = sliding_window_view(codes.astype(np.uint64), width)
+    powers = np.uint64(0x100000001B3) ** np.arange(
+        width - 1, -1, -1, dtype=np.uint64
+    )
+    with np.errstate(over="ignore"):
+        h = (windows * powers).sum(axis=1, dtype=np.uint64)
+        # splitmix64 finalizer so that the low bits depend on every character
+        h ^= h >> np.uint64(30)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(27)
+        h *= np.uint64(0x94D049BB133111EB)
+        h ^= h >> np.uint64(31)
+    return np.unique(h & _MAX_HASH)
+
+
+def compute_signature(s, width, permutations):
+    """
+    Compute the minhash signature of `s`, applying every permutation to every
+    n-gram hash with broadcasting instead of one `MinHash.update` call per
+    n-gram.
+    """
+    a, b = permutations
+    signature = np.full(a.shape, _MAX_HASH, dtype=np.uint64)
+    hashes = get_feature_hashes(s, width)
+    with np.errstate(over="ignore"):
+        for start in range(0, len(hashes), _NGRAM_BLOCK_SIZE):
+            hv = hashes[start : start + _NGRAM_BLOCK_SIZE, None]
+            phv = ((hv * a + b) % _MERSENNE_PRIME) & _MAX_HASH
+            np.minimum(signature, phv.min(axis=0), out=signature)
+    return signature
+
+
+def get_output_name(file_path, dataset_name):
+    file_name = file_path.split("/")[-1]
+    if dataset_name == "common_crawl":
+        dir_2 = file_path.split("/")[-2]
+        return f"{dataset_name}/{dir_2}/{file_name}"
+    return f"{dataset_name}/{file_name}"
+
+
 def get_documents(input_dir, index_start, index_end, output_dir, dataset_name):
     gc.collect()
     files = sorted(os.listdir(input_dir))
@@ -84,6 +171,38 @@ def to_minhash(chunks):
     return buckets
 
 
+def to_signatures(chunks):
+    gc.collect()
+    documents, output_dir, width, dataset_name, n_docs = chunks
+    permutations = get_permutations(128)
+    file_names, doc_ids, signatures = [], [], []
+    for doc in tqdm(documents, total=n_docs):
+        text, file_path, doc_id = doc[0], doc[1], doc[2]
+        file_names.append(get_output_name(file_path, dataset_name))
+        doc_ids.append(doc_id)
+        signatures.append(compute_signature(text, width, permutations))
+    return file_names, doc_ids, signatures
+
+
+def output_signatures(
+    output_dir, file_names, doc_ids, signatures, chunk_id, iter
+):
+    """
+    Write signatures as a `uint64[N, 128]` array that can be memory-mapped,
+    along with a table of the file name and id of each document.
+    """
+    prefix = f"{output_dir}/minhash_nfc/{iter}-{chunk_id}"
+    distinct_names, name_index = np.unique(file_names, return_inverse=True)
+    np.savez(
+        f"{prefix}{DOC_TABLE_SUFFIX}",
+        file_names=distinct_names,
+        name_index=name_index.astype(np.uint32),
+        doc_ids=np.array(doc_ids, dtype=np.uint64),
+    )
+    # the signatures are written last as they mark the chunk as complete
+    np.save(f"{prefix}{SIGNATURES_SUFFIX}", np.stack(signatures))
+
+
 def output_results(output_dir, results, chunk_id, iter):
     with open(
         f"{output_dir}/minhash_nfc/{iter}-{chunk_id}.pickle", "wb"
@@ -105,6 +224,9 @@ def generate_hashes(args):
     results = []
     chunk_id = 0
     gc.collect()
+    if getattr(args, "format", "pickle") == "numpy":
+        generate_signatures(args, documents)
+        return
     with Pool(processes=cpu_count()) as pool:
         for i, chunks in enumerate(
             tqdm(
@@ -137,6 +259,50 @@ def generate_hashes(args):
         output_results(args.output_dir, results, chunk_id, args.iter)
 
 
+def generate_signatures(args, documents):
+    file_names, doc_ids, signatures = [], [], []
+    chunk_id = 0
+    with Pool(processes=cpu_count()) as pool:
+        for chunk in tqdm(
+            pool.imap(
+                to_signatures,
+                zip(
+                    chunked(documents, args.n_docs // cpu_count()),
+                    repeat(args.output_dir),
+                    repeat(args.w),
+                    repeat(args.dataset_name),
+                    repeat(args.n_docs // cpu_count()),
+                ),
+            ),
+            total=cpu_count(),
+        ):
+            for name, doc_id, signature in zip(*chunk):
+                if len(signatures) == args.k:
+                    output_signatures(
+                        args.output_dir,
+                        file_names,
+                        doc_ids,
+                        signatures,
+                        chunk_id,
+                        args.iter,
+                    )
+                    file_names, doc_ids, signatures = [], [], []
+                    chunk_id += 1
+                file_names.append(name)
+                doc_ids.append(doc_id)
+                signatures.append(signature)
+
+    if signatures:
+        output_signatures(
+            args.output_dir,
+            file_names,
+            doc_ids,
+            signatures,
+            chunk_id,
+            args.iter,
+        )
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("dataset_name")
@@ -168,5 +334,18 @@ if __name__ == "__main__":
         help="Number of batches to output with.",
         required=False,
     )
+    parser.add_argument(
+        "--format",
+        choices=["pickle", "numpy"],
+        default="pickle",
+        help=(
+            "`pickle` writes pickled `datasketch.MinHash` objects. `numpy` "
+            "computes signatures with vectorized n-gram hashing and writes "
+            "them as arrays that can be memory-mapped. The n-gram hashes "
+            "differ between the two formats, so all files that are "
+            "deduplicated together must use the same one."
+        ),
+        required=False,
+    )
     args = parser.parse_args()
     generate_hashes(args)
@@ -17,7 +17,9 @@
 Modified from the GPT-2 codebase: https://github.com/openai/gpt-2
 """
 
+import heapq
 import json
+from collections import OrderedDict
 from functools import lru_cache
 
 import regex as re
@@ -64,8 +66,25 @@ def get_pairs(word):
 
 
 class BPETokenizer:
+    """
+    Args:
+        vocab_file (str): File of BPE merges, one per line, in order of
+            priority.
+        encoder_file (str): JSON file mapping tokens to ids.
+        errors (str): How to handle errors when decoding bytes to utf-8.
+        special_tokens (list[str]): Tokens to add to the vocabulary.
+        cache_size (int): Maximum number of pre-tokenized words whose merges
+            are cached. The least recently used words are evicted first, so
+            memory stays bounded on large corpora.
+    """
+
     def __init__(
-        self, vocab_file, encoder_file, errors='replace', special_tokens=None
+        self,
+        vocab_file,
+        encoder_file,
+        errors='replace',
+        special_tokens=None,
+        cache_size=2 ** 16,
     ):
         with open(vocab_file, 'r', encoding="utf-8") as f:
             bpe_data = f.read()
@@ -90,7 +109,10 @@ class BPETokenizer:
         self.byte_encoder = bytes_to_unicode()
         self.byte_decoder = {v: k for k, v in self.byte_encoder.items()}
         self.bpe_ranks = dict(zip(bpe_merges, range(len(bpe_merges))))
-        self.cache = {}
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
 
         # Should haved added re.IGNORECASE so BPE merges can happen for
         # capitalized versions of contractions
@@ -98,53 +120,85 @@ class BPETokenizer:
             r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
         )
 
+    def _merge(self, word):
+        """
+        Apply the BPE merges to a tuple of symbols. Candidate pairs of
+        adjacent symbols are kept in a heap ordered by merge rank and
+        position, and the symbols in a linked list, so each merge only updates
+        the pairs next to it. Heap entries invalidated by earlier merges are
+        skipped when popped. This gives the same result as repeatedly merging
+        all occurrences of the lowest ranked pair from left to right.
+        """
+        symbols = list(word)
+        n = len(symbols)
+        prev_index = list(range(-1, n - 1))
+        next_index = list(range(1, n + 1))
+        next_index[-1] = -1
+
+        heap = []
+        for i in range(n - 1):
+            pair = (symbols[i], symbols[i + 1])
+            rank = self.bpe_ranks.get(pair)
+            if rank is not None:
+                heap.append((rank, i, pair))
+        heapq.heapify(heap)
+
+        while heap:
+            _, i, (first, second) = heapq.heappop(heap)
+            j = next_index[i]
+            if symbols[i] != first or j == -1 or symbols[j] != second:
+                # stale entry, one of the symbols was merged already
+                continue
+            symbols[i] = first + second
+            symbols[j] = None
+            k = next_index[j]
+            next_index[i] = k
+            if k != -1:
+                prev_index[k] = i
+            for left, right in ((prev_index[i], i), (i, k)):
+                if left == -1 or right == -1:
+                    continue
+                pair = (symbols[left], symbols[right])
+                rank = self.bpe_ranks.get(pair)
+                if rank is not None:
+                    heapq.heappush(heap, (rank, left, pair))
+
+        merged = []
+        i = 0
+        while i != -1:
+            merged.append(symbols[i])
+            i = next_index[i]
+        return merged
+
     def bpe(self, token):
         if token in self.cache:
+            self.cache_hits += 1
+            self.cache.move_to_end(token)
             return self.cache[token]
-        word = tuple(token)
-        pairs = get_pairs(word)
-
-        if not pairs:
+        self.cache_misses += 1
+        if len(token) < 2:
             return token
 
-        while True:
-            bigram = min(
-                pairs, key=lambda pair: self.bpe_ranks.get(pair, float('inf'))
-            )
-            if bigram not in self.bpe_ranks:
-                break
-            first, second = bigram
-            new_word = []
-            i = 0
-            while i < len(word):
-                try:
-                    j = word.index(first, i)
-                    new_word.extend(word[i:j])
-                    i = j
-                except:
-                    new_word.extend(word[i:])
-                    break
-
-                if (
-                    word[i] == first
-                    and i < len(word) - 1
-                    and word[i + 1] == second
-                ):
-                    new_word.append(first + second)
-                    i += 2
-                else:
-                    new_word.append(word[i])
-                    i += 1
-            new_word = tuple(new_word)
-            word = new_word
-            if len(word) == 1:
-                break
-            else:
-                pairs = get_pairs(word)
-        word = ' '.join(word)
-        self.cache[token] = word
+        word = ' '.join(self._merge(token))
+        if self.cache_size:
+            self.cache[token] = word
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
         return word
 
+    def cache_info(self):
+        """
+        Returns the hit and miss counts, size, and hit rate of the BPE cache.
+        """
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "hits": self.cache_hits,
+            "misses": self.cache_misses,
+            "size": len(self.cache),
+            "max_size": self.cache_size,
+            "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+        }
+
     def encode(self, text):
         bpe_tokens = []
         for token in re.findall(self.pat, text):
@@ -155,6 +209,13 @@ class BPETokenizer:
             )
         return bpe_tokens
 
+    def encode_batch(self, texts):
+        """
+        Encode a list of texts. Words repeated across texts are only merged
+        once while they stay in the cache.
+        """
+        return [self.encode(text) for text in texts]
+
     def decode(self, tokens):
         text = ''.join([self.decoder[token] for token in tokens])
         text = bytearray([self.byte_decoder[c] for c in text]).decode(
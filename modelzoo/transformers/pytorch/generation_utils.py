@@ -0,0 +1,157 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Autoregressive generation for decoder-only language models, meant for
+sampling from checkpoints on CPU or GPU.
+"""
+
+from typing import Optional
+
+import torch
+
+from modelzoo.common.pytorch.layers.KVCache import KVCache
+
+
+def sample_next_token(
+    logits: torch.Tensor,
+    do_sample: bool = False,
+    temperature: float = 1.0,
+    top_k: int = 0,
+    top_p: float = 1.0,
+    generator: Optional[torch.Generator] = None,
+):
+    """Pick the next token from the logits of the last position.
+
+    Args:
+        logits (Tensor): Logits with shape ``[batch_size, vocab_size]``.
+        do_sample (bool): Sample from the distribution given by the logits if
+            ``True``, otherwise pick the most likely token.
+        temperature (float): Value to divide the logits by before sampling.
+        top_k (int): If positive, only sample from the ``top_k`` most likely
+            tokens.
+        top_p (float): If less than 1, only sample from the smallest set of
+            most likely tokens whose probabilities add up to at least
+            ``top_p``.
+        generator (torch.Generator): Random number generator for sampling.
+
+    Returns:
+        Token ids with shape ``[batch_size]``.
+    """
+    if not do_sample:
+        return logits.argmax(dim=-1)
+
+    logits = logits.float() / temperature
+    if top_k > 0:
+        top_k = min(top_k, logits.shape[-1])
+        kth_logit = torch.topk(logits, top_k, dim=-1).values[..., -1:]
+        logits = logits.masked_fill(logits < kth_logit, float("-inf"))
+    if top_p < 1.0:
+        sorted_logits, sorted_indices = torch.sort(
+            logits, dim=-1, descending=True
+        )
+        sorted_probs = sorted_logits.softmax(dim=-1)
+        # drop a token if the more likely tokens already reach top_p, which
+        # always keeps the most likely one
+        remove = sorted_probs.cumsum(dim=-1) - sorted_probs >= top_p
+        sorted_logits = sorted_logits.masked_fill(remove, float("-inf"))
+        logits = torch.full_like(logits, float("-inf")).scatter(
+            -1, sorted_indices, sorted_logits
+        )
+    probs = logits.softmax(dim=-1)
+    return torch.multinomial(probs, 1, generator=generator).squeeze(-1)
+
+
+@torch.no_grad()
+def generate(
+    model: torch.nn.Module,
+    input_ids: torch.Tensor,
+    max_new_tokens: int,
+    attention_mask: Optional[torch.Tensor] = None,
+    do_sample: bool = False,
+    temperature: float = 1.0,
+    top_k: int = 0,
+    top_p: float = 1.0,
+    eos_token_id: Optional[int] = None,
+    generator: Optional[torch.Generator] = None,
+):
+    """Generate tokens autoregressively with a preallocated ``KVCache`` per
+    decoder layer, so that each step only runs the model on the newest token.
+
+    The model must accept ``past_kv`` and ``cache_present_kv`` in its forward
+    pass and have a ``transformer_decoder`` and ``max_position_embeddings``,
+    like ``GPT2LMHeadModel`` and ``GPTJModel``. Call ``model.eval()`` first to
+    disable dropout.
+
+    Args:
+        model (nn.Module): The language model.
+        input_ids (Tensor): Prompt token ids with shape
+            ``[batch_size, prompt_length]``.
+        max_new_tokens (int): Maximum number of tokens to generate.
+        attention_mask (Tensor): Mask of the prompt with shape
+            ``[batch_size, prompt_length]``, 1 for tokens to attend to and 0
+            for padding. Prompts of different lengths should be padded on the
+            left. Padding is counted in token positions. Defaults to all ones.
+        do_sample, temperature, top_k, top_p, generator: See
+            ``sample_next_token``.
+        eos_token_id (int): If set, a sequence stops once it generates this
+            token and is padded with it until all sequences have stopped.
+
+    Returns:
+        Token ids of the prompts followed by the generated tokens, with shape
+        ``[batch_size, prompt_length + num_generated]``.
+    """
+    batch_size, prompt_length = input_ids.shape
+    max_length = prompt_length + max_new_tokens
+    assert max_length <= model.max_position_embeddings, (
+        f"Prompt length ({prompt_length}) + max_new_tokens ({max_new_tokens}) "
+        f"must not exceed max_position_embeddings "
+        f"({model.max_position_embeddings})."
+    )
+    if attention_mask is None:
+        attention_mask = torch.ones_like(input_ids)
+
+    past_kv = [KVCache(max_length) for _ in model.transformer_decoder.layers]
+    finished = torch.zeros(
+        batch_size, dtype=torch.bool, device=input_ids.device
+    )
+    tokens = input_ids
+    next_input_ids = input_ids
+    for _ in range(max_new_tokens):
+        logits, past_kv = model(
+            input_ids=next_input_ids,
+            attention_mask=attention_mask,
+            past_kv=past_kv,
+            cache_present_kv=True,
+        )
+        next_tokens = sample_next_token(
+            logits[:, -1, :],
+            do_sample=do_sample,
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+            generator=generator,
+        )
+        if eos_token_id is not None:
+            next_tokens = next_tokens.masked_fill(finished, eos_token_id)
+            finished |= next_tokens == eos_token_id
+
+        next_input_ids = next_tokens[:, None]
+        tokens = torch.cat([tokens, next_input_ids], dim=-1)
+        attention_mask = torch.cat(
+            [attention_mask, torch.ones_like(next_input_ids)], dim=-1
+        )
+        if finished.all():
+            break
+    return tokens
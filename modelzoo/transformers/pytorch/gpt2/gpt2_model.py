@@ -23,10 +23,15 @@ from modelzoo.common.pytorch.layers import (
     TransformerDecoder,
     TransformerDecoderLayer,
 )
+from modelzoo.common.pytorch.layers.BlockwiseAttentionBias import (
+    BlockwiseCausalMask,
+)
+from modelzoo.common.pytorch.layers.KVCache import get_past_length
 from modelzoo.common.pytorch.layers.utils import apply_position_bias
 from modelzoo.common.pytorch.model_utils.RotaryPositionEmbeddingHelper import (
     RotaryPositionEmbeddingHelper,
 )
+from modelzoo.transformers.pytorch.generation_utils import generate
 from modelzoo.transformers.pytorch.gpt2.sparse_mask import (
     create_fixed_sparse_attention_mask,
 )
@@ -201,6 +206,12 @@ class GPT2LMHeadModel(nn.Module):
             use_ff_layer1_dropout=False,
         )
         self.output_logits_scale = output_logits_scale
+        # The chunked attention generates the causal mask and position bias
+        # per block instead of receiving them for the whole sequence
+        self.blockwise_attention_bias = (
+            extra_attention_params.get("attention_implementation")
+            == "chunked"
+        )
 
         # Final LayerNorm
         self.ln_f = norm_class(hidden_size, eps=layer_norm_epsilon)
@@ -276,9 +287,26 @@ class GPT2LMHeadModel(nn.Module):
         return self.embedding_layer.get_input_embeddings()
 
     def forward(
-        self, input_ids=None, attention_mask=None,
+        self,
+        input_ids=None,
+        attention_mask=None,
+        past_kv=None,
+        cache_present_kv=False,
     ):
-        hidden_states = self.embedding_layer(input_ids)
+        """
+        Args:
+            input_ids (Tensor): Token ids with shape ``[batch_size, seq_length]``.
+            attention_mask (Tensor): Mask with shape ``[batch_size, key_length]``,
+                where ``key_length`` counts both the past and current tokens.
+            past_kv (list): Past keys and values of each decoder layer, either
+                tuples of tensors or ``KVCache`` objects (optional).
+            cache_present_kv (bool): If ``True``, also return the present keys
+                and values of each decoder layer.
+        """
+        past_length = 0 if past_kv is None else get_past_length(past_kv[0])
+        hidden_states = self.embedding_layer(
+            input_ids, past_length=past_length
+        )
         if self.embedding_layer_norm:
             hidden_states = self.embedding_ln_f(hidden_states)
         hidden_states *= torch.tensor(
@@ -286,28 +314,50 @@ class GPT2LMHeadModel(nn.Module):
         )
         hidden_states = self.drop_embd(hidden_states)
 
-        causal_attention_mask = build_broadcastable_attention_mask(
-            attention_mask,
-            build_causal=True,
-            device=input_ids.device,
-            dtype=hidden_states.dtype,
-        )
+        # Helpers on alibi/relative position embeddings bias
+        length = input_ids.shape[1]
+        key_length = past_length + length
+
+        if self.blockwise_attention_bias:
+            causal_attention_mask = BlockwiseCausalMask(
+                length,
+                key_length,
+                dtype=hidden_states.dtype,
+                device=input_ids.device,
+                past_length=past_length,
+            )
+        else:
+            causal_attention_mask = build_broadcastable_attention_mask(
+                attention_mask,
+                build_causal=True,
+                device=input_ids.device,
+                dtype=hidden_states.dtype,
+                past_length=past_length,
+            )
 
         # Fixed sparse attention, used in GPT-3 model
         sparse_attention_mask = None
         if self.fixed_sparsity_mask is not None:
+            fixed_sparsity_mask = self.fixed_sparsity_mask
+            if past_kv is not None:
+                # The mask is [S, S], or [H, S, S] with a layout per head
+                fixed_sparsity_mask = fixed_sparsity_mask[
+                    ..., past_length:key_length, :key_length
+                ]
             sparse_attention_mask = make_sparse_mask_broadcastable(
-                self.fixed_sparsity_mask,
+                fixed_sparsity_mask,
                 attention_mask,
                 dtype=hidden_states.dtype,
                 device=hidden_states.device,
                 revert_mask=False,
             )
 
-        # Helpers on alibi/relative position embeddings bias
-        length = input_ids.shape[1]
         self_attn_position_bias = apply_position_bias(
-            self.relative_pe_helper, length, length
+            self.relative_pe_helper,
+            length,
+            key_length,
+            past_kv=past_kv,
+            blockwise=self.blockwise_attention_bias,
         )
 
         hidden_states = self.transformer_decoder(
@@ -316,7 +366,11 @@ class GPT2LMHeadModel(nn.Module):
             sparse_mask=sparse_attention_mask,
             rotary_position_embedding_helper=self.rotary_pe_helper,
             self_attn_position_bias=self_attn_position_bias,
+            past_kv=past_kv,
+            cache_present_kv=cache_present_kv,
         )
+        if cache_present_kv:
+            hidden_states, present_kv = hidden_states
 
         lm_logits = self.lm_head(hidden_states)
 
@@ -326,4 +380,11 @@ class GPT2LMHeadModel(nn.Module):
                 float(self.output_logits_scale), dtype=lm_logits.dtype,
             )
 
+        if cache_present_kv:
+            return lm_logits, present_kv
         return lm_logits
+
+    def generate(self, input_ids, max_new_tokens, **kwargs):
+        """Generate tokens with a KV cache, see
+        ``modelzoo.transformers.pytorch.generation_utils.generate``."""
+        return generate(self, input_ids, max_new_tokens, **kwargs)
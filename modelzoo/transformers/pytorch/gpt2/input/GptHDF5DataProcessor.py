@@ -41,6 +41,9 @@ class GptHDF5DataProcessor(HDF5IterableDataProcessor):
     - "prefetch_factor" (int): Number of batches loaded in advance by each worker.
     - "persistent_workers" (bool): If True, the data loader will not shutdown
        the worker processes after a dataset has been consumed once.
+    - "read_ahead_chunks", "read_ahead_chunk_size", "read_ahead_threads",
+       "read_ahead_memory_mb": Settings for reading data ahead on background
+       threads. See `HDF5IterableDataset`.
     """
 
     def __init__(self, params):
@@ -14,6 +14,7 @@
 
 import numpy as np
 import torch
+from torch.utils.data.dataloader import default_collate
 
 from modelzoo.transformers.data_processing.h5_map_dataset import HDF5Dataset
 
@@ -42,6 +43,9 @@ class GptHDF5MapDataProcessor:
                 that is directly attached to each individual worker node.
                 Useful when your network storage is unusually slow, but
                 otherwise discouraged.
+            - "use_memmap" (bool): whether to read data from the flat binary
+                format written by `convert_h5_to_memmap.py` rather than from h5
+                files. Defaults to `False`.
             - "max_sequence_length" (int): the sequence length of samples
                 produced by the dataloader. When using the 'corpus' data format,
                 the same preprocessed data will work with any max sequence
@@ -105,9 +109,14 @@ class GptHDF5MapDataProcessor:
             self.persistent_workers = False
 
     def create_dataloader(self):
+        # `self.dataset.sampler` yields whole batches of indices. Passing it as
+        # a plain sampler with automatic batching disabled hands each batch to
+        # `HDF5Dataset.__getitem__` in a single call so the reads coalesce.
         return torch.utils.data.DataLoader(
             self.dataset,
-            batch_sampler=self.dataset.sampler,
+            sampler=self.dataset.sampler,
+            batch_size=None,
+            collate_fn=default_collate,
             num_workers=self.num_workers,
             prefetch_factor=self.prefetch_factor,
             persistent_workers=self.persistent_workers,
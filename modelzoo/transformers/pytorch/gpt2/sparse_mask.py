@@ -12,10 +12,47 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+
 import numpy as np
 import torch
 
 
+def _fixed_sparse_layout(n_ctx, stride, subindices):
+    """
+    Boolean layout of shape [n_ctx, n_ctx] where each query attends to the
+    keys of its local block of ``stride`` positions and to the "vertical"
+    keys whose position modulo ``stride`` is in ``subindices``, but never to
+    keys after it.
+    """
+    positions = np.arange(n_ctx)
+    vertical = np.isin(positions % stride, subindices)
+    blocks = positions // stride
+    layout = blocks[:, None] == blocks[None, :]
+    layout |= vertical[None, :]
+    # Any query cannot attend to keys above it
+    layout &= positions[None, :] <= positions[:, None]
+    return layout
+
+
+def _load_cached_layout(path):
+    with np.load(path) as cached:
+        layout = np.unpackbits(cached["layout"], axis=-1)
+        return layout[..., : cached["n_ctx"]].astype(bool)
+
+
+def _save_cached_layout(path, layout):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            layout=np.packbits(layout, axis=-1),
+            n_ctx=np.int64(layout.shape[-1]),
+        )
+    os.replace(tmp_path, path)
+
+
 def create_fixed_sparse_attention_mask(
     max_sequence_length,
     n_heads,
@@ -24,6 +61,7 @@ def create_fixed_sparse_attention_mask(
     num_verts=64,
     vert_size=16,
     different_layout_per_head=False,
+    cache_dir=None,
 ):
     """
     Create GPT-3 Fixed Sparse mask.
@@ -31,6 +69,9 @@ def create_fixed_sparse_attention_mask(
 
     :param int max_sequence_length: Max sequence length.
     :param dtype: Dtype of the resulting mask.
+    :param str cache_dir: If set, layouts are stored in this directory as
+        bit-packed arrays keyed by the mask parameters, and loaded from it
+        by later calls with the same parameters.
 
     Returns:
         The autoregressive fixed sparse mask of shape
@@ -44,39 +85,35 @@ def create_fixed_sparse_attention_mask(
     assert stride % vert_size == 0
     indices = [i for i in range(stride - 1, -1, -1)]
     indices = np.array(indices).reshape([-1, vert_size])
-    if num_verts == 1:
-        layout = np.zeros([n_ctx, n_ctx])
-        for idx in indices[0]:
-            layout[:, idx::stride] = 1
-        for q_idx in range(n_ctx):
-            # Each thing can attend to its local block
-            row = q_idx // stride
-            layout[q_idx, row * stride : (row + 1) * stride] = 1
-            # Any query cannot attend to keys above it
-            layout[q_idx, q_idx + 1 :] = 0
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(
+            cache_dir,
+            f"fixed_sparse_{n_ctx}_{n_heads}_{local_attn_ctx}_{num_verts}_"
+            f"{vert_size}_{int(different_layout_per_head)}.npz",
+        )
+    if cache_path is not None and os.path.exists(cache_path):
+        layout = _load_cached_layout(cache_path)
+    elif num_verts == 1 or not different_layout_per_head:
+        # Only the layout of the first head is used
+        layout = _fixed_sparse_layout(n_ctx, stride, tuple(indices[0]))
     else:
-        layouts = []
         indices = indices[:num_verts]
-        for h in range(n_heads):
-            layout = np.zeros([n_ctx, n_ctx])
-            subindices = indices[h % num_verts]
-            for idx in subindices:
-                layout[:, idx::stride] = 1
-            for q_idx in range(n_ctx):
-                # Each position can attend to its local block
-                row = q_idx // stride
-                layout[q_idx, row * stride : (row + 1) * stride] = 1
-                # Any query cannot attend to keys above it
-                layout[q_idx, q_idx + 1 :] = 0
-            layouts.append(layout)
-        layout = np.array(layouts)
-
-    if not different_layout_per_head:
-        layout = layout[0, :, :]
+        # Heads with the same subindices share a layout
+        head_layouts = [
+            _fixed_sparse_layout(n_ctx, stride, tuple(indices[h % num_verts]))
+            for h in range(min(n_heads, num_verts))
+        ]
+        layout = np.stack(
+            [head_layouts[h % num_verts] for h in range(n_heads)]
+        )
+    if cache_path is not None and not os.path.exists(cache_path):
+        _save_cached_layout(cache_path, layout)
 
     # Swap 0s and 1s since we use 1 to indicate masked positions
-    mask = 1 - layout
+    mask = torch.from_numpy(~layout)
 
-    fixed_sparse_attn_mask = torch.Tensor(mask).to(dtype)
+    fixed_sparse_attn_mask = mask.to(torch.float32 if dtype is None else dtype)
 
     return fixed_sparse_attn_mask
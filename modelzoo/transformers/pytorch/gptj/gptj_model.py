@@ -21,10 +21,15 @@ from modelzoo.common.pytorch.layers import (
     RelativePositionEmbeddingLayer,
     TransformerDecoder,
 )
+from modelzoo.common.pytorch.layers.BlockwiseAttentionBias import (
+    BlockwiseCausalMask,
+)
+from modelzoo.common.pytorch.layers.KVCache import get_past_length
 from modelzoo.common.pytorch.layers.utils import apply_position_bias
 from modelzoo.common.pytorch.model_utils.RotaryPositionEmbeddingHelper import (
     RotaryPositionEmbeddingHelper,
 )
+from modelzoo.transformers.pytorch.generation_utils import generate
 from modelzoo.transformers.pytorch.transformer_utils import (
     build_broadcastable_attention_mask,
 )
@@ -101,6 +106,12 @@ class GPTJModel(nn.Module):
         )
 
         self.drop_embd = nn.Dropout(embd_pdrop)
+        # The chunked attention generates the causal mask and position bias
+        # per block instead of receiving them for the whole sequence
+        self.blockwise_attention_bias = (
+            extra_attention_params.get("attention_implementation")
+            == "chunked"
+        )
 
         norm_class = BiaslessLayerNorm if use_biasless_norm else nn.LayerNorm
 
@@ -201,22 +212,53 @@ class GPTJModel(nn.Module):
             output_embedding.out_features = input_embedding.num_embeddings
 
     def forward(
-        self, input_ids=None, attention_mask=None,
+        self,
+        input_ids=None,
+        attention_mask=None,
+        past_kv=None,
+        cache_present_kv=False,
     ):
-        hidden_states = self.embedding_layer(input_ids)
-        hidden_states = self.drop_embd(hidden_states)
-
-        causal_attention_mask = build_broadcastable_attention_mask(
-            attention_mask,
-            build_causal=True,
-            device=input_ids.device,
-            dtype=hidden_states.dtype,
+        """
+        Args:
+            input_ids (Tensor): Token ids with shape ``[batch_size, seq_length]``.
+            attention_mask (Tensor): Mask with shape ``[batch_size, key_length]``,
+                where ``key_length`` counts both the past and current tokens.
+            past_kv (list): Past keys and values of each decoder layer, either
+                tuples of tensors or ``KVCache`` objects (optional).
+            cache_present_kv (bool): If ``True``, also return the present keys
+                and values of each decoder layer.
+        """
+        past_length = 0 if past_kv is None else get_past_length(past_kv[0])
+        hidden_states = self.embedding_layer(
+            input_ids, past_length=past_length
         )
+        hidden_states = self.drop_embd(hidden_states)
 
         # Helpers on alibi/relative position embeddings
         length = input_ids.shape[1]
+        if self.blockwise_attention_bias:
+            causal_attention_mask = BlockwiseCausalMask(
+                length,
+                past_length + length,
+                dtype=hidden_states.dtype,
+                device=input_ids.device,
+                past_length=past_length,
+            )
+        else:
+            causal_attention_mask = build_broadcastable_attention_mask(
+                attention_mask,
+                build_causal=True,
+                device=input_ids.device,
+                dtype=hidden_states.dtype,
+                past_length=past_length,
+            )
+
         self_attn_position_bias = apply_position_bias(
-            self.relative_pe_helper, length, length
+            self.relative_pe_helper,
+            length,
+            past_length + length,
+            past_kv=past_kv,
+            blockwise=self.blockwise_attention_bias,
         )
 
         hidden_states = self.transformer_decoder(
@@ -224,8 +266,19 @@ class GPTJModel(nn.Module):
             tgt_mask=causal_attention_mask,
             rotary_position_embedding_helper=self.rotary_pe_helper,
             self_attn_position_bias=self_attn_position_bias,
+            past_kv=past_kv,
+            cache_present_kv=cache_present_kv,
         )
+        if cache_present_kv:
+            hidden_states, present_kv = hidden_states
 
         lm_logits = self.lm_head(hidden_states)
 
+        if cache_present_kv:
+            return lm_logits, present_kv
         return lm_logits
+
+    def generate(self, input_ids, max_new_tokens, **kwargs):
+        """Generate tokens with a KV cache, see
+        ``modelzoo.transformers.pytorch.generation_utils.generate``."""
+        return generate(self, input_ids, max_new_tokens, **kwargs)
@@ -13,11 +13,13 @@
 # limitations under the License.
 
 import math
+import os
 import random
 from typing import Iterator, Sized
 
 import numpy as np
 import torch
+import torch.distributed as dist
 
 from cerebras_pytorch.distributed.cluster_resolver import ClusterSpec, TaskSpec
 from modelzoo.common.pytorch import cb_model as cm
@@ -134,6 +136,11 @@ def is_distributed():
 
 
 def task_id():
+    """
+    Returns the index of the current task among all tasks feeding data, i.e.
+    the streaming rank on CS systems or the process rank in a distributed
+    run on GPU or CPU.
+    """
     if cm.is_streamer():
         return cm.get_streaming_rank()
     elif is_distributed():
@@ -143,6 +150,10 @@ def task_id():
 
 
 def num_tasks():
+    """
+    Returns the number of tasks feeding data, among which each data processor
+    shards its data using `task_id`.
+    """
     if cm.is_streamer():
         return cm.num_streamers()
     elif is_distributed():
@@ -176,7 +187,7 @@ def cluster_config():
     elif is_distributed():
         task_spec = TaskSpec(
             rank=dist.get_rank(),
-            local_rank=dist.get_rank(),
+            local_rank=int(os.environ.get("LOCAL_RANK", dist.get_rank())),
             wse_id=0,
             node_name="unknown",
         )
@@ -83,6 +83,7 @@ def build_broadcastable_attention_mask(
     dtype=None,
     revert_mask: bool = True,
     multiply_neg_inf: bool = True,
+    past_length: int = 0,
 ):
     """Create broadcastable attention mask (full or causal) so that masked positions are ignored.
 
@@ -93,6 +94,10 @@ def build_broadcastable_attention_mask(
         dtype (torch.dtype): Dtype of the resulting mask.
         revert_mask (bool): whether to flip the 1's and 0's of the attention mask, default to True.
         multiply_neg_inf (bool): whether to multiply the resulting mask by a negative infinity constant, default to True.
+        past_length (int): Number of positions that precede the queries, when
+            decoding with cached keys and values. The attention mask then
+            covers both the past and the current positions, and the causal
+            mask only has rows for the current ones.
 
     Returns:
         The attention mask of shape [batch_size, num_heads, src_seq_len, target_seq_len],
@@ -120,7 +125,7 @@ def build_broadcastable_attention_mask(
     src_sequence_length = (
         extended_attention_mask.shape[-2]
         if extended_attention_mask.shape[-2] != 1
-        else target_sequence_length
+        else target_sequence_length - past_length
     )
 
     if build_causal:
@@ -129,6 +134,7 @@ def build_broadcastable_attention_mask(
             target_sequence_length,
             dtype=dtype,
             device=device,
+            past_length=past_length,
         )
         extended_attention_mask, _ = torch.broadcast_tensors(
             causal_mask, extended_attention_mask
@@ -148,6 +154,7 @@ def create_2D_autoregressive_mask(
     target_sequence_length: int,
     dtype=None,
     device=None,
+    past_length=0,
 ):
     """Create autoregressive (triangular) mask.
 
@@ -157,6 +164,7 @@ def create_2D_autoregressive_mask(
         target_sequence_length (int): Sequence length of the target (num key vectors).
         dtype (torch.dtype): Dtype of the resulting mask.
         device: (torch.device): The device of the input to the model, used for causal mask creation.
+        past_length (int): Position of the first query vector.
 
     Returns:
         The causal mask of shape [src_seq_len, target_seq_len].
@@ -169,7 +177,7 @@ def create_2D_autoregressive_mask(
             device=device,
             dtype=dtype,
         ),
-        diagonal=1,
+        diagonal=1 + past_length,
     )
     return causal_mask
 
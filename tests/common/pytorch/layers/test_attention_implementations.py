@@ -0,0 +1,238 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parity of the chunked and sdpa attention implementations with the default
+one, on CPU with dropout disabled."""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from modelzoo.common.pytorch.layers import (  # noqa: E402
+    AlibiPositionEmbeddingLayer,
+    MultiheadAttention,
+    RelativePositionEmbeddingLayer,
+)
+from modelzoo.common.pytorch.layers.BlockwiseAttentionBias import (  # noqa: E402
+    BlockwiseCausalMask,
+    BlockwisePositionBias,
+)
+from modelzoo.transformers.pytorch.transformer_utils import (  # noqa: E402
+    build_broadcastable_attention_mask,
+    create_2D_autoregressive_mask,
+)
+
+BATCH_SIZE = 2
+SEQ_LENGTH = 13
+EMBED_DIM = 32
+NUM_HEADS = 4
+# doesn't divide SEQ_LENGTH, so the last block of each dimension is partial
+CHUNK_SIZE = 5
+
+IMPLEMENTATIONS = ["chunked"]
+if hasattr(torch.nn.functional, "scaled_dot_product_attention"):
+    IMPLEMENTATIONS.append("sdpa")
+
+
+def _attention_layers(implementation):
+    torch.manual_seed(0)
+    default = MultiheadAttention(
+        EMBED_DIM, NUM_HEADS, dropout=0.0, use_projection_bias=True
+    )
+    other = MultiheadAttention(
+        EMBED_DIM,
+        NUM_HEADS,
+        dropout=0.0,
+        use_projection_bias=True,
+        attention_implementation=implementation,
+        attention_chunk_size=CHUNK_SIZE,
+    )
+    other.load_state_dict(default.state_dict())
+    return default.eval(), other.eval()
+
+
+def _inputs():
+    torch.manual_seed(1)
+    return torch.randn(BATCH_SIZE, SEQ_LENGTH, EMBED_DIM)
+
+
+def _causal_mask():
+    attention_mask = torch.ones(BATCH_SIZE, SEQ_LENGTH)
+    return build_broadcastable_attention_mask(
+        attention_mask, build_causal=True, dtype=torch.float32
+    )
+
+
+def _key_padding_mask():
+    key_padding_mask = torch.zeros(BATCH_SIZE, SEQ_LENGTH, dtype=torch.bool)
+    key_padding_mask[0, -4:] = True
+    return key_padding_mask
+
+
+def _assert_close(actual, expected):
+    assert not actual.isnan().any()
+    torch.testing.assert_close(actual, expected, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("implementation", IMPLEMENTATIONS)
+def test_no_mask(implementation):
+    default, other = _attention_layers(implementation)
+    x = _inputs()
+    _assert_close(other(x, x, x), default(x, x, x))
+
+
+@pytest.mark.parametrize("implementation", IMPLEMENTATIONS)
+def test_causal(implementation):
+    default, other = _attention_layers(implementation)
+    x = _inputs()
+    expected = default(x, x, x, attn_mask=_causal_mask())
+    _assert_close(other(x, x, x, attn_mask=_causal_mask()), expected)
+    blockwise_mask = BlockwiseCausalMask(
+        SEQ_LENGTH, SEQ_LENGTH, dtype=torch.float32
+    )
+    _assert_close(other(x, x, x, attn_mask=blockwise_mask), expected)
+
+
+@pytest.mark.parametrize("implementation", IMPLEMENTATIONS)
+def test_key_padding(implementation):
+    default, other = _attention_layers(implementation)
+    x = _inputs()
+    key_padding_mask = _key_padding_mask()
+    _assert_close(
+        other(x, x, x, key_padding_mask=key_padding_mask),
+        default(x, x, x, key_padding_mask=key_padding_mask),
+    )
+    blockwise_mask = BlockwiseCausalMask(
+        SEQ_LENGTH, SEQ_LENGTH, dtype=torch.float32
+    )
+    _assert_close(
+        other(
+            x,
+            x,
+            x,
+            attn_mask=blockwise_mask,
+            key_padding_mask=key_padding_mask,
+        ),
+        default(
+            x,
+            x,
+            x,
+            attn_mask=_causal_mask(),
+            key_padding_mask=key_padding_mask,
+        ),
+    )
+
+
+def _position_embedding_helpers():
+    torch.manual_seed(2)
+    return [
+        AlibiPositionEmbeddingLayer(NUM_HEADS, alibi_implementation="expand"),
+        AlibiPositionEmbeddingLayer(
+            NUM_HEADS, alibi_implementation="embedding"
+        ),
+        RelativePositionEmbeddingLayer(
+            NUM_HEADS,
+            num_relative_attention_buckets=8,
+            max_relative_positions=16,
+        ),
+    ]
+
+
+@pytest.mark.parametrize("implementation", IMPLEMENTATIONS)
+@pytest.mark.parametrize("helper_index", [0, 1, 2])
+def test_position_bias(implementation, helper_index):
+    helper = _position_embedding_helpers()[helper_index]
+    default, other = _attention_layers(implementation)
+    x = _inputs()
+    with torch.no_grad():
+        position_bias = helper(SEQ_LENGTH, SEQ_LENGTH)
+        expected = default(
+            x, x, x, attn_mask=_causal_mask(), position_bias=position_bias
+        )
+        _assert_close(
+            other(
+                x, x, x, attn_mask=_causal_mask(), position_bias=position_bias
+            ),
+            expected,
+        )
+        _assert_close(
+            other(
+                x,
+                x,
+                x,
+                attn_mask=BlockwiseCausalMask(
+                    SEQ_LENGTH, SEQ_LENGTH, dtype=torch.float32
+                ),
+                position_bias=BlockwisePositionBias(
+                    helper, SEQ_LENGTH, SEQ_LENGTH
+                ),
+            ),
+            expected,
+        )
+
+
+@pytest.mark.parametrize("implementation", IMPLEMENTATIONS)
+def test_fully_masked_rows(implementation):
+    default, other = _attention_layers(implementation)
+    x = _inputs()
+    attn_mask = torch.zeros(BATCH_SIZE, SEQ_LENGTH, SEQ_LENGTH)
+    attn_mask[:, 3, :] = torch.finfo(torch.float32).min
+    attn_mask[1, 7:, :] = torch.finfo(torch.float32).min
+    key_padding_mask = _key_padding_mask()
+    key_padding_mask[1, :] = True
+    _assert_close(
+        other(x, x, x, attn_mask=attn_mask, key_padding_mask=key_padding_mask),
+        default(
+            x, x, x, attn_mask=attn_mask, key_padding_mask=key_padding_mask
+        ),
+    )
+
+
+def test_blockwise_causal_mask():
+    for past_length in [0, 4]:
+        mask = BlockwiseCausalMask(
+            SEQ_LENGTH,
+            past_length + SEQ_LENGTH,
+            dtype=torch.float32,
+            past_length=past_length,
+        )
+        expected = create_2D_autoregressive_mask(
+            SEQ_LENGTH,
+            past_length + SEQ_LENGTH,
+            dtype=torch.float32,
+            past_length=past_length,
+        ) * torch.finfo(torch.float32).min
+        torch.testing.assert_close(mask.materialize()[0, 0], expected)
+        torch.testing.assert_close(
+            mask.block(2, 9, 4, 11)[0, 0], expected[2:9, 4:11]
+        )
+
+
+@pytest.mark.parametrize("helper_index", [0, 1, 2])
+def test_blockwise_position_bias(helper_index):
+    helper = _position_embedding_helpers()[helper_index]
+    past_length = 4
+    key_length = past_length + SEQ_LENGTH
+    with torch.no_grad():
+        expected = helper(SEQ_LENGTH, key_length, past_kv=True)
+        bias = BlockwisePositionBias(
+            helper, SEQ_LENGTH, key_length, past_kv=True
+        )
+        torch.testing.assert_close(bias.materialize(), expected)
+        torch.testing.assert_close(
+            bias.block(2, 9, 0, 17), expected[:, 2:9, 0:17]
+        )
+        torch.testing.assert_close(
+            bias.block(9, 13, 12, 17), expected[:, 9:13, 12:17]
+        )
@@ -0,0 +1,162 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Skipping the rules whose literal prefix doesn't match a key must convert
+every key with the same rule as a linear scan over all rules."""
+
+import pytest
+
+pytest.importorskip("torch")
+
+from modelzoo.common.pytorch.model_utils.checkpoint_converters.base_converter import (  # noqa: E402
+    ConversionRule,
+)
+from modelzoo.common.pytorch.model_utils.checkpoint_converters.gpt2_hf_cs import (  # noqa: E402
+    Converter_GPT2LMHeadModel_HF_CS18,
+)
+from modelzoo.common.pytorch.model_utils.checkpoint_converters.llama import (  # noqa: E402
+    Converter_LlamaForCausalLM_HF_CS19,
+)
+
+NUM_LAYERS = 12
+
+
+def _converters(converter):
+    yield converter
+    for rule in converter.rules:
+        last_segment = rule.segments[-1]
+        if ConversionRule.segment_is_converter(last_segment):
+            yield from _converters(last_segment)
+
+
+def _record_rules(converter):
+    """Replaces the action of every rule with one that records the new key
+    and the rule that produced it."""
+
+    def make_action(rule):
+        def record(
+            old_key,
+            new_key,
+            old_state_dict,
+            new_state_dict,
+            from_index,
+            action_fn_args,
+        ):
+            new_state_dict[old_key] = (new_key, repr(rule))
+
+        return record
+
+    for nested in _converters(converter):
+        for rule in nested.rules:
+            rule.action = make_action(rule)
+
+
+def _use_linear_scan(converter):
+    """Makes every key be tested against all rules, in order."""
+
+    def make_prefixed_rules(rules):
+        def prefixed_rules(from_index):
+            return [("", rule) for rule in rules]
+
+        return prefixed_rules
+
+    for nested in _converters(converter):
+        nested.prefixed_rules = make_prefixed_rules(nested.rules)
+
+
+def _key_mapping(converter, keys, from_index):
+    mapping = {}
+    for key in keys:
+        matched = converter.convert_key(
+            key, dict.fromkeys(keys), mapping, from_index
+        )
+        if not matched:
+            mapping[key] = None
+    return mapping
+
+
+def _llama_hf_keys(num_layers):
+    keys = ["model.embed_tokens.weight", "model.norm.weight", "lm_head.weight"]
+    for i in range(num_layers):
+        prefix = f"model.layers.{i}."
+        keys += [
+            prefix + "self_attn.q_proj.weight",
+            prefix + "self_attn.k_proj.weight",
+            prefix + "self_attn.v_proj.weight",
+            prefix + "self_attn.o_proj.weight",
+            prefix + "self_attn.rotary_emb.inv_freq",
+            prefix + "mlp.gate_proj.weight",
+            prefix + "mlp.up_proj.weight",
+            prefix + "mlp.down_proj.weight",
+            prefix + "input_layernorm.weight",
+            prefix + "post_attention_layernorm.weight",
+        ]
+    # Keys that no rule matches must stay unmatched.
+    keys += ["model.layers.0.unknown.weight", "unknown"]
+    return keys
+
+
+def _gpt2_hf_keys(num_layers):
+    keys = [
+        "transformer.wte.weight",
+        "transformer.wpe.weight",
+        "transformer.ln_f.weight",
+        "transformer.ln_f.bias",
+        "lm_head.weight",
+    ]
+    for i in range(num_layers):
+        prefix = f"transformer.h.{i}."
+        keys += [
+            prefix + "ln_1.weight",
+            prefix + "ln_1.bias",
+            prefix + "attn.c_attn.weight",
+            prefix + "attn.c_attn.bias",
+            prefix + "attn.c_proj.weight",
+            prefix + "attn.c_proj.bias",
+            prefix + "attn.bias",
+            prefix + "attn.masked_bias",
+            prefix + "ln_2.weight",
+            prefix + "ln_2.bias",
+            prefix + "mlp.c_fc.weight",
+            prefix + "mlp.c_fc.bias",
+            prefix + "mlp.c_proj.weight",
+            prefix + "mlp.c_proj.bias",
+        ]
+    keys += ["transformer.h.0.unknown.weight", "unknown"]
+    return keys
+
+
+@pytest.mark.parametrize(
+    "converter_cls, make_keys",
+    [
+        (Converter_LlamaForCausalLM_HF_CS19, _llama_hf_keys),
+        (Converter_GPT2LMHeadModel_HF_CS18, _gpt2_hf_keys),
+    ],
+)
+def test_prefix_dispatch_matches_linear_scan(converter_cls, make_keys):
+    prefix_converter = converter_cls()
+    linear_converter = converter_cls()
+    _record_rules(prefix_converter)
+    _record_rules(linear_converter)
+    _use_linear_scan(linear_converter)
+
+    hf_keys = make_keys(NUM_LAYERS)
+    expected = _key_mapping(linear_converter, hf_keys, from_index=0)
+    assert _key_mapping(prefix_converter, hf_keys, from_index=0) == expected
+
+    cs_keys = [value[0] for value in expected.values() if value is not None]
+    assert cs_keys
+    assert _key_mapping(prefix_converter, cs_keys, 1) == _key_mapping(
+        linear_converter, cs_keys, 1
+    )
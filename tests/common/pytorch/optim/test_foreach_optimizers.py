@@ -0,0 +1,97 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parity of the multi-tensor (foreach) step of the optimizers with their
+per-param step, on CPU."""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from modelzoo.common.pytorch.optim import (  # noqa: E402
+    SGD,
+    Adam,
+    AdamW,
+    Lamb,
+    Lion,
+)
+
+NUM_STEPS = 5
+PARAM_SHAPES = [(7, 3), (16,), (), (4, 5, 2), (3, 3)]
+
+OPTIMIZER_CONFIGS = [
+    (Adam, dict(lr=1e-2)),
+    (Adam, dict(lr=1e-2, weight_decay=0.1)),
+    (Adam, dict(lr=1e-2, weight_decay=0.1, amsgrad=True)),
+    (AdamW, dict(lr=1e-2)),
+    (AdamW, dict(lr=1e-2, weight_decay=0.1)),
+    (AdamW, dict(lr=1e-2, weight_decay=0.1, amsgrad=True)),
+    (AdamW, dict(lr=1e-2, weight_decay=0.1, correct_bias=False)),
+    (Lamb, dict(lr=1e-2)),
+    (Lamb, dict(lr=1e-2, weight_decay=0.1)),
+    (Lamb, dict(lr=1e-2, weight_decay=0.1, adam=True)),
+    (Lion, dict(lr=1e-3)),
+    (Lion, dict(lr=1e-3, weight_decay=0.1)),
+    (SGD, dict(lr=1e-2)),
+    (SGD, dict(lr=1e-2, weight_decay=0.1)),
+    (SGD, dict(lr=1e-2, momentum=0.9, dampening=0.1, weight_decay=0.1)),
+    (SGD, dict(lr=1e-2, momentum=0.9, nesterov=True, weight_decay=0.1)),
+    (SGD, dict(lr=1e-2, momentum=0.9, maximize=True)),
+]
+
+
+def _params():
+    torch.manual_seed(0)
+    params = [torch.nn.Parameter(torch.randn(shape)) for shape in PARAM_SHAPES]
+    # A param without a gradient must be left untouched by both steps.
+    params.append(torch.nn.Parameter(torch.randn(2, 2)))
+    return params
+
+
+def _set_grads(params, step):
+    generator = torch.Generator().manual_seed(step)
+    for p in params[:-1]:
+        p.grad = torch.randn(p.shape, generator=generator)
+
+
+@pytest.mark.parametrize(
+    "optimizer_cls, kwargs",
+    OPTIMIZER_CONFIGS,
+    ids=[
+        f"{cls.__name__}-{'-'.join(f'{k}={v}' for k, v in kwargs.items())}"
+        for cls, kwargs in OPTIMIZER_CONFIGS
+    ],
+)
+def test_foreach_matches_per_param(optimizer_cls, kwargs):
+    per_param_params = _params()
+    foreach_params = _params()
+    per_param = optimizer_cls(per_param_params, foreach=False, **kwargs)
+    foreach = optimizer_cls(foreach_params, foreach=True, **kwargs)
+
+    for step in range(NUM_STEPS):
+        _set_grads(per_param_params, step)
+        _set_grads(foreach_params, step)
+        per_param.step()
+        foreach.step()
+
+    for expected, actual in zip(per_param_params, foreach_params):
+        torch.testing.assert_close(actual, expected, rtol=1e-5, atol=1e-6)
+    for expected_p, actual_p in zip(per_param_params, foreach_params):
+        expected_state = per_param.state[expected_p]
+        actual_state = foreach.state[actual_p]
+        assert expected_state.keys() == actual_state.keys()
+        for name, value in expected_state.items():
+            torch.testing.assert_close(
+                actual_state[name], value, rtol=1e-5, atol=1e-6
+            )
@@ -0,0 +1,81 @@
+# Copyright 2022 Cerebras Systems.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The chunked mask computation used for large weights must keep the same
+scores as the argpartition one."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cerebras_appliance")
+
+from modelzoo.common.pytorch.sparsity import appliance  # noqa: E402
+
+SPARSITY = 0.7
+
+
+def _weight():
+    # 2**24 elements. Integer magnitudes tie most scores, including the
+    # lowest kept score of every group.
+    rng = np.random.default_rng(0)
+    return rng.integers(-8, 9, size=(4096, 4096)).astype(np.float32)
+
+
+def _grouped(array, groups):
+    """Reshapes `array` to [num_groups, numel] the way `compute_mask` does."""
+    if groups.get("out_groups"):
+        return array.reshape(groups["out_groups"], -1)
+    if groups.get("in_groups"):
+        return array.transpose(1, 0).reshape(groups["in_groups"], -1)
+    return array.reshape(1, -1)
+
+
+@pytest.mark.parametrize(
+    "groups", [{}, {"out_groups": 4}, {"in_groups": 4}], ids=str
+)
+def test_chunked_mask_matches_argpartition(monkeypatch, groups):
+    weight = _weight()
+    assert weight.size >= appliance._CHUNKED_MASK_MIN_NUMEL
+    params = {
+        "init_method": "topk",
+        "sparsity": SPARSITY,
+        "seed": 0,
+        **groups,
+    }
+
+    mask, regrow = appliance.compute_mask(params, weight)
+    monkeypatch.setattr(appliance, "_CHUNKED_MASK_MIN_NUMEL", float("inf"))
+    expected_mask, expected_regrow = appliance.compute_mask(params, weight)
+    assert mask.shape == weight.shape
+    assert not regrow.any() and not expected_regrow.any()
+
+    score = _grouped(np.abs(weight), groups)
+    numel = score.shape[-1]
+    keep = numel - int(np.round(SPARSITY * numel))
+    for group_score, group_mask, group_expected in zip(
+        score, _grouped(mask, groups), _grouped(expected_mask, groups)
+    ):
+        assert np.count_nonzero(group_mask) == keep
+        # Both masks keep the same scores. They may only differ in which of
+        # the scores tied with the lowest kept score are kept.
+        threshold = group_score[group_expected].min()
+        untied = group_score != threshold
+        np.testing.assert_array_equal(
+            group_mask[untied], group_expected[untied]
+        )
+        # The chunked computation keeps the first of the tied scores.
+        tied_mask = group_mask[~untied]
+        num_kept_ties = np.count_nonzero(tied_mask)
+        assert 0 < num_kept_ties < tied_mask.size
+        assert tied_mask[:num_kept_ties].all()